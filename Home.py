@@ -1,6 +1,8 @@
 import streamlit as st
 from PIL import Image
 
+from utils.refresher import refresher_status, start_refresher
+
 # Para poder juntar as 3 páginas da pasta 'pages' usamos a função abaixo
 # O streamlit entende que os 3 arquivos buscados estão na pasta 'pages'
 st.set_page_config( 
@@ -8,6 +10,10 @@ st.set_page_config(
         page_icon = '💎',
         layout = 'wide'
 )
+# Inicia já na Home a thread que mantém os dados em dia (ver utils/refresher.py), para que as
+# páginas encontrem os dados carregados
+start_refresher( 'train.csv' )
+
 image = Image.open( 'logo.png' )
 st.sidebar.image( image, width = 120 )
 
@@ -46,3 +52,25 @@ st.markdown(
     - Time de Data Science no Discord
         - @gustavo
 """ )
+
+# Status da atualização dos dados em segundo plano
+st.markdown( '### Atualização dos dados' )
+status = refresher_status( 'train.csv' )
+if status is None:
+    st.caption( 'Atualização em segundo plano desligada (CURRY_REFRESH_SECONDS=0): os dados são relidos '
+                'no primeiro rerun depois de uma mudança no arquivo.' )
+else:
+    col1, col2, col3, col4 = st.columns( 4 )
+    col1.metric( 'Intervalo de verificação', f"{status['interval']:.0f} s" )
+    col2.metric( 'Versão dos dados', status['version'] if status['version'] is not None else '-' )
+    col3.metric( 'Última atualização',
+                 status['last_refresh'].strftime( '%H:%M:%S' ) if status['last_refresh'] else 'carregando...' )
+    col4.metric( 'Duração da atualização',
+                 f"{status['refresh_seconds']:.1f} s" if status['refresh_seconds'] is not None else '-' )
+    if status['last_check'] is not None:
+        st.caption( f"Última verificação às {status['last_check'].strftime( '%H:%M:%S' )} "
+                    f"({status['checks']} verificações, backend {status['backend']})" )
+    if status['error']:
+        st.warning( f"Última verificação: {status['error']}" )
+    if not status['running']:
+        st.error( 'A thread de atualização parou; os dados só serão relidos ao reiniciar o app.' )
@@ -0,0 +1,280 @@
+# Libraries
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import urllib.request
+
+import numpy as np
+from tornado.websocket import websocket_connect
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+# Raiz do repositório (onde ficam Home.py, pages/ e train.csv)
+ROOT = os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) )
+
+# Páginas exercitadas, pelo nome que o streamlit dá a cada arquivo (Home.py e pages/N_nome.py)
+PAGES = ['Home','empresa','entregadores','restaurantes']
+
+# Rótulos dos filtros da barra lateral (os mesmos nas três páginas)
+SLIDER_LABEL = 'Até qual valor?'
+MULTISELECT_LABEL = 'Quais as condições do trânsito?'
+
+# Visões de cada página com o seletor 'Visão' (as opções do st.radio de pages/1_empresa.py); cada uma
+# é medida separadamente, já que só o conteúdo da visão escolhida é executado
+VIEW_LABEL = 'Visão'
+VIEWS = { 'empresa': ['Visão Gerencial','Visão Tática','Visão Geográfica'] }
+
+# Intervalo (s) entre as leituras do RSS do servidor durante a carga, para achar o pico
+RSS_INTERVAL = 0.05
+
+# -------------------------------------
+# Funções
+# -------------------------------------
+def rss_mb( pid ):
+    """Memória residente atual do processo em MB (VmRSS de /proc; None fora do Linux)."""
+    try:
+        with open( f'/proc/{pid}/status' ) as arquivo:
+            for linha in arquivo:
+                if linha.startswith( 'VmRSS:' ):
+                    return int( linha.split()[1] ) / 1024
+    except OSError:
+        return None
+    return None
+
+async def peak_rss( pid, parar ):
+    """Maior RSS do processo (MB), lido a cada RSS_INTERVAL segundos até parar ser sinalizado."""
+    pico = rss_mb( pid )
+    while pico is not None and not parar.is_set():
+        try:
+            await asyncio.wait_for( parar.wait(), RSS_INTERVAL )
+        except asyncio.TimeoutError:
+            pass
+        pico = max( pico, rss_mb( pid ) or 0 )
+    return pico
+
+def start_server( port ):
+    """Sobe `streamlit run Home.py` sem navegador na porta indicada e espera o /healthz responder."""
+    servidor = subprocess.Popen( [sys.executable, '-m', 'streamlit', 'run', 'Home.py',
+                                  '--server.headless', 'true',
+                                  '--server.port', str( port ),
+                                  '--server.runOnSave', 'false',
+                                  '--browser.gatherUsageStats', 'false'],
+                                 cwd = ROOT, stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL )
+    limite = time.monotonic() + 60
+    while time.monotonic() < limite:
+        if servidor.poll() is not None:
+            raise RuntimeError( 'o servidor streamlit terminou antes de responder' )
+        try:
+            with urllib.request.urlopen( f'http://localhost:{port}/healthz', timeout = 1 ):
+                return servidor
+        except OSError:
+            time.sleep( 0.2 )
+    servidor.terminate()
+    raise RuntimeError( 'o servidor streamlit não respondeu em 60 s' )
+
+def percentiles( latencias ):
+    """p50, p95 e p99 (em ms) de uma lista de latências em segundos."""
+    if not latencias:
+        return { 'p50_ms': None, 'p95_ms': None, 'p99_ms': None }
+    p50, p95, p99 = np.percentile( np.array( latencias ) * 1000, [50, 95, 99] )
+    return { 'p50_ms': round( float( p50 ), 1 ), 'p95_ms': round( float( p95 ), 1 ), 'p99_ms': round( float( p99 ), 1 ) }
+
+class Session:
+    """Uma sessão do navegador simulada: conversa com o servidor pelo websocket /stream,
+       com as mesmas mensagens protobuf (BackMsg/ForwardMsg) que o frontend envia e recebe.
+    """
+
+    def __init__( self, port ):
+        self.url = f'ws://localhost:{port}/stream'
+        self.conn = None
+        # Último elemento visto de cada filtro: rótulo -> proto do slider/multiselect/radio
+        self.widgets = {}
+        self.errors = 0
+
+    async def connect( self ):
+        self.conn = await websocket_connect( self.url, max_message_size = 1 << 30 )
+
+    def close( self ):
+        if self.conn is not None:
+            self.conn.close()
+
+    async def rerun( self, page, widget_states = () ):
+        """Pede uma execução da página e espera o script terminar.
+
+           Output: tempo em segundos entre o envio e o fim da execução
+        """
+        msg = BackMsg()
+        msg.rerun_script.page_name = page
+        msg.rerun_script.widget_states.widgets.extend( widget_states )
+        inicio = time.perf_counter()
+        await self.conn.write_message( msg.SerializeToString(), binary = True )
+        while True:
+            dados = await self.conn.read_message()
+            if dados is None:
+                raise RuntimeError( 'conexão encerrada pelo servidor' )
+            fwd = ForwardMsg()
+            fwd.ParseFromString( dados )
+            tipo = fwd.WhichOneof( 'type' )
+            if tipo == 'delta' and fwd.delta.WhichOneof( 'type' ) == 'new_element':
+                self._observe( fwd.delta.new_element )
+            elif tipo == 'page_not_found':
+                raise RuntimeError( f'página não encontrada: {page}' )
+            elif tipo == 'script_finished' and fwd.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                return time.perf_counter() - inicio
+
+    def _observe( self, elemento ):
+        tipo = elemento.WhichOneof( 'type' )
+        if tipo == 'exception':
+            self.errors += 1
+        elif tipo == 'slider' and elemento.slider.label == SLIDER_LABEL:
+            self.widgets[SLIDER_LABEL] = elemento.slider
+        elif tipo == 'multiselect' and elemento.multiselect.label == MULTISELECT_LABEL:
+            self.widgets[MULTISELECT_LABEL] = elemento.multiselect
+        elif tipo == 'radio' and elemento.radio.label == VIEW_LABEL:
+            self.widgets[VIEW_LABEL] = elemento.radio
+
+    def view_state( self, view ):
+        """Estado do seletor 'Visão' com a visão indicada (vazio sem visão ou se a página não tem o seletor)."""
+        radio = self.widgets.get( VIEW_LABEL )
+        if view is None or radio is None:
+            return []
+        estado = BackMsg().rerun_script.widget_states.widgets.add()
+        estado.id = radio.id
+        estado.int_value = list( radio.options ).index( view )
+        return [estado]
+
+    def random_filters( self, rng ):
+        """Estado dos filtros com uma data limite e um subconjunto (não vazio) de trânsito sorteados,
+           no formato serializado dos widgets (data em microssegundos, opções por posição).
+        """
+        estados = []
+        slider = self.widgets.get( SLIDER_LABEL )
+        if slider is not None:
+            passos = int( ( slider.max - slider.min ) // slider.step )
+            estado = BackMsg().rerun_script.widget_states.widgets.add()
+            estado.id = slider.id
+            estado.double_array_value.data.append( slider.min + rng.randint( 0, passos ) * slider.step )
+            estados.append( estado )
+        multiselect = self.widgets.get( MULTISELECT_LABEL )
+        if multiselect is not None:
+            n = len( multiselect.options )
+            escolhidas = sorted( rng.sample( range( n ), rng.randint( 1, n ) ) )
+            estado = BackMsg().rerun_script.widget_states.widgets.add()
+            estado.id = multiselect.id
+            estado.int_array_value.data.extend( escolhidas )
+            estados.append( estado )
+        return estados
+
+def scenarios( pages ):
+    """Pares (página, visão) medidos: uma entrada por visão de VIEWS e None nas páginas sem seletor."""
+    return [( page, view ) for page in pages for view in VIEWS.get( page, [None] )]
+
+async def drive( session, page, view, reruns, rng ):
+    """Abre a página na visão indicada e troca os filtros reruns vezes.
+
+       Output: latências (s) das trocas de filtro
+    """
+    await session.rerun( page )
+    visao = session.view_state( view )
+    if visao:
+        # O estado do seletor vai em todo rerun; sem ele a página volta para a visão padrão
+        await session.rerun( page, visao )
+    latencias = []
+    for _ in range( reruns ):
+        latencias.append( await session.rerun( page, visao + session.random_filters( rng ) ) )
+    return latencias
+
+async def warm_up( port, page, view, seed ):
+    """Uma sessão abre a página na visão e troca os filtros uma vez, depois é fechada."""
+    sessao = Session( port )
+    await sessao.connect()
+    try:
+        await drive( sessao, page, view, 1, random.Random( seed ) )
+    finally:
+        sessao.close()
+
+async def load_page( port, pid, page, view, sessions, reruns, seed ):
+    """Simula sessions sessões simultâneas na página (e visão) e mede latência e memória do servidor.
+
+       A memória por sessão é aproximada: pico do RSS durante a carga menos o RSS ocioso medido logo
+       depois de um rerun de aquecimento da mesma visão, dividido pelas sessões. Ainda inclui ruído do
+       alocador (memória liberada nem sempre volta ao sistema), por isso é limitada a zero.
+    """
+    await warm_up( port, page, view, seed )
+    rss_ocioso = rss_mb( pid )
+    parar = asyncio.Event()
+    pico = asyncio.ensure_future( peak_rss( pid, parar ) )
+    conexoes = [Session( port ) for _ in range( sessions )]
+    try:
+        await asyncio.gather( *[s.connect() for s in conexoes] )
+        inicio = time.perf_counter()
+        resultados = await asyncio.gather( *[drive( s, page, view, reruns, random.Random( seed + i ) )
+                                             for i, s in enumerate( conexoes )] )
+        duracao = time.perf_counter() - inicio
+    finally:
+        parar.set()
+        rss_pico = await pico
+        for s in conexoes:
+            s.close()
+
+    latencias = [t for r in resultados for t in r]
+    por_sessao = None
+    if rss_ocioso is not None and rss_pico is not None:
+        por_sessao = round( max( rss_pico - rss_ocioso, 0 ) / sessions, 2 )
+    return { 'page': page, 'view': view, 'sessions': sessions, 'reruns': len( latencias ),
+             **percentiles( latencias ),
+             'reruns_per_s': round( len( latencias ) / duracao, 2 ) if duracao else None,
+             'errors': sum( s.errors for s in conexoes ),
+             'server_idle_rss_mb': round( rss_ocioso, 1 ) if rss_ocioso is not None else None,
+             'server_peak_rss_mb': round( rss_pico, 1 ) if rss_pico is not None else None,
+             'approx_rss_per_session_mb': por_sessao }
+
+async def run( port, pid, pages, sessions, reruns, seed ):
+    # Aquecimento: uma sessão abre cada página e visão uma vez, para que a leitura do CSV e os caches
+    # compartilhados (dataframe, cubo, índices) não entrem na latência nem na memória por sessão
+    for page, view in scenarios( pages ):
+        await warm_up( port, page, view, seed )
+
+    resultados = []
+    for page, view in scenarios( pages ):
+        resultado = await load_page( port, pid, page, view, sessions, reruns, seed )
+        resultados.append( resultado )
+        nome = f'{page} / {view}' if view else page
+        print( f"{nome:<32} p50 {resultado['p50_ms']} ms  p95 {resultado['p95_ms']} ms  p99 {resultado['p99_ms']} ms"
+               f"  memória/sessão ~{resultado['approx_rss_per_session_mb']} MB  erros {resultado['errors']}", file = sys.stderr )
+    return resultados
+
+if __name__ == '__main__':
+    # python -m benchmarks.loadtest --sessions 20 --reruns 10 --output benchmarks/loadtest.json
+    parser = argparse.ArgumentParser( description = 'Teste de carga do dashboard com várias sessões simultâneas.' )
+    parser.add_argument( '--sessions', type = int, default = 20 )
+    parser.add_argument( '--reruns', type = int, default = 10, help = 'trocas de filtro por sessão' )
+    parser.add_argument( '--pages', nargs = '+', default = PAGES )
+    parser.add_argument( '--port', type = int, default = 8599 )
+    parser.add_argument( '--seed', type = int, default = 42 )
+    parser.add_argument( '--output', default = os.path.join( os.path.dirname( __file__ ), 'loadtest.json' ) )
+    args = parser.parse_args()
+
+    servidor = start_server( args.port )
+    try:
+        resultados = asyncio.run( run( args.port, servidor.pid, args.pages, args.sessions, args.reruns, args.seed ) )
+    finally:
+        servidor.terminate()
+        servidor.wait()
+
+    with open( args.output, 'w' ) as arquivo:
+        json.dump( { 'generated_at': datetime.datetime.now().isoformat( timespec = 'seconds' ),
+                     'python': platform.python_version(),
+                     'platform': platform.platform(),
+                     'sessions': args.sessions,
+                     'reruns_per_session': args.reruns,
+                     'results': resultados }, arquivo, indent = 2 )
+    print( args.output )
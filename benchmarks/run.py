@@ -0,0 +1,151 @@
+# Libraries
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import generate_csv
+from utils.charts import (avg_by_traffic_or_weather, avg_std_time_plot, distance, order_by_week, order_metric,
+                          order_share_by_week, pizza_sunburst, traffic_order_city, traffic_order_share)
+from utils.cube import build_cube, filter_cube
+from utils.dataset import clean_code, read_orders
+from utils.filters import build_filter_index, filter_rows, selection
+from utils.geo import haversine_km
+from utils.maps import heatmap_html, india_map_html
+from utils.rankings import top_k_by_city
+from utils.sketches import build_sketches
+from utils.spatial import auto_level, build_spatial_index, cell_aggregates, extent, query_radius
+
+# Tamanhos padrão dos arquivos sintéticos
+SIZES = [50_000, 1_000_000, 10_000_000]
+
+# Pasta dos arquivos sintéticos (gerados na primeira execução e reaproveitados depois)
+DATA_DIR = os.path.join( os.path.dirname( __file__ ), 'data' )
+
+# Filtros usados nas medições: data limite padrão das páginas e todas as condições de trânsito
+DATE_SLIDER = datetime.datetime( 2022, 4, 13 )
+TRAFFIC_OPTIONS = ['Low','Medium','High','Jam']
+
+# -------------------------------------
+# Funções
+# -------------------------------------
+def measure( func, repeat ):
+    """Executa func repeat vezes e retorna (tempos em segundos, último resultado)."""
+    tempos = []
+    for _ in range( repeat ):
+        inicio = time.perf_counter()
+        resultado = func()
+        tempos.append( time.perf_counter() - inicio )
+    return tempos, resultado
+
+def stages( raw ):
+    """Etapas medidas, em ordem: (nome, função que recebe o estado e retorna o resultado).
+
+       O resultado de cada etapa fica no estado com o mesmo nome, para as etapas seguintes.
+    """
+    return [
+        ( 'clean_code', lambda s: clean_code( raw ) ),
+        ( 'haversine_km', lambda s: haversine_km( raw['Restaurant_latitude'], raw['Restaurant_longitude'],
+                                                  raw['Delivery_location_latitude'], raw['Delivery_location_longitude'] ) ),
+        ( 'build_cube', lambda s: build_cube( s['clean_code'] ) ),
+        ( 'build_filter_index', lambda s: build_filter_index( s['clean_code'] ) ),
+        ( 'build_sketches', lambda s: build_sketches( s['clean_code'] ) ),
+        ( 'build_spatial_index', lambda s: build_spatial_index( s['clean_code'] ) ),
+        ( 'filter_rows', lambda s: selection( s['clean_code'], filter_rows( s['build_filter_index'], DATE_SLIDER, TRAFFIC_OPTIONS ) ) ),
+        ( 'filter_cube', lambda s: filter_cube( s['build_cube'], DATE_SLIDER, TRAFFIC_OPTIONS ) ),
+        ( 'order_metric', lambda s: order_metric( s['filter_cube'] ) ),
+        ( 'traffic_order_share', lambda s: traffic_order_share( s['filter_cube'] ) ),
+        ( 'traffic_order_city', lambda s: traffic_order_city( s['filter_cube'] ) ),
+        ( 'order_by_week', lambda s: order_by_week( s['filter_cube'] ) ),
+        ( 'order_share_by_week', lambda s: order_share_by_week( s['filter_cube'] ) ),
+        ( 'india_map_html', lambda s: india_map_html( s['filter_rows'] ) ),
+        ( 'heatmap_html', lambda s: heatmap_html( cell_aggregates( s['build_spatial_index'], 'delivery', None,
+                                                                   auto_level( extent( s['build_spatial_index'] ) ) ) ) ),
+        ( 'query_radius', lambda s: query_radius( s['build_spatial_index'], s['clean_code'], 19.07, 72.87, 20 ) ),
+        ( 'avg_by_traffic_or_weather', lambda s: ( avg_by_traffic_or_weather( s['filter_cube'], 'Road_traffic_density' ),
+                                                   avg_by_traffic_or_weather( s['filter_cube'], 'Weatherconditions' ) ) ),
+        ( 'top_k_by_city', lambda s: top_k_by_city( s['filter_rows'], k = 10 ) ),
+        ( 'distance', lambda s: ( distance( s['filter_cube'], metrica = 'Yes' ), distance( s['filter_cube'], metrica = 'No' ) ) ),
+        ( 'avg_std_time_plot', lambda s: avg_std_time_plot( s['filter_cube'] ) ),
+        ( 'pizza_sunburst', lambda s: pizza_sunburst( s['filter_cube'] ) ),
+    ]
+
+def run( sizes, repeat, only = None ):
+    """Mede cada etapa para cada tamanho de arquivo sintético.
+
+       Output: lista de dicionários com rows, stage, best_s, median_s e repeat
+               (e mb_s, a vazão sobre o CSV, nas etapas de leitura)
+    """
+    resultados = []
+    for n_rows in sizes:
+        path = os.path.join( DATA_DIR, f'train_{n_rows}.csv' )
+        if not os.path.exists( path ):
+            print( f'gerando {path}...', file = sys.stderr )
+            generate_csv( path, n_rows )
+
+        mb = os.path.getsize( path ) / 2**20
+        tempos, raw = measure( lambda: pd.read_csv( path ), 1 )
+        resultados.append( { 'rows': n_rows, 'stage': 'read_csv', 'best_s': tempos[0], 'median_s': tempos[0], 'repeat': 1,
+                             'mb_s': mb / tempos[0] } )
+        # Leitor tipado (Arrow): leitura e limpeza juntas, comparável a read_csv + clean_code
+        if only is None or 'read_orders' in only:
+            tempos, _ = measure( lambda: read_orders( path ), repeat )
+            resultados.append( { 'rows': n_rows, 'stage': 'read_orders', 'best_s': min( tempos ),
+                                 'median_s': statistics.median( tempos ), 'repeat': len( tempos ), 'mb_s': mb / min( tempos ) } )
+            print( f'{n_rows:>10} {"read_orders":<28} {min( tempos ):10.4f} s {mb / min( tempos ):8.1f} MB/s', file = sys.stderr )
+
+        estado = {}
+        for nome, func in stages( raw ):
+            tempos, estado[nome] = measure( lambda: func( estado ), repeat if only is None or nome in only else 1 )
+            if only is not None and nome not in only:
+                continue
+            resultados.append( { 'rows': n_rows, 'stage': nome, 'best_s': min( tempos ),
+                                 'median_s': statistics.median( tempos ), 'repeat': len( tempos ) } )
+            print( f'{n_rows:>10} {nome:<28} {min( tempos ):10.4f} s', file = sys.stderr )
+        del raw, estado
+    return resultados
+
+def regressions( resultados, baseline, tolerance ):
+    """Etapas cujo melhor tempo piorou mais que tolerance (fração) em relação ao baseline."""
+    anteriores = { ( r['rows'], r['stage'] ): r['best_s'] for r in baseline['results'] }
+    piores = []
+    for r in resultados:
+        anterior = anteriores.get( ( r['rows'], r['stage'] ) )
+        if anterior and r['best_s'] > anterior * ( 1 + tolerance ):
+            piores.append( { **r, 'baseline_s': anterior } )
+    return piores
+
+if __name__ == '__main__':
+    # python -m benchmarks.run --sizes 50000 1000000 --output benchmarks/results.json
+    parser = argparse.ArgumentParser( description = 'Mede as etapas de processamento do dashboard.' )
+    parser.add_argument( '--sizes', type = int, nargs = '+', default = SIZES )
+    parser.add_argument( '--repeat', type = int, default = 3 )
+    parser.add_argument( '--stages', nargs = '+', help = 'mede só estas etapas (as demais rodam uma vez, como preparação)' )
+    parser.add_argument( '--output', default = os.path.join( os.path.dirname( __file__ ), 'results.json' ) )
+    parser.add_argument( '--baseline', help = 'resultado anterior para comparação' )
+    parser.add_argument( '--tolerance', type = float, default = 0.2, help = 'piora aceita em relação ao baseline (0.2 = 20%%)' )
+    args = parser.parse_args()
+
+    resultados = run( args.sizes, args.repeat, args.stages )
+    with open( args.output, 'w' ) as arquivo:
+        json.dump( { 'generated_at': datetime.datetime.now().isoformat( timespec = 'seconds' ),
+                     'python': platform.python_version(),
+                     'pandas': pd.__version__,
+                     'numpy': np.__version__,
+                     'platform': platform.platform(),
+                     'results': resultados }, arquivo, indent = 2 )
+    print( args.output )
+
+    if args.baseline:
+        with open( args.baseline ) as arquivo:
+            piores = regressions( resultados, json.load( arquivo ), args.tolerance )
+        for r in piores:
+            print( f"regressão: {r['stage']} ({r['rows']} linhas) {r['baseline_s']:.4f} s -> {r['best_s']:.4f} s" )
+        sys.exit( 1 if piores else 0 )
@@ -0,0 +1,84 @@
+# Libraries
+import argparse
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import threading
+
+from benchmarks.loadtest import rss_mb
+from benchmarks.run import DATA_DIR, DATE_SLIDER, TRAFFIC_OPTIONS
+from benchmarks.synthetic import generate_csv
+from utils.dataset import read_orders
+from utils.filters import build_filter_index, filter_rows, selection
+from utils.maps import india_map_html
+from utils.profiles import build_profiles
+from utils.rankings import top_k_by_city
+
+# Formas de entregar os pedidos filtrados às funções da página: cópia das linhas ou seleção sem cópia
+MODES = ['take','selection']
+
+# Quantidades de reruns simultâneos medidas
+SESSIONS = [1, 5, 10, 20]
+
+# -------------------------------------
+# Funções
+# -------------------------------------
+def _rerun( dfm, index, mode, barreira ):
+    # Mesmo trabalho por pedido das páginas Empresa (mapa) e Entregadores (perfis e rankings)
+    rows = filter_rows( index, DATE_SLIDER, TRAFFIC_OPTIONS )
+    pedidos = dfm.take( rows ) if mode == 'take' else selection( dfm, rows )
+    resultados = ( build_profiles( pedidos ), top_k_by_city( pedidos ), india_map_html( pedidos ) )
+    # Todas as sessões ficam com os dados do rerun vivos até a medição
+    barreira.wait()
+    barreira.wait()
+    return resultados
+
+def measure( path, mode, sessions ):
+    """RSS do processo com n reruns simultâneos, para cada n de sessions (em um processo novo por modo).
+
+       Output: lista de dicionários com mode, sessions, rss_mb (acima do processo com os dados
+               compartilhados carregados) e per_session_mb
+    """
+    dfm = read_orders( path )
+    index = build_filter_index( dfm )
+    base = rss_mb( os.getpid() )
+    linhas = []
+    for n in sessions:
+        barreira = threading.Barrier( n + 1 )
+        with concurrent.futures.ThreadPoolExecutor( max_workers = n ) as pool:
+            futuros = [pool.submit( _rerun, dfm, index, mode, barreira ) for _ in range( n )]
+            barreira.wait()
+            rss = rss_mb( os.getpid() ) - base
+            barreira.wait()
+            for futuro in futuros:
+                futuro.result()
+        linhas.append( { 'mode': mode, 'sessions': n, 'rss_mb': round( rss, 1 ), 'per_session_mb': round( rss / n, 2 ) } )
+    return linhas
+
+def run( n_rows, sessions ):
+    """Mede os dois modos de MODES, cada um em um processo separado (o RSS de um não contamina o outro)."""
+    path = os.path.join( DATA_DIR, f'train_{n_rows}.csv' )
+    if not os.path.exists( path ):
+        generate_csv( path, n_rows )
+    contexto = multiprocessing.get_context( 'spawn' )
+    resultados = []
+    for mode in MODES:
+        with concurrent.futures.ProcessPoolExecutor( max_workers = 1, mp_context = contexto ) as pool:
+            resultados += pool.submit( measure, path, mode, sessions ).result()
+    return resultados
+
+if __name__ == '__main__':
+    # python -m benchmarks.sessions --rows 1000000 --sessions 1 5 10 20
+    parser = argparse.ArgumentParser( description = 'Memória por sessão com reruns simultâneos: cópia x seleção de linhas.' )
+    parser.add_argument( '--rows', type = int, default = 1_000_000 )
+    parser.add_argument( '--sessions', type = int, nargs = '+', default = SESSIONS )
+    parser.add_argument( '--output', help = 'grava o resultado em JSON' )
+    args = parser.parse_args()
+
+    resultados = run( args.rows, args.sessions )
+    for r in resultados:
+        print( f"{r['mode']:<10} {r['sessions']:>3} sessões  RSS +{r['rss_mb']:8.1f} MB  por sessão {r['per_session_mb']:7.2f} MB" )
+    if args.output:
+        with open( args.output, 'w' ) as arquivo:
+            json.dump( { 'rows': args.rows, 'results': resultados }, arquivo, indent = 2 )
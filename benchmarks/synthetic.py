@@ -0,0 +1,113 @@
+# Libraries
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+# Semente fixa: o mesmo tamanho gera sempre o mesmo arquivo
+SEED = 42
+
+# Linhas geradas por bloco (limita a memória usada para arquivos grandes)
+BLOCK_SIZE = 500_000
+
+# Códigos de cidade usados nos IDs dos entregadores (como no dataset original)
+CITY_CODES = ['INDO','BANG','COIMB','CHEN','HYD','JAP','RANCHI','MYS','SUR','PUNE','MUM','AGR',
+              'LUDH','KNP','KOC','VAD','ALH','GOA','AURG','BHP','DEH','KOL']
+
+# Categorias com o espaço à direita, como no dataset original
+CITIES = ['Metropolitian ','Urban ','Semi-Urban ']
+TRAFFIC = ['Low ','Medium ','High ','Jam ']
+WEATHER = ['Sunny','Stormy','Sandstorms','Cloudy','Fog','Windy']
+ORDERS = ['Snack ','Meal ','Drinks ','Buffet ']
+VEHICLES = ['motorcycle ','scooter ','electric_scooter ','bicycle ']
+
+# Proporção de valores faltantes ('NaN ') por coluna
+NAN_RATES = { 'Delivery_person_Age': 0.04, 'Road_traffic_density': 0.01, 'City': 0.03,
+              'Festival': 0.005, 'multiple_deliveries': 0.02, 'Weatherconditions': 0.01 }
+
+# -------------------------------------
+# Funções
+# -------------------------------------
+def _with_nan( rng, valores, taxa ):
+    """Troca uma fração taxa dos valores pelo texto 'NaN ' (dado faltante do dataset original)."""
+    valores = valores.astype( object )
+    valores[rng.random( len( valores ) ) < taxa] = 'NaN '
+    return valores
+
+def generate_block( rng, inicio, n, n_drivers ):
+    """Gera n pedidos brutos, com o mesmo esquema e as mesmas peculiaridades do train.csv.
+
+       - textos com espaço à direita ('Urban ', 'Low ', IDs)
+       - dados faltantes como o texto 'NaN ' (e 'conditions NaN' no clima)
+       - tempo de entrega no formato '(min) 24'
+    """
+    drivers = rng.integers( 0, n_drivers, n )
+    # IDs únicos no formato do original, ex.: 'INDORES13DEL02 ' (cidade, restaurante, entregador)
+    k = len( CITY_CODES )
+    driver_ids = np.array( [f'{CITY_CODES[d % k]}RES{d // k % 40 + 1:02d}DEL{d // ( 40 * k ) + 1:02d} '
+                            for d in range( n_drivers )], dtype = object )
+    idade = _with_nan( rng, rng.integers( 20, 40, n ).astype( str ), NAN_RATES['Delivery_person_Age'] )
+    # Avaliação falta junto com a idade, como no dataset original
+    nota = np.where( idade == 'NaN ', 'NaN ', np.round( rng.uniform( 2.5, 5.0, n ), 1 ).astype( str ) ).astype( object )
+
+    restaurante_lat = rng.uniform( 9.0, 31.0, n ).round( 6 )
+    restaurante_lon = rng.uniform( 72.0, 88.5, n ).round( 6 )
+    clima = np.char.add( 'conditions ', np.array( WEATHER )[rng.integers( 0, len( WEATHER ), n )] ).astype( object )
+    clima[rng.random( n ) < NAN_RATES['Weatherconditions']] = 'conditions NaN'
+    trafego = rng.integers( 0, len( TRAFFIC ), n )
+    festival = rng.random( n ) < 0.02
+
+    # Tempo de entrega maior com trânsito pesado e em festivais
+    tempo = np.clip( rng.normal( 20 + 5 * trafego + 15 * festival, 6 ), 10, 54 ).astype( int )
+
+    datas = pd.Timestamp( 2022, 2, 11 ) + pd.to_timedelta( rng.integers( 0, 55, n ), unit = 'D' )
+    horas = pd.to_timedelta( rng.integers( 8 * 60, 23 * 60, n ), unit = 'min' )
+
+    return pd.DataFrame( {
+        'ID': [f'0x{i:x} ' for i in range( inicio, inicio + n )],
+        'Delivery_person_ID': driver_ids[drivers],
+        'Delivery_person_Age': idade,
+        'Delivery_person_Ratings': nota,
+        'Restaurant_latitude': restaurante_lat,
+        'Restaurant_longitude': restaurante_lon,
+        'Delivery_location_latitude': ( restaurante_lat + rng.uniform( -0.15, 0.15, n ) ).round( 6 ),
+        'Delivery_location_longitude': ( restaurante_lon + rng.uniform( -0.15, 0.15, n ) ).round( 6 ),
+        'Order_Date': datas.strftime( '%d-%m-%Y' ),
+        'Time_Orderd': ( pd.Timestamp( 0 ) + horas ).strftime( '%H:%M:%S' ),
+        'Time_Order_picked': ( pd.Timestamp( 0 ) + horas + pd.Timedelta( minutes = 10 ) ).strftime( '%H:%M:%S' ),
+        'Weatherconditions': clima,
+        'Road_traffic_density': _with_nan( rng, np.array( TRAFFIC )[trafego], NAN_RATES['Road_traffic_density'] ),
+        'Vehicle_condition': rng.integers( 0, 4, n ),
+        'Type_of_order': np.array( ORDERS )[rng.integers( 0, len( ORDERS ), n )],
+        'Type_of_vehicle': np.array( VEHICLES )[rng.integers( 0, len( VEHICLES ), n )],
+        'multiple_deliveries': _with_nan( rng, rng.integers( 0, 4, n ).astype( str ), NAN_RATES['multiple_deliveries'] ),
+        'Festival': _with_nan( rng, np.where( festival, 'Yes ', 'No ' ), NAN_RATES['Festival'] ),
+        'City': _with_nan( rng, np.array( CITIES )[rng.integers( 0, len( CITIES ), n )], NAN_RATES['City'] ),
+        'Time_taken(min)': np.char.add( '(min) ', tempo.astype( str ) ),
+    } )
+
+def generate_csv( path, n_rows, seed = SEED ):
+    """Grava um train.csv sintético com n_rows pedidos, em blocos de BLOCK_SIZE linhas.
+
+       A quantidade de entregadores acompanha o volume (cerca de 35 pedidos por entregador).
+
+       Input: caminho de saída, quantidade de linhas, semente
+       Output: caminho gravado
+    """
+    rng = np.random.default_rng( seed )
+    n_drivers = max( n_rows // 35, 1 )
+    os.makedirs( os.path.dirname( path ) or '.', exist_ok = True )
+    for inicio in range( 0, n_rows, BLOCK_SIZE ):
+        bloco = generate_block( rng, inicio, min( BLOCK_SIZE, n_rows - inicio ), n_drivers )
+        bloco.to_csv( path, mode = 'w' if inicio == 0 else 'a', header = inicio == 0, index = False )
+    return path
+
+if __name__ == '__main__':
+    # python -m benchmarks.synthetic 50000 benchmarks/data/train_50k.csv
+    parser = argparse.ArgumentParser( description = 'Gera um train.csv sintético.' )
+    parser.add_argument( 'rows', type = int )
+    parser.add_argument( 'path' )
+    parser.add_argument( '--seed', type = int, default = SEED )
+    args = parser.parse_args()
+    print( generate_csv( args.path, args.rows, args.seed ) )
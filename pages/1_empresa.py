@@ -1,15 +1,21 @@
 # Libraries
 import pandas as pd
-import numpy as np
-from haversine import haversine   # Biblioteca para o cálculo das distâncias (latitude, longitude)
-
-from matplotlib import pyplot as plt
-import plotly.express as px
-import plotly.graph_objects as go
 import streamlit as st
 from PIL import Image
-import folium
-from streamlit_folium import folium_static
+import streamlit.components.v1 as components
+
+from utils.charts import order_by_week, order_metric, order_share_by_week, traffic_order_city, traffic_order_share
+from utils.cube import filter_cube, load_cube
+from utils.dataset import data_version, load_data, load_derived
+from utils.figures import cached_figure
+from utils.filters import build_filter_index, filter_rows, selection
+from utils.maps import cached_heatmap_html, cached_india_map_html
+from utils.refresher import start_refresher
+from utils.sketches import APPROX, load_sketches
+from utils.spatial import ( POINTS, auto_level, build_spatial_index, cell_aggregates, extent, query_radius,
+                            region_bounds, sql_cell_aggregates )
+from utils.sql import BACKEND, filter_orders, open_database, within_radius
+from utils.timing import begin, debug_panel, stage
 
 st.set_page_config( 
         page_title = 'Visão Empresa',
@@ -17,148 +23,66 @@ st.set_page_config(
         layout = 'wide'
 )
 
+# Visões do Dashboard; só a visão escolhida é calculada a cada rerun
+VIEWS = ['Visão Gerencial','Visão Tática','Visão Geográfica']
+
+# Camadas do mapa da visão geográfica
+MAP_LAYERS = ['Medianas por cidade','Mapa de calor','Cada entrega']
+
+# Pontos que podem ser mostrados no mapa de calor e na região (ver utils/spatial.py)
+POINT_NAMES = { 'delivery': 'Entregas', 'restaurant': 'Restaurantes' }
+
 # =================================================
 # Funções
 # =================================================
-def order_metric( dfm ):
-    dfm_sel_1 = dfm.loc[:,['ID','Order_Date']].groupby(['Order_Date']).count().reset_index()
-    fig = px.bar(dfm_sel_1, x='Order_Date', y='ID')
-    return fig
-
-def traffic_order_share( dfm ):
-    dfm_sel_3 = ( dfm.loc[:, ['ID','Road_traffic_density']]
-                     .groupby(['Road_traffic_density'])
-                     .count()
-                     .reset_index() )
-    dfm_sel_3['delivery_percent_by_traffic'] = dfm_sel_3['ID'].apply( lambda x: 100*x / dfm_sel_3['ID'].sum() )
-                                                
-    px.pie(dfm_sel_3, values = 'delivery_percent_by_traffic', names = 'Road_traffic_density')
-    fig = px.pie(dfm_sel_3, values = 'delivery_percent_by_traffic', names = 'Road_traffic_density')
-    return fig
-
-def traffic_order_city( dfm ):
-    cols = ['ID','City','Road_traffic_density']
-    dfm_sel_4 = dfm.loc[:,cols].groupby(['City','Road_traffic_density']).count().reset_index()
-    fig = px.scatter(dfm_sel_4, x='City',y='Road_traffic_density',size='ID',color='City',
-                      title='Relação entre o tipo de trânsito e a cidade de entrega', 
-                      labels = {'City': 'Cidade', 'Road_traffic_density': 'Tipo de trânsito'},
-                      width=800, height=500 
-                     )
-    return fig
-
-def order_by_week( dfm ):
-    # Cria a coluna de semanas
-    dfm['Week_of_year'] = dfm['Order_Date'].dt.strftime( '%U' )   
-    dfm_sel_2 = dfm.loc[:,['ID','Week_of_year']].groupby(['Week_of_year']).count().reset_index()
-    fig = px.line(dfm_sel_2, x='Week_of_year', y='ID', 
-                    title='Distribuição das entregas por semana', 
-                    labels = {'Week_of_year': 'Semana', 'ID': 'Quantidade de entregas'}
-                 )
-    return fig
-
-def order_share_by_week( dfm ):
-    # Qte de pedidos por semana
-    df_aux01 = dfm.loc[:,['ID','Week_of_year']].groupby(['Week_of_year']).count().reset_index()
-    # Qte de trabalhadores únicos por semana
-    df_new = ( dfm.loc[:,['Delivery_person_ID','Week_of_year']]
-                  .groupby(['Week_of_year'])
-                  .nunique()
-                  .reset_index() )
-    # a qte de pedidos por entregador por semana.
-    df_aux01['Qte_pedidos_entregador_por_semana'] = df_aux01['ID'] / df_new['Delivery_person_ID']
-
-    fig = px.line( df_aux01, x='Week_of_year', y='Qte_pedidos_entregador_por_semana', 
-                    title='Evolução das entregas por semana por entregador', 
-                    labels = {'Week_of_year': 'Semana', 'Qte_pedidos_entregador_por_semana': 'Número_de_pedidos_por_entregador_por_semana'},
-                    width=800, height=500 
-                 )
-    return fig
-
-def india_map( dfm ):
-    cols = ['City','Road_traffic_density','Delivery_location_latitude','Delivery_location_longitude']
-    dfm_sel_6 = dfm.loc[:,cols].groupby(['City','Road_traffic_density']).median().reset_index()
-
-    map = folium.Map()
-
-    for i in range(len(dfm_sel_6)):
-        folium.Marker([dfm_sel_6.loc[i,'Delivery_location_latitude'], dfm_sel_6.loc[i,'Delivery_location_longitude']],
-                       popup = dfm_sel_6.loc[i,['City','Road_traffic_density']]).add_to(map)
-    folium_static( map, width=1024, height=600 )
+def memo_figure( nome, func ):
+    # As figuras ficam serializadas em um cache LRU compartilhado entre as sessões, com chave
+    # (gráfico, filtros, backend + versão dos dados) (ver utils/figures.py)
+    with stage( nome ):
+        return cached_figure( nome, date_slider, traffic_options, ( BACKEND, versao ), func )
+
+def india_map( pedidos, chave, por_pedido = False, bounds = None ):
+    # O HTML do mapa também fica em cache (LRU) compartilhado entre as sessões (ver utils/maps.py);
+    # os pedidos só são filtrados quando o mapa não está no cache
+    with stage( 'india_map_html' ):
+        html = cached_india_map_html( pedidos, chave, por_pedido, bounds )
+    with stage( 'components.html india_map' ):
+        components.html( html, width=1024, height=610 )
     return None
 
-# Limpeza dos dados
-def clean_code( dfm ):
-    """Esta função possui a responsabilidade de limpar o dataframe.
-       Tipos de limpeza:
-       
-       1 - Remoção de dados faltantes do tipo NaN
-       2 - Conversão de tipos de dados nas colunas
-       3 - Remoção dos espaços nas colunas (vaiáveis de texto)
-       4 - Formatação da coluna de datas
-       5 - Limpeza da coluna de tempo (remoção do texto ans do número)
-       
-       Input: Dataframe
-       Output: Dataframe
-    """
-    # Exclui as linhas com dados faltantes na coluna 'Delivery_person_Age'
-    linhas_selecionadas = dfm['Delivery_person_Age'] != 'NaN '
-    dfm = dfm.loc[linhas_selecionadas, :].copy()
-
-    # Exclui as linhas com dados faltantes na coluna 'Road_traffic_density'
-    linhas_selecionadas = dfm['Road_traffic_density'] != 'NaN '
-    dfm = dfm.loc[linhas_selecionadas, :].copy()
-
-    # Exclui as linhas com dados faltantes na coluna 'City'
-    linhas_selecionadas = dfm['City'] != 'NaN '
-    dfm = dfm.loc[linhas_selecionadas, :].copy()
-
-    # Exclui as linhas com dados faltantes na coluna 'Festival'
-    linhas_selecionadas = dfm['Festival'] != 'NaN '
-    dfm = dfm.loc[linhas_selecionadas, :].copy()
-
-    # Converte os dados dessa coluna de texto para int
-    dfm['Delivery_person_Age'] = dfm['Delivery_person_Age'].astype(int)
-
-    # Converte os dados dessa coluna de texto para float
-    dfm['Delivery_person_Ratings'] = dfm['Delivery_person_Ratings'].astype(float)
-
-    # Converte as datas anteriormente em formato de objeto para datetime
-    dfm['Order_Date'] = pd.to_datetime(dfm['Order_Date'], format = '%d-%m-%Y' )
-
-    # Exclui as linhas com dados faltantes na coluna 'multiple_deliveries'
-    linhas_selecionadas_multiple_deliveries = dfm['multiple_deliveries'] != 'NaN '
-    dfm = dfm.loc[linhas_selecionadas_multiple_deliveries, :].copy()
-    # Converte os dados dessa coluna de texto para int
-    dfm['multiple_deliveries'] = dfm['multiple_deliveries'].astype(int)
-
-    # Reordena os índices do DF
-    dfm = dfm.reset_index(drop=True)
-    # Extrai os espaços em branco dos dados na colunas 'ID', 'Road_traffic_density', 'Type_of_order', 'Type_of_vehicle', 'Festival' e 'City'
-    dfm.loc[:,'ID'] = dfm.loc[:,'ID'].str.strip()
-    dfm.loc[:,'Road_traffic_density'] = dfm.loc[:,'Road_traffic_density'].str.strip()
-    dfm.loc[:,'Type_of_order'] = dfm.loc[:,'Type_of_order'].str.strip()
-    dfm.loc[:,'Type_of_vehicle'] = dfm.loc[:,'Type_of_vehicle'].str.strip()
-    dfm.loc[:,'City'] = dfm.loc[:,'City'].str.strip()
-    dfm.loc[:,'Festival'] = dfm.loc[:,'Festival'].str.strip()
-
-    # Retira o '(min) ', deixando apenas o tempo.
-    dfm['Time_taken(min)'] = dfm['Time_taken(min)'].apply( lambda x: x.split( '(min) ')[1] )
-    # Transformar em inteiro
-    dfm['Time_taken(min)'] = dfm['Time_taken(min)'].astype(int)
-    
-    return dfm 
+def heat_map( celulas, chave, bounds = None ):
+    # Mapa de calor a partir dos agregados por célula da grade espacial, com o mesmo cache dos mapas
+    with stage( 'heatmap_html' ):
+        html = cached_heatmap_html( celulas, chave, bounds )
+    with stage( 'components.html heat_map' ):
+        components.html( html, width=1024, height=610 )
+    return None
 
 #---------------------------- Início da estrutura lógica do código -----------------------
-# importando o dataset
-df = pd.read_csv('train.csv')
+# Tempos de cada etapa do rerun (ver utils/timing.py)
+begin( 'empresa' )
 
-# Guarda o conteúdo do DF original em uma cópia dfm (data frame moderado)
-dfm = df.copy()
+# Thread que mantém os dados em dia fora dos reruns (ver utils/refresher.py)
+start_refresher( 'train.csv' )
 
-#------------------------------
-# Limpando o dataframe
-#------------------------------
-dfm = clean_code( dfm )
+# importando o dataset
+if BACKEND == 'duckdb':
+    # Backend SQL (CURRY_BACKEND=duckdb): os pedidos ficam em um banco DuckDB (ver utils/sql.py)
+    with stage( 'open_database' ):
+        db = open_database( 'train.csv' )
+else:
+    # Leitura e limpeza ficam em cache no processo (ver utils/dataset.py)
+    with stage( 'load_data' ):
+        dfm = load_data( 'train.csv' )
+    # Índices dos filtros da barra lateral
+    with stage( 'load_filter_index' ):
+        filter_index = load_derived( build_filter_index, 'train.csv' )
+    # Cubo de agregados pré-calculados (ver utils/cube.py), usado pelos gráficos agrupados
+    with stage( 'load_cube' ):
+        cube = load_cube( 'train.csv' )
+    # Índice espacial em grade (ver utils/spatial.py), usado pelo mapa de calor e pela região do mapa
+    with stage( 'load_spatial_index' ):
+        spatial_index = load_derived( build_spatial_index, 'train.csv' )
 
 # =================================================
 # Barra lateral
@@ -213,55 +137,142 @@ traffic_options = st.sidebar.multiselect( 'Quais as condições do trânsito?',
 st.sidebar.markdown("""---""")
 st.sidebar.markdown('### Powered by CDS')
 
-# Filtro de data (datas menores do que a selecionada)
-linhas_selecionadas = dfm['Order_Date'] < date_slider 
-dfm = dfm.loc[ linhas_selecionadas, :] 
-
-# Filtro de trânsito 
-# A função 'isin' seleciona apenas as linhas cujas condições de tráfego foram passadas pelo usuário na seleção 
-linhas_selecionadas = dfm['Road_traffic_density'].isin( traffic_options )
-dfm = dfm.loc[ linhas_selecionadas, :] 
+# Filtros de data (datas menores do que a selecionada) e de trânsito
+# A data limite é uma busca binária sobre as datas ordenadas e o trânsito é um OR dos bitmaps das
+# condições escolhidas pelo usuário (ver utils/filters.py). Os filtros só são aplicados quando
+# algum gráfico da visão escolhida precisa ser recalculado.
+if BACKEND == 'duckdb':
+    # Os filtros entram no WHERE de cada consulta; pedidos e cubo são o mesmo filtro SQL
+    fonte = filter_orders( db, date_slider, traffic_options, approx = APPROX )
+    versao = db['version']
+else:
+    versao = data_version( 'train.csv' )
+
+# Estado que identifica o mapa: backend, versão dos dados e filtros
+chave = ( BACKEND, versao, date_slider, tuple( sorted( traffic_options ) ) )
+
+def linhas():
+    # Posições dos pedidos filtrados (calculadas uma única vez por rerun)
+    if 'linhas' not in filtrados:
+        with stage( 'filter_rows' ):
+            filtrados['linhas'] = filter_rows( filter_index, date_slider, traffic_options )
+    return filtrados['linhas']
+
+def pedidos():
+    # Pedidos filtrados como seleção de linhas do dataframe compartilhado, sem cópia (ver utils/filters.py)
+    if BACKEND == 'duckdb':
+        return fonte
+    return selection( dfm, linhas() )
+
+def celulas():
+    # Mesmos filtros aplicados às células do cubo
+    if BACKEND == 'duckdb':
+        return fonte
+    if 'cube' not in filtrados:
+        with stage( 'filter_cube' ):
+            filtrados['cube'] = filter_cube( cube, date_slider, traffic_options )
+    return filtrados['cube']
+
+def esbocos():
+    # Modo aproximado (CURRY_APPROX=1): sketches filtrados, usados para entregadores distintos e medianas
+    # (ver utils/sketches.py); sem ele, os mesmos gráficos saem do cubo e dos pedidos
+    if BACKEND == 'duckdb':
+        return fonte
+    if 'sketches' not in filtrados:
+        with stage( 'filter_sketches' ):
+            filtrados['sketches'] = filter_cube( load_sketches( 'train.csv' ), date_slider, traffic_options )
+    return filtrados['sketches']
+
+filtrados = {}
 
-#st.dataframe(dfm)
 # =================================================
 # Layout no Streamlit
 # =================================================
-# Criar três abas das visões do Dashboard
-tab1, tab2, tab3 = st.tabs( ['Visão Gerencial','Visão Tática','Visão Geográfica'] )
+# Seletor das três visões do Dashboard (no lugar de st.tabs, que executa o conteúdo de todas as abas)
+visao = st.radio( 'Visão', VIEWS, horizontal = True, label_visibility = 'collapsed' )
 
-# Tudo o que estiver indentado dentro de 'with' vai ficar dentro da tab1 ('Visão Gerencial')
-with tab1:
-    # Visão Gerencial
+if visao == 'Visão Gerencial':
     with st.container(): # Cria um container para alocar a figura de 'Pedidos por dia'
         st.markdown('# Orders by day')
-        fig = order_metric( dfm )
-        st.plotly_chart( fig, use_container_width = True )
+        fig = memo_figure( 'order_metric', lambda: order_metric( celulas() ) )
+        with stage( 'plotly_chart order_metric' ):
+            st.plotly_chart( fig, use_container_width = True )
         
     with st.container(): # Cria um outro container para alocar as duas colunas abaixo
-        # Cria duas colunas dentro da tab1
+        # Cria duas colunas dentro da visão
         col1, col2 = st.columns( 2 )
         with col1:
             st.header('Traffic Order share')
-            fig = traffic_order_share( dfm )
-            st.plotly_chart( fig, use_container_width = True )
+            fig = memo_figure( 'traffic_order_share', lambda: traffic_order_share( celulas() ) )
+            with stage( 'plotly_chart traffic_order_share' ):
+                st.plotly_chart( fig, use_container_width = True )
                                                  
         with col2:
             st.header('Traffic Order city')
-            fig = traffic_order_city( dfm )
-            st.plotly_chart( fig, use_container_width = True )
+            fig = memo_figure( 'traffic_order_city', lambda: traffic_order_city( celulas() ) )
+            with stage( 'plotly_chart traffic_order_city' ):
+                st.plotly_chart( fig, use_container_width = True )
             
-with tab2:
+elif visao == 'Visão Tática':
     with st.container(): 
         st.markdown('# Orders by week')
-        fig = order_by_week( dfm )
-        st.plotly_chart( fig, use_container_width = True )
+        fig = memo_figure( 'order_by_week', lambda: order_by_week( celulas() ) )
+        with stage( 'plotly_chart order_by_week' ):
+            st.plotly_chart( fig, use_container_width = True )
     
     with st.container(): 
         st.markdown('# Order share by week')
-        fig = order_share_by_week( dfm )
-        st.plotly_chart( fig, use_container_width = True )
+        fig = memo_figure( 'order_share_by_week', lambda: order_share_by_week( esbocos() if APPROX else celulas() ) )
+        with stage( 'plotly_chart order_share_by_week' ):
+            st.plotly_chart( fig, use_container_width = True )
     
-with tab3:
+else:
     st.header('India Map')
-    india_map( dfm )
-   
+    col1, col2, col3 = st.columns( [2, 1, 1] )
+    camada = col1.radio( 'Camada', MAP_LAYERS, horizontal = True )
+    tipo = col2.radio( 'Pontos', list( POINT_NAMES ), format_func = POINT_NAMES.get, horizontal = True,
+                       disabled = camada != 'Mapa de calor' )
+    # As medianas e cada entrega marcam o local de entrega; o tipo de ponto escolhe o mapa de calor e a região
+    tipo = tipo if camada == 'Mapa de calor' else 'delivery'
+    regiao = None
+    if col3.checkbox( 'Zoom em uma região' ):
+        col1, col2, col3 = st.columns( 3 )
+        regiao = ( col1.number_input( 'Latitude', -90.0, 90.0, 22.72, format = '%.4f' ),
+                   col2.number_input( 'Longitude', -180.0, 180.0, 75.86, format = '%.4f' ),
+                   col3.number_input( 'Raio (km)', 0.5, 500.0, 50.0 ) )
+
+    def pedidos_regiao():
+        # Pedidos filtrados cujo ponto está no raio escolhido (busca na grade, ver utils/spatial.py)
+        if regiao is None:
+            return pedidos()
+        if BACKEND == 'duckdb':
+            return within_radius( fonte, *POINTS[tipo], *regiao )
+        if 'regiao' not in filtrados:
+            with stage( 'query_radius' ):
+                filtrados['regiao'] = query_radius( spatial_index, dfm, *regiao, tipo, rows = linhas() )
+        return filtrados['regiao']
+
+    def celulas_mapa():
+        # Pedidos e tempo médio por célula; o nível de agregação mantém o mapa com até HEATMAP_CELLS células
+        limites = region_bounds( *regiao ) if regiao else extent( fonte if BACKEND == 'duckdb' else spatial_index, tipo )
+        nivel = auto_level( limites ) if limites else 0
+        with stage( 'cell_aggregates' ):
+            if BACKEND == 'duckdb':
+                return sql_cell_aggregates( pedidos_regiao(), tipo, nivel )
+            return cell_aggregates( spatial_index, tipo, pedidos_regiao() if regiao else linhas(), nivel )
+
+    chave_mapa = ( chave, camada, tipo, regiao )
+    limites = region_bounds( *regiao ) if regiao else None
+    if camada == 'Mapa de calor':
+        heat_map( celulas_mapa, chave_mapa, limites )
+    elif regiao is not None:
+        # Na região, os marcadores saem dos pedidos do raio (as medianas não usam os sketches)
+        def pedidos_mapa():
+            return pedidos_regiao() if BACKEND == 'duckdb' else selection( dfm, pedidos_regiao() )
+        india_map( pedidos_mapa, chave_mapa, camada == 'Cada entrega', limites )
+    else:
+        por_pedido = camada == 'Cada entrega'
+        india_map( esbocos if APPROX and not por_pedido else pedidos, chave_mapa, por_pedido )
+
+# Encerra a medição do rerun; os tempos aparecem na barra lateral quando a opção de debug está ligada
+debug_panel( st.sidebar )
@@ -1,119 +1,56 @@
 # Libraries
+import math
+
 import pandas as pd
-import numpy as np
 import streamlit as st
 from PIL import Image
 
+from utils.charts import avg_by_traffic_or_weather
+from utils.cube import extremes, filter_cube, load_cube
+from utils.dataset import data_version, load_data, load_derived
+from utils.filters import build_filter_index, filter_rows, selection
+from utils.profiles import SORT_COLUMNS, cached_profiles, profile_page, select_profiles
+from utils.rankings import top_k_by_city
+from utils.refresher import start_refresher
+from utils.sql import BACKEND, filter_orders, open_database
+from utils.timing import begin, debug_panel, stage
+
 st.set_page_config( 
         page_title = 'Visão Entregadores',
         page_icon = '📦',
         layout = 'wide'
 )
 
-# -------------------------------------
-# Funções
-# -------------------------------------
-def avg_by_traffic_or_weather( dfm, col):
-    dfm_sel_mean_std = ( dfm.loc[:,['Delivery_person_Ratings', col]]
-                            .groupby([col])
-                            .agg( {'Delivery_person_Ratings':['mean','std']} ) )
-    dfm_sel_mean_std.columns = ['mean','std']
-    return dfm_sel_mean_std.reset_index()
-        
-def top_delivers( dfm, parameter_asc ):
-    cols = ['Delivery_person_ID','City','Time_taken(min)']
-    dfm_sel_6 = dfm.loc[:,cols].groupby(['City','Delivery_person_ID']).mean()
-    dfm_sel_6 = dfm_sel_6.sort_values(['City','Time_taken(min)'], ascending = parameter_asc ).reset_index()
-    return dfm_sel_6
-        
-# Limpeza dos dados
-def clean_code( dfm ):
-    """Esta função possui a responsabilidade de limpar o dataframe.
-       Tipos de limpeza:
-       
-       1 - Remoção de dados faltantes do tipo NaN
-       2 - Conversão de tipos de dados nas colunas
-       3 - Remoção dos espaços nas colunas (vaiáveis de texto)
-       4 - Formatação da coluna de datas
-       5 - Limpeza da coluna de tempo (remoção do texto ans do número)
-       
-       Input: Dataframe
-       Output: Dataframe
-    """
-    # Exclui as linhas com dados faltantes na coluna 'Delivery_person_Age'
-    linhas_selecionadas = dfm['Delivery_person_Age'] != 'NaN '
-    dfm = dfm.loc[linhas_selecionadas, :].copy()
-
-    # Exclui as linhas com dados faltantes na coluna 'Road_traffic_density'
-    linhas_selecionadas = dfm['Road_traffic_density'] != 'NaN '
-    dfm = dfm.loc[linhas_selecionadas, :].copy()
-
-    # Exclui as linhas com dados faltantes na coluna 'City'
-    linhas_selecionadas = dfm['City'] != 'NaN '
-    dfm = dfm.loc[linhas_selecionadas, :].copy()
-
-    # Exclui as linhas com dados faltantes na coluna 'Festival'
-    linhas_selecionadas = dfm['Festival'] != 'NaN '
-    dfm = dfm.loc[linhas_selecionadas, :].copy()
-
-    # Converte os dados dessa coluna de texto para int
-    dfm['Delivery_person_Age'] = dfm['Delivery_person_Age'].astype(int)
-
-    # Converte os dados dessa coluna de texto para float
-    dfm['Delivery_person_Ratings'] = dfm['Delivery_person_Ratings'].astype(float)
-
-    # Converte as datas anteriormente em formato de objeto para datetime
-    dfm['Order_Date'] = pd.to_datetime(dfm['Order_Date'], format = '%d-%m-%Y' )
-
-    # Exclui as linhas com dados faltantes na coluna 'multiple_deliveries'
-    linhas_selecionadas_multiple_deliveries = dfm['multiple_deliveries'] != 'NaN '
-    dfm = dfm.loc[linhas_selecionadas_multiple_deliveries, :].copy()
-    # Converte os dados dessa coluna de texto para int
-    dfm['multiple_deliveries'] = dfm['multiple_deliveries'].astype(int)
-
-    # Reordena os índices do DF
-    dfm = dfm.reset_index(drop=True)
-    # Extrai os espaços em branco dos dados na colunas 'ID', 'Road_traffic_density', 'Type_of_order', 'Type_of_vehicle', 'Festival' e 'City'
-    dfm.loc[:,'ID'] = dfm.loc[:,'ID'].str.strip()
-    dfm.loc[:,'Road_traffic_density'] = dfm.loc[:,'Road_traffic_density'].str.strip()
-    dfm.loc[:,'Type_of_order'] = dfm.loc[:,'Type_of_order'].str.strip()
-    dfm.loc[:,'Type_of_vehicle'] = dfm.loc[:,'Type_of_vehicle'].str.strip()
-    dfm.loc[:,'City'] = dfm.loc[:,'City'].str.strip()
-    dfm.loc[:,'Festival'] = dfm.loc[:,'Festival'].str.strip()
-
-    # Retira o '(min) ', deixando apenas o tempo.
-    dfm['Time_taken(min)'] = dfm['Time_taken(min)'].apply( lambda x: x.split( '(min) ')[1] )
-    # Transformar em inteiro
-    dfm['Time_taken(min)'] = dfm['Time_taken(min)'].astype(int)
-    
-    return dfm
-
-
-def recorte_data_frame(lista, data):
-    lista_data_frames = []
-    # Gera uma lista formada pelos data frames representativos de cada cidade
-    # com 10 linhas cada.
-    for elem in lista:
-        lista_data_frames.append(data.loc[data["City"]==elem,:].head(10)) 
-    # Concatena os data frames da lista para compor um novo data frame
-    for i in range(len(lista_data_frames)):
-        df_final = pd.concat(lista_data_frames).reset_index(drop=True)
-    
-    return df_final
+# Quantidade de entregadores por cidade nos rankings de velocidade
+TOP_K = 10
+
+# Entregadores por página na tabela de perfis
+PAGE_SIZE = 50
 
 # --------------------------- Inicio da Estrutura lógica do código --------------------------
 # ------------------------
 # Import dataset
 # ------------------------
-df = pd.read_csv('train.csv')
-
-# Guarda o conteúdo do DF original em uma cópia dfm (data frame moderado)
-dfm = df.copy()
-
-# ------------------------
-# Limpando os dados
-# ------------------------
-dfm = clean_code( dfm )
+# Tempos de cada etapa do rerun (ver utils/timing.py)
+begin( 'entregadores' )
+
+# Thread que mantém os dados em dia fora dos reruns (ver utils/refresher.py)
+start_refresher( 'train.csv' )
+
+if BACKEND == 'duckdb':
+    # Backend SQL (CURRY_BACKEND=duckdb): os pedidos ficam em um banco DuckDB (ver utils/sql.py)
+    with stage( 'open_database' ):
+        db = open_database( 'train.csv' )
+else:
+    # Leitura e limpeza ficam em cache no processo (ver utils/dataset.py)
+    with stage( 'load_data' ):
+        dfm = load_data( 'train.csv' )
+    # Índices dos filtros da barra lateral
+    with stage( 'load_filter_index' ):
+        filter_index = load_derived( build_filter_index, 'train.csv' )
+    # Cubo de agregados pré-calculados (ver utils/cube.py), usado pelos gráficos agrupados
+    with stage( 'load_cube' ):
+        cube = load_cube( 'train.csv' )
 
 # =================================================
 # Barra lateral
@@ -154,14 +91,23 @@ traffic_options = st.sidebar.multiselect( 'Quais as condições do trânsito?',
 st.sidebar.markdown("""---""")
 st.sidebar.markdown('### Powered by CDS')
 
-# Filtro de data (datas menores do que a selecionada)
-linhas_selecionadas = dfm['Order_Date'] < date_slider 
-dfm = dfm.loc[ linhas_selecionadas, :] 
-
-# Filtro de trânsito 
-# A função 'isin' seleciona apenas as linhas cujas condições de tráfego foram passadas pelo usuário na seleção 
-linhas_selecionadas = dfm['Road_traffic_density'].isin( traffic_options )
-dfm = dfm.loc[ linhas_selecionadas, :] 
+# Filtros de data (datas menores do que a selecionada) e de trânsito
+# A data limite é uma busca binária sobre as datas ordenadas e o trânsito é um OR dos bitmaps das
+# condições escolhidas pelo usuário (ver utils/filters.py)
+if BACKEND == 'duckdb':
+    # Os filtros entram no WHERE de cada consulta; dfm e cube são o mesmo filtro SQL
+    dfm = cube = filter_orders( db, date_slider, traffic_options )
+    versao = db['version']
+else:
+    versao = data_version( 'train.csv' )
+    with stage( 'filter_rows' ):
+        # Só as posições das linhas: o dataframe compartilhado não é copiado, e perfis e rankings
+        # leem apenas as colunas que usam (ver selection em utils/filters.py)
+        dfm = selection( dfm, filter_rows( filter_index, date_slider, traffic_options ) )
+
+    # Mesmos filtros aplicados às células do cubo
+    with stage( 'filter_cube' ):
+        cube = filter_cube( cube, date_slider, traffic_options )
 
 # =================================================
 # Layout no Streamlit
@@ -171,46 +117,61 @@ with st.container():
     st.title( 'Overall Metrics' )
     col1, col2, col3, col4 = st.columns( 4, gap = 'large' ) 
     # Esse 'gap' fornece a distância entre entre as colunas
+    menor_idade, maior_idade = extremes( cube, 'Delivery_person_Age' )
+    pior, melhor = extremes( cube, 'Vehicle_condition' )
     with col1:
         # A maior idade dos entregadores
-        maior_idade = dfm['Delivery_person_Age'].max()
         col1.metric( 'Maior idade', maior_idade )
 
     with col2:
         # A menor idade dos entregadores
-        menor_idade = dfm['Delivery_person_Age'].min()
         col2.metric( 'Menor idade', menor_idade )
 
     with col3:
         # A melhor condição dos veículos
-        melhor = dfm['Vehicle_condition'].max()
         col3.metric( 'Melhor condição', melhor )
 
     with col4:
         # A pior condição dos veículos
-        pior = dfm['Vehicle_condition'].min()
         col4.metric( 'Pior condição', pior )
 
 with st.container():
     st.markdown( """---""" )  # Cria-se uma linha para separar do outro container
     st.title( 'Avaliações' )
-    col1, col2 = st.columns( 2 )
-
+    st.subheader( 'Perfil dos entregadores' )
+    # Os perfis ficam em cache compartilhado por estado dos filtros (ver utils/profiles.py); busca,
+    # ordenação e paginação são feitas aqui e só as linhas da página vão para o navegador
+    with stage( 'cached_profiles' ):
+        perfis = cached_profiles( dfm, ( BACKEND, versao, date_slider, tuple( sorted( traffic_options ) ) ) )
+    col1, col2, col3 = st.columns( [2, 2, 1] )
     with col1:
-        st.subheader( 'Avaliações médias por entregador' )
-        cols = ['Delivery_person_ID','Delivery_person_Ratings']
-        dfm_sel_3 = ( dfm.loc[:,cols].groupby(['Delivery_person_ID'])
-                                   .mean()
-                                   .reset_index() )
-        dfm_sel_3.columns = ['Delivery_person_ID','Nota_media_por_entregador']
-        st.dataframe( dfm_sel_3 )
-
+        busca = st.text_input( 'Buscar entregador (ID)' )
     with col2:
+        ordenar_por = st.selectbox( 'Ordenar por', SORT_COLUMNS, index = SORT_COLUMNS.index( 'Pedidos' ) )
+    with col3:
+        decrescente = st.checkbox( 'Decrescente', value = True )
+    with stage( 'select_profiles' ):
+        posicoes = select_profiles( perfis, busca, ordenar_por, decrescente )
+    n_paginas = max( 1, math.ceil( len( posicoes ) / PAGE_SIZE ) )
+    pagina = st.number_input( f'Página (de {n_paginas})', min_value = 1, max_value = n_paginas, value = 1, step = 1 )
+    with stage( 'dataframe profile_page' ):
+        st.dataframe( profile_page( perfis, posicoes, int( pagina ) - 1, PAGE_SIZE ), use_container_width = True )
+    st.caption( f'{len( posicoes )} entregadores' )
+
+    col1, col2 = st.columns( 2 )
+    with col1:
         st.subheader( 'Avaliações médias por trânsito' )
-        st.dataframe( avg_by_traffic_or_weather( dfm, 'Road_traffic_density') )
+        with stage( 'avg_by_traffic_or_weather Road_traffic_density' ):
+            tabela = avg_by_traffic_or_weather( cube, 'Road_traffic_density')
+        with stage( 'dataframe avg_by_traffic_or_weather Road_traffic_density' ):
+            st.dataframe( tabela )
 
+    with col2:
         st.subheader( 'Avaliações médias por condições climáticas' )
-        st.dataframe( avg_by_traffic_or_weather( dfm, 'Weatherconditions') )
+        with stage( 'avg_by_traffic_or_weather Weatherconditions' ):
+            tabela = avg_by_traffic_or_weather( cube, 'Weatherconditions')
+        with stage( 'dataframe avg_by_traffic_or_weather Weatherconditions' ):
+            st.dataframe( tabela )
 
 with st.container():
     st.markdown( """---""" )  # Cria-se uma linha para separar do outro container
@@ -218,9 +179,16 @@ with st.container():
     col1, col2 = st.columns( 2 )
     with col1:
         st.subheader( 'Top entregadores mais rápidos' )
-        lista_cidades = list(dfm['City'].unique())
-        st.dataframe( recorte_data_frame(lista_cidades, top_delivers( dfm, parameter_asc = True )) )
+        # Os dois rankings saem de uma única passagem (ver utils/rankings.py)
+        with stage( 'top_k_by_city' ):
+            mais_rapidos, mais_lentos = top_k_by_city( dfm, k = TOP_K )
+        with stage( 'dataframe mais_rapidos' ):
+            st.dataframe( mais_rapidos )
 
     with col2:
         st.subheader( 'Top entregadores mais lentos' )
-        st.dataframe( recorte_data_frame(lista_cidades, top_delivers( dfm, parameter_asc = False )) )
\ No newline at end of file
+        with stage( 'dataframe mais_lentos' ):
+            st.dataframe( mais_lentos )
+
+# Encerra a medição do rerun; os tempos aparecem na barra lateral quando a opção de debug está ligada
+debug_panel( st.sidebar )
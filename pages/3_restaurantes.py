@@ -1,15 +1,18 @@
 # Libraries
 import pandas as pd
-import numpy as np
 import streamlit as st
 from PIL import Image
-from haversine import haversine   # Biblioteca para o cálculo das distâncias (latitude, longitude)
 
-# from matplotlib import pyplot as plt
-import plotly.express as px
 import plotly.graph_objects as go
-import folium
-from streamlit_folium import folium_static
+
+from utils.charts import avg_std_time_plot, distance, pizza_sunburst
+from utils.cube import cube_version, distinct_drivers, filter_cube, load_cube, rollup_stats
+from utils.figures import cached_figure
+from utils.refresher import start_refresher
+from utils.sketches import APPROX, load_sketches, quantiles
+from utils.sketches import distinct_drivers as approx_distinct_drivers
+from utils.sql import BACKEND, filter_orders, open_database
+from utils.timing import begin, debug_panel, stage
 
 st.set_page_config( 
         page_title = 'Visão Restaurantes',
@@ -17,117 +20,27 @@ st.set_page_config(
         layout = 'wide'
 )
 
-# -------------------------------------
-# Funções
-# -------------------------------------
-def pizza_sunburst( dfm ):
-    cols = ['City','Road_traffic_density','Time_taken(min)']
-    dfm_sel_5 = dfm.loc[:,cols].groupby(['City','Road_traffic_density']).agg( { 'Time_taken(min)': ['mean','std'] }).reset_index()
-    dfm_sel_5.columns = ['City','Road_traffic_density','mean','std']
-
-    return px.sunburst( dfm_sel_5, path = ['City','Road_traffic_density'], values = 'mean', color = 'std', 
-                       color_continuous_scale = 'RdBu', color_continuous_midpoint = np.average( dfm_sel_5['std'] ) )
-        
-def avg_std_time_plot( dfm ):
-    df_sel_3 = dfm.loc[:,['City','Time_taken(min)']].groupby('City').agg( { 'Time_taken(min)': ['mean','std'] }).reset_index()
-    df_sel_3.columns = ['City','mean','std']
-    fig = go.Figure()
-    fig.add_trace( go.Bar( name = 'Control',
-                           x = df_sel_3['City'],
-                           y = df_sel_3['mean'],
-                           error_y = dict( type = 'data', array = df_sel_3['std'] )
-                         ) 
-                 )
-    return fig.update_layout( barmode = 'group')
-
-def distance( dfm, metrica = 'Yes' ):
-    cols = ['Restaurant_latitude','Restaurant_longitude','Delivery_location_latitude','Delivery_location_longitude']
-    dfm['Distance (km)'] = ( dfm.loc[:,cols]
-                              .apply( lambda x: haversine( 
-                                                         (x['Restaurant_latitude'],x['Restaurant_longitude']),                                                                                                    (x['Delivery_location_latitude'],x['Delivery_location_longitude']) 
-                                                         ), 
-                                      axis = 1 ) 
-                           ) 
-    if metrica == 'Yes':
-        return round( dfm.loc[:,'Distance (km)'].mean(), 2)
-    else:
-        return dfm.loc[:,['City','Distance (km)']].groupby(['City']).mean().reset_index()
-            
-# Limpeza dos dados
-def clean_code( dfm ):
-    """Esta função possui a responsabilidade de limpar o dataframe.
-       Tipos de limpeza:
-       
-       1 - Remoção de dados faltantes do tipo NaN
-       2 - Conversão de tipos de dados nas colunas
-       3 - Remoção dos espaços nas colunas (vaiáveis de texto)
-       4 - Formatação da coluna de datas
-       5 - Limpeza da coluna de tempo (remoção do texto ans do número)
-       
-       Input: Dataframe
-       Output: Dataframe
-    """
-    # Exclui as linhas com dados faltantes na coluna 'Delivery_person_Age'
-    linhas_selecionadas = dfm['Delivery_person_Age'] != 'NaN '
-    dfm = dfm.loc[linhas_selecionadas, :].copy()
-
-    # Exclui as linhas com dados faltantes na coluna 'Road_traffic_density'
-    linhas_selecionadas = dfm['Road_traffic_density'] != 'NaN '
-    dfm = dfm.loc[linhas_selecionadas, :].copy()
-
-    # Exclui as linhas com dados faltantes na coluna 'City'
-    linhas_selecionadas = dfm['City'] != 'NaN '
-    dfm = dfm.loc[linhas_selecionadas, :].copy()
-
-    # Exclui as linhas com dados faltantes na coluna 'Festival'
-    linhas_selecionadas = dfm['Festival'] != 'NaN '
-    dfm = dfm.loc[linhas_selecionadas, :].copy()
-
-    # Converte os dados dessa coluna de texto para int
-    dfm['Delivery_person_Age'] = dfm['Delivery_person_Age'].astype(int)
-
-    # Converte os dados dessa coluna de texto para float
-    dfm['Delivery_person_Ratings'] = dfm['Delivery_person_Ratings'].astype(float)
-
-    # Converte as datas anteriormente em formato de objeto para datetime
-    dfm['Order_Date'] = pd.to_datetime(dfm['Order_Date'], format = '%d-%m-%Y' )
-
-    # Exclui as linhas com dados faltantes na coluna 'multiple_deliveries'
-    linhas_selecionadas_multiple_deliveries = dfm['multiple_deliveries'] != 'NaN '
-    dfm = dfm.loc[linhas_selecionadas_multiple_deliveries, :].copy()
-    # Converte os dados dessa coluna de texto para int
-    dfm['multiple_deliveries'] = dfm['multiple_deliveries'].astype(int)
-
-    # Reordena os índices do DF
-    dfm = dfm.reset_index(drop=True)
-    # Extrai os espaços em branco dos dados na colunas 'ID', 'Road_traffic_density', 'Type_of_order', 'Type_of_vehicle', 'Festival' e 'City'
-    dfm.loc[:,'ID'] = dfm.loc[:,'ID'].str.strip()
-    dfm.loc[:,'Road_traffic_density'] = dfm.loc[:,'Road_traffic_density'].str.strip()
-    dfm.loc[:,'Type_of_order'] = dfm.loc[:,'Type_of_order'].str.strip()
-    dfm.loc[:,'Type_of_vehicle'] = dfm.loc[:,'Type_of_vehicle'].str.strip()
-    dfm.loc[:,'City'] = dfm.loc[:,'City'].str.strip()
-    dfm.loc[:,'Festival'] = dfm.loc[:,'Festival'].str.strip()
-
-    # Retira o '(min) ', deixando apenas o tempo.
-    dfm['Time_taken(min)'] = dfm['Time_taken(min)'].apply( lambda x: x.split( '(min) ')[1] )
-    # Transformar em inteiro
-    dfm['Time_taken(min)'] = dfm['Time_taken(min)'].astype(int)
-    
-    return dfm
+# Os gráficos desta página são montados pelas funções de utils/charts.py
 
 # --------------------------- Inicio da Estrutura lógica do código --------------------------
 # ------------------------
 # Import dataset
 # ------------------------
-df = pd.read_csv('train.csv')
-
-# Guarda o conteúdo do DF original em uma cópia dfm (data frame moderado)
-dfm = df.copy()
-
-# ------------------------
-# Limpando os dados
-# ------------------------
-dfm = clean_code( dfm )
+# Leitura e limpeza ficam em cache no processo (ver utils/dataset.py).
+# Todos os indicadores desta página saem do cubo de agregados pré-calculados (ver utils/cube.py),
+# que também pode ser montado em modo streaming, sem carregar o dataset inteiro
+# Tempos de cada etapa do rerun (ver utils/timing.py)
+begin( 'restaurantes' )
+
+# Thread que mantém os dados em dia fora dos reruns (ver utils/refresher.py)
+start_refresher( 'train.csv' )
+if BACKEND == 'duckdb':
+    # Backend SQL (CURRY_BACKEND=duckdb): os indicadores saem de consultas ao banco DuckDB (ver utils/sql.py)
+    with stage( 'open_database' ):
+        db = open_database( 'train.csv' )
+else:
+    with stage( 'load_cube' ):
+        cube = load_cube( 'train.csv' )
 
 # =================================================
 # Barra lateral
@@ -167,14 +80,19 @@ traffic_options = st.sidebar.multiselect( 'Quais as condições do trânsito?',
 st.sidebar.markdown("""---""")
 st.sidebar.markdown('### Powered by CDS')
 
-# Filtro de data (datas menores do que a selecionada)
-linhas_selecionadas = dfm['Order_Date'] < date_slider 
-dfm = dfm.loc[ linhas_selecionadas, :] 
-
-# Filtro de trânsito 
-# A função 'isin' seleciona apenas as linhas cujas condições de tráfego foram passadas pelo usuário na seleção 
-linhas_selecionadas = dfm['Road_traffic_density'].isin( traffic_options )
-dfm = dfm.loc[ linhas_selecionadas, :] 
+# Filtros de data (datas menores do que a selecionada) e de trânsito aplicados às células do cubo
+if BACKEND == 'duckdb':
+    # Os filtros entram no WHERE de cada consulta
+    cube = esbocos = filter_orders( db, date_slider, traffic_options, approx = APPROX )
+    versao = ( BACKEND, db['version'] )
+else:
+    versao = ( BACKEND, cube_version( 'train.csv' ) )
+    with stage( 'filter_cube' ):
+        cube = filter_cube( cube, date_slider, traffic_options )
+    if APPROX:
+        # Modo aproximado (CURRY_APPROX=1): entregadores distintos e percentis saem dos sketches (ver utils/sketches.py)
+        with stage( 'filter_sketches' ):
+            esbocos = filter_cube( load_sketches( 'train.csv' ), date_slider, traffic_options )
 
 # =================================================
 # Layout no Streamlit
@@ -184,18 +102,21 @@ with st.container():
     col1, col2, col3, col4, col5, col6 = st.columns( 6 )
     with col1:
         # Entregadores únicos
-        qte_entregadores_unicos = dfm['Delivery_person_ID'].nunique()
-        col1.metric( 'Entregadores únicos', qte_entregadores_unicos )
+        with stage( 'distinct_drivers' ):
+            qte_entregadores_unicos = approx_distinct_drivers( esbocos ) if APPROX else distinct_drivers( cube )
+        col1.metric( 'Entregadores únicos (≈)' if APPROX else 'Entregadores únicos', qte_entregadores_unicos )
 
     with col2:
         # Distância média
-        col2.metric( 'Distância média (km)', distance( dfm, metrica = 'Yes' ) )
+        with stage( 'distance' ):
+            distancia_media = distance( cube, metrica = 'Yes' )
+        col2.metric( 'Distância média (km)', distancia_media )
 
     with col3:
         # Tempo de entrega médio c/Festival
-        dfm_sel_6 = dfm.loc[:,['Festival','Time_taken(min)']].groupby(['Festival']).agg( { 'Time_taken(min)': ['mean','std'] })
-        dfm_sel_6.columns = ['mean','std']
-        dfm_sel_6 = dfm_sel_6.reset_index()
+        with stage( 'rollup_stats Festival' ):
+            dfm_sel_6 = rollup_stats( cube, ['Festival'], 'Time_taken(min)' )
+        dfm_sel_6 = dfm_sel_6.loc[:,['Festival','mean','std']]
         tm_festival = round( dfm_sel_6.iloc[1,1], 2)
         col3.metric( 'Tempo médio C/Festival', tm_festival )
 
@@ -215,30 +136,54 @@ with st.container():
         std_sem_festival = round( dfm_sel_6.iloc[0,2], 2)
         col6.metric( 'Std S/Festival', std_sem_festival )
 
+    if APPROX:
+        # Percentis do tempo de entrega (aproximados, erro de posto de até ~1.6%)
+        with stage( 'quantiles Time_taken' ):
+            percentis = quantiles( esbocos, 'Time_taken(min)', [0.5, 0.9, 0.99] ).iloc[0]
+        col1, col2, col3, _, _, _ = st.columns( 6 )
+        col1.metric( 'Tempo p50 (≈)', round( percentis['p50'], 1 ) )
+        col2.metric( 'Tempo p90 (≈)', round( percentis['p90'], 1 ) )
+        col3.metric( 'Tempo p99 (≈)', round( percentis['p99'], 1 ) )
+
 with st.container():
     st.markdown("""---""")
     st.markdown("#### Distribuição da distância")
-    avg_distance = distance( dfm, metrica = 'No' )
-    fig = go.Figure( data=[ go.Pie( labels=avg_distance['City'], values=avg_distance['Distance (km)'], pull=[0, 0.1, 0])])
-    st.plotly_chart( fig )
+    def distance_pie():
+        avg_distance = distance( cube, metrica = 'No' )
+        return go.Figure( data=[ go.Pie( labels=avg_distance['City'], values=avg_distance['Distance (km)'], pull=[0, 0.1, 0])])
+    # As figuras ficam em cache compartilhado entre as sessões (ver utils/figures.py)
+    with stage( 'distance por cidade' ):
+        fig = cached_figure( 'distance_pie', date_slider, traffic_options, versao, distance_pie )
+    with stage( 'plotly_chart distance' ):
+        st.plotly_chart( fig )
 
 with st.container():
     st.markdown("""---""")
     col1, col2 = st.columns( 2 )
     with col1:
         st.markdown("#### Tempo médio de entrega por cidade")
-        st.plotly_chart( avg_std_time_plot( dfm ), use_container_width = True )
+        with stage( 'avg_std_time_plot' ):
+            fig = cached_figure( 'avg_std_time_plot', date_slider, traffic_options, versao,
+                                 lambda: avg_std_time_plot( cube ) )
+        with stage( 'plotly_chart avg_std_time_plot' ):
+            st.plotly_chart( fig, use_container_width = True )
 
     with col2:
         st.markdown("##### Distribuição do desvio padrão por cidade e trânsito")
-        st.plotly_chart( pizza_sunburst( dfm ) )
+        with stage( 'pizza_sunburst' ):
+            fig = cached_figure( 'pizza_sunburst', date_slider, traffic_options, versao,
+                                 lambda: pizza_sunburst( cube ) )
+        with stage( 'plotly_chart pizza_sunburst' ):
+            st.plotly_chart( fig )
 
 with st.container():
     st.markdown("""---""")
     st.markdown("##### Distribuição do desvio padrão por cidade e pedido")
-    cols = ['City','Type_of_order','Time_taken(min)']
-    dfm_sel_4 = dfm.loc[:,cols].groupby(['City','Type_of_order']).agg( { 'Time_taken(min)': ['mean','std'] }).reset_index()
-    dfm_sel_4.columns = ['City','Type_of_order','mean','std']
-    st.dataframe( dfm_sel_4 )
-
-
+    with stage( 'rollup_stats City x Type_of_order' ):
+        dfm_sel_4 = rollup_stats( cube, ['City','Type_of_order'], 'Time_taken(min)' )
+        dfm_sel_4 = dfm_sel_4.loc[:,['City','Type_of_order','mean','std']]
+    with stage( 'dataframe City x Type_of_order' ):
+        st.dataframe( dfm_sel_4 )
+
+# Encerra a medição do rerun; os tempos aparecem na barra lateral quando a opção de debug está ligada
+debug_panel( st.sidebar )
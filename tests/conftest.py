@@ -0,0 +1,53 @@
+# Libraries
+import os
+
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import generate_csv
+from utils.dataset import NAN_COLUMNS, STRIP_COLUMNS
+
+# Dataset original na raiz do repositório (não versionado; os testes que dependem dele são pulados sem ele)
+TRAIN_CSV = 'train.csv'
+
+# Tamanho do train.csv sintético usado quando o original não está disponível
+SYNTHETIC_ROWS = 20_000
+
+# Linhas do CSV curto de casos de borda (ver edge_case_csv)
+EDGE_ROWS = 60
+
+# -------------------------------------
+# Fixtures
+# -------------------------------------
+@pytest.fixture( scope = 'session' )
+def synthetic_csv( tmp_path_factory ):
+    """train.csv sintético (semente fixa, mesmos 'NaN ', espaços e prefixos do original)."""
+    return generate_csv( str( tmp_path_factory.mktemp( 'dados' ) / 'train.csv' ), SYNTHETIC_ROWS )
+
+@pytest.fixture( params = ['train.csv','synthetic'] )
+def orders_csv( request ):
+    """Caminho do train.csv original e do sintético."""
+    if request.param == 'synthetic':
+        return request.getfixturevalue( 'synthetic_csv' )
+    if not os.path.exists( TRAIN_CSV ):
+        pytest.skip( 'train.csv não encontrado na raiz do repositório' )
+    return TRAIN_CSV
+
+@pytest.fixture( scope = 'session' )
+def edge_case_csv( synthetic_csv, tmp_path_factory ):
+    """CSV curto com 'NaN ' em cada coluna de NAN_COLUMNS (em linhas diferentes e várias na mesma linha)
+       e espaços sobrando nas colunas de texto.
+
+       Os valores de texto das linhas descartadas (ex.: entregadores que só aparecem nelas) não
+       devem sobrar como categorias no resultado da limpeza.
+    """
+    raw = pd.read_csv( synthetic_csv, dtype = str, keep_default_na = False, nrows = EDGE_ROWS )
+    for i, col in enumerate( NAN_COLUMNS ):
+        raw.loc[3 * i, col] = 'NaN '
+    # Várias colunas com 'NaN ' na mesma linha
+    raw.loc[40, NAN_COLUMNS[:3]] = 'NaN '
+    for i, col in enumerate( STRIP_COLUMNS ):
+        raw.loc[i + 20, col] = '  ' + raw.loc[i + 20, col].strip() + '\t '
+    path = str( tmp_path_factory.mktemp( 'borda' ) / 'train.csv' )
+    raw.to_csv( path, index = False )
+    return path
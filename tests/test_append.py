@@ -0,0 +1,61 @@
+# Libraries
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import dataset
+from utils.cube import build_cube
+from utils.filters import build_filter_index, merge_filter_index
+from utils.spatial import POINTS, build_spatial_index, merge_spatial_index
+
+# Pedidos anexados em cada lote
+BATCH_ROWS = 2_000
+
+def raw_orders( path, in_order ):
+    """Pedidos brutos (texto, como no CSV); com in_order, ordenados por data para que o lote venha depois do histórico."""
+    raw = pd.read_csv( path, dtype = str, keep_default_na = False )
+    if in_order:
+        raw = raw.iloc[np.argsort( pd.to_datetime( raw['Order_Date'], format = '%d-%m-%Y' ).to_numpy(), kind = 'stable' )]
+    return raw.reset_index( drop = True )
+
+def assert_same_spatial( a, b ):
+    for kind in POINTS:
+        for col in ['cells','order','sorted']:
+            np.testing.assert_array_equal( a[kind][col], b[kind][col] )
+        np.testing.assert_array_equal( a[kind]['grid']['ids'], b[kind]['grid']['ids'] )
+        np.testing.assert_array_equal( a[kind]['grid']['orders'], b[kind]['grid']['orders'] )
+        np.testing.assert_allclose( a[kind]['grid']['time_sum'], b[kind]['grid']['time_sum'] )
+
+# -------------------------------------
+# Testes
+# -------------------------------------
+@pytest.mark.parametrize( 'corte', [0.01, 0.5, 0.99] )
+def test_merge_indexes_match_build( synthetic_csv, corte ):
+    dfm = dataset.read_orders( synthetic_csv )
+    n = int( len( dfm ) * corte )
+    historico, lote = dfm.iloc[:n].reset_index( drop = True ), dfm.iloc[n:].reset_index( drop = True )
+    assert_same_spatial( merge_spatial_index( build_spatial_index( historico ), lote ), build_spatial_index( dfm ) )
+    combinado, esperado = merge_filter_index( build_filter_index( historico ), lote ), build_filter_index( dfm )
+    np.testing.assert_array_equal( combinado['dates'], esperado['dates'] )
+    for col, bitmaps in esperado['bitmaps'].items():
+        for categoria, bits in bitmaps.items():
+            np.testing.assert_array_equal( combinado['bitmaps'][col][categoria], bits )
+
+@pytest.mark.parametrize( 'in_order', [True, False] )
+def test_append_batch_matches_full_read( synthetic_csv, tmp_path, in_order ):
+    # Dados e estruturas derivadas depois de anexar lotes = leitura completa do arquivo final
+    raw = raw_orders( synthetic_csv, in_order )
+    path = str( tmp_path / 'train.csv' )
+    raw.iloc[:-2 * BATCH_ROWS].to_csv( path, index = False )
+    dataset.load_data( path )
+    for builder in [build_cube, build_filter_index, build_spatial_index]:
+        dataset.load_derived( builder, path )
+    dataset.append_batch( raw.iloc[-2 * BATCH_ROWS:-BATCH_ROWS], path )
+    dataset.append_batch( raw.iloc[-BATCH_ROWS:], path )
+
+    esperado = dataset.read_orders( path )
+    pd.testing.assert_frame_equal( dataset.load_data( path ), esperado, check_exact = True )
+    pd.testing.assert_frame_equal( dataset.load_derived( build_cube, path )['cells'], build_cube( esperado )['cells'],
+                                   check_dtype = False, rtol = 1e-9 )
+    np.testing.assert_array_equal( dataset.load_derived( build_filter_index, path )['dates'], esperado['Order_Date'].to_numpy() )
+    assert_same_spatial( dataset.load_derived( build_spatial_index, path ), build_spatial_index( esperado ) )
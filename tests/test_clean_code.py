@@ -0,0 +1,108 @@
+# Libraries
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.dataset import NAN_COLUMNS, clean_code
+
+# -------------------------------------
+# Referência: clean_code original (anterior à limpeza em uma única passagem)
+# -------------------------------------
+def baseline_clean_code( dfm ):
+    # Exclui as linhas com dados faltantes na coluna 'Delivery_person_Age'
+    linhas_selecionadas = dfm['Delivery_person_Age'] != 'NaN '
+    dfm = dfm.loc[linhas_selecionadas, :].copy()
+
+    # Exclui as linhas com dados faltantes na coluna 'Road_traffic_density'
+    linhas_selecionadas = dfm['Road_traffic_density'] != 'NaN '
+    dfm = dfm.loc[linhas_selecionadas, :].copy()
+
+    # Exclui as linhas com dados faltantes na coluna 'City'
+    linhas_selecionadas = dfm['City'] != 'NaN '
+    dfm = dfm.loc[linhas_selecionadas, :].copy()
+
+    # Exclui as linhas com dados faltantes na coluna 'Festival'
+    linhas_selecionadas = dfm['Festival'] != 'NaN '
+    dfm = dfm.loc[linhas_selecionadas, :].copy()
+
+    # Converte os dados dessa coluna de texto para int
+    dfm['Delivery_person_Age'] = dfm['Delivery_person_Age'].astype(int)
+
+    # Converte os dados dessa coluna de texto para float
+    dfm['Delivery_person_Ratings'] = dfm['Delivery_person_Ratings'].astype(float)
+
+    # Converte as datas anteriormente em formato de objeto para datetime
+    dfm['Order_Date'] = pd.to_datetime(dfm['Order_Date'], format = '%d-%m-%Y' )
+
+    # Exclui as linhas com dados faltantes na coluna 'multiple_deliveries'
+    linhas_selecionadas_multiple_deliveries = dfm['multiple_deliveries'] != 'NaN '
+    dfm = dfm.loc[linhas_selecionadas_multiple_deliveries, :].copy()
+    # Converte os dados dessa coluna de texto para int
+    dfm['multiple_deliveries'] = dfm['multiple_deliveries'].astype(int)
+
+    # Reordena os índices do DF
+    dfm = dfm.reset_index(drop=True)
+    # Extrai os espaços em branco dos dados na colunas 'ID', 'Road_traffic_density', 'Type_of_order', 'Type_of_vehicle', 'Festival' e 'City'
+    dfm.loc[:,'ID'] = dfm.loc[:,'ID'].str.strip()
+    dfm.loc[:,'Road_traffic_density'] = dfm.loc[:,'Road_traffic_density'].str.strip()
+    dfm.loc[:,'Type_of_order'] = dfm.loc[:,'Type_of_order'].str.strip()
+    dfm.loc[:,'Type_of_vehicle'] = dfm.loc[:,'Type_of_vehicle'].str.strip()
+    dfm.loc[:,'City'] = dfm.loc[:,'City'].str.strip()
+    dfm.loc[:,'Festival'] = dfm.loc[:,'Festival'].str.strip()
+
+    # Retira o '(min) ', deixando apenas o tempo.
+    dfm['Time_taken(min)'] = dfm['Time_taken(min)'].apply( lambda x: x.split( '(min) ')[1] )
+    # Transformar em inteiro
+    dfm['Time_taken(min)'] = dfm['Time_taken(min)'].astype(int)
+    
+    return dfm
+
+def expected( raw ):
+    """Resultado da referência no formato atual de clean_code( raw, compact = False ).
+
+       clean_code também calcula 'Distance (km)' (conferida em test_geo.py) e ordena as linhas
+       por data de forma estável; fora isso, o resultado deve ser idêntico ao da referência.
+    """
+    return baseline_clean_code( raw ).sort_values( 'Order_Date', kind = 'mergesort', ignore_index = True )
+
+def assert_same_as_baseline( raw ):
+    novo = clean_code( raw.copy(), compact = False )
+    referencia = expected( raw.copy() )
+    assert list( novo.columns ) == list( referencia.columns ) + ['Distance (km)']
+    pd.testing.assert_frame_equal( novo.drop( columns = 'Distance (km)' ), referencia, check_exact = True )
+
+# -------------------------------------
+# Testes
+# -------------------------------------
+def test_clean_code_matches_baseline( orders_csv ):
+    assert_same_as_baseline( pd.read_csv( orders_csv ) )
+
+def test_clean_code_edge_cases( edge_case_csv ):
+    raw = pd.read_csv( edge_case_csv )
+    assert_same_as_baseline( raw )
+    # Cada linha marcada com 'NaN ' foi descartada
+    assert len( clean_code( raw, compact = False ) ) <= len( raw ) - len( NAN_COLUMNS ) - 1
+
+@pytest.mark.parametrize( 'col', NAN_COLUMNS )
+def test_clean_code_nan_in_single_column( synthetic_csv, col ):
+    raw = pd.read_csv( synthetic_csv, dtype = str, keep_default_na = False, nrows = 30 )
+    raw.loc[[1,7], col] = 'NaN '
+    buffer = io.StringIO()
+    raw.to_csv( buffer, index = False )
+    buffer.seek( 0 )
+    raw = pd.read_csv( buffer )
+    assert_same_as_baseline( raw )
+    assert not np.isin( clean_code( raw, compact = False )['ID'], raw.loc[[1,7], 'ID'].str.strip() ).any()
+
+def test_compact_schema_keeps_values( orders_csv ):
+    # O esquema compacto muda só os tipos (e descarta colunas não usadas): os valores são os mesmos
+    raw = pd.read_csv( orders_csv )
+    completo = clean_code( raw.copy(), compact = False )
+    compacto = clean_code( raw.copy(), compact = True )
+    for col in compacto.columns:
+        if compacto[col].dtype == np.float32:
+            np.testing.assert_allclose( compacto[col].to_numpy(), completo[col].to_numpy(), rtol = 1e-6 )
+        else:
+            pd.testing.assert_series_equal( compacto[col], completo[col], check_dtype = False, check_categorical = False )
@@ -0,0 +1,60 @@
+# Libraries
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.buckets import GRANULARITIES, rollup_buckets
+from utils.cube import build_cube, distinct_drivers, filter_cube, merge_cube
+from utils.dataset import read_orders
+
+# Filtros da barra lateral usados nas comparações
+FILTERS = [( pd.Timestamp( 2022, 4, 13 ), ['Low','Medium','High','Jam'] ),
+           ( pd.Timestamp( 2022, 3, 20 ), ['Jam'] ),
+           ( pd.Timestamp( 2022, 2, 1 ), ['Low'] )]
+
+@pytest.fixture( scope = 'module' )
+def orders( synthetic_csv ):
+    return read_orders( synthetic_csv )
+
+def filtered( dfm, date_slider, traffic_options ):
+    return dfm.loc[( dfm['Order_Date'] < date_slider ) & dfm['Road_traffic_density'].isin( traffic_options ), :]
+
+def driver_pairs( cube ):
+    """Pares (célula, ID do entregador) do cubo, ordenados."""
+    return pd.DataFrame( { 'cell': np.repeat( np.arange( len( cube['cells'] ) ), np.diff( cube['offsets'] ) ),
+                           'id': cube['driver_ids'][cube['drivers']].to_numpy() } ).sort_values( ['cell','id'], ignore_index = True )
+
+# -------------------------------------
+# Testes
+# -------------------------------------
+@pytest.mark.parametrize( 'date_slider, traffic_options', FILTERS )
+def test_distinct_drivers_exact( orders, date_slider, traffic_options ):
+    cube = filter_cube( build_cube( orders ), date_slider, traffic_options )
+    assert distinct_drivers( cube ) == filtered( orders, date_slider, traffic_options )['Delivery_person_ID'].nunique()
+
+@pytest.mark.parametrize( 'granularity', GRANULARITIES )
+def test_rollup_buckets_matches_orders( orders, granularity ):
+    date_slider, traffic_options = FILTERS[1]
+    cube = filter_cube( build_cube( orders ), date_slider, traffic_options )
+    pd.testing.assert_frame_equal( rollup_buckets( cube, granularity ),
+                                   rollup_buckets( filtered( orders, date_slider, traffic_options ), granularity ) )
+
+def test_driver_pairs_are_sparse( orders ):
+    # Um par por (célula, entregador) existente: no máximo um por pedido, e não células x entregadores
+    cube = build_cube( orders )
+    assert len( cube['drivers'] ) <= len( orders )
+    assert cube['offsets'][-1] == len( cube['drivers'] )
+    assert len( cube['offsets'] ) == len( cube['cells'] ) + 1
+
+@pytest.mark.parametrize( 'n_lotes', [2, 7] )
+def test_merge_cube_matches_build( orders, n_lotes ):
+    # Lotes em qualquer ordem de data: o cubo combinado é o mesmo do cubo montado de uma vez
+    lotes = np.array_split( orders.sample( frac = 1, random_state = 0 ), n_lotes )
+    cube = build_cube( lotes[0].reset_index( drop = True ) )
+    for lote in lotes[1:]:
+        cube = merge_cube( cube, lote.reset_index( drop = True ) )
+    esperado = build_cube( orders )
+    pd.testing.assert_frame_equal( cube['cells'], esperado['cells'], check_dtype = False, rtol = 1e-9 )
+    np.testing.assert_array_equal( cube['offsets'], esperado['offsets'] )
+    # Os códigos dos entregadores dependem da ordem de chegada: compara os IDs de cada par
+    pd.testing.assert_frame_equal( driver_pairs( cube ), driver_pairs( esperado ) )
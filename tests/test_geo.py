@@ -0,0 +1,36 @@
+# Libraries
+import numpy as np
+import pandas as pd
+from haversine import haversine
+
+from utils.dataset import COORD_COLUMNS, clean_code
+from utils.geo import haversine_km
+
+# Linhas sorteadas para a comparação com o pacote haversine (uma chamada por linha)
+SAMPLE_ROWS = 2_000
+
+# Tolerância da comparação (km): a fórmula e o raio da Terra são os mesmos
+TOLERANCE_KM = 1e-9
+
+# -------------------------------------
+# Testes
+# -------------------------------------
+def test_haversine_km_matches_haversine_package( orders_csv ):
+    raw = pd.read_csv( orders_csv )
+    amostra = raw.sample( min( SAMPLE_ROWS, len( raw ) ), random_state = 0 )
+    coords = [amostra[col].to_numpy( dtype = float ) for col in COORD_COLUMNS]
+    esperado = np.array( [haversine( ( lat1, lon1 ), ( lat2, lon2 ) ) for lat1, lon1, lat2, lon2 in zip( *coords )] )
+    assert np.allclose( haversine_km( *coords ), esperado, rtol = 0, atol = TOLERANCE_KM )
+
+def test_haversine_km_edge_points():
+    # Mesmo ponto, antípodas, polos e o antimeridiano
+    pontos = [( 0.0, 0.0, 0.0, 0.0 ), ( 0.0, 0.0, 0.0, 180.0 ), ( 90.0, 0.0, -90.0, 0.0 ),
+              ( 10.0, 179.9, 10.0, -179.9 ), ( -33.9, 151.2, 51.5, -0.1 )]
+    esperado = np.array( [haversine( ( a, b ), ( c, d ) ) for a, b, c, d in pontos] )
+    assert np.allclose( haversine_km( *np.array( pontos ).T ), esperado, rtol = 0, atol = TOLERANCE_KM )
+
+def test_distance_column( synthetic_csv ):
+    # 'Distance (km)' de clean_code é a distância de haversine de cada pedido
+    dfm = clean_code( pd.read_csv( synthetic_csv ), compact = False )
+    esperado = np.array( [haversine( ( lat1, lon1 ), ( lat2, lon2 ) ) for lat1, lon1, lat2, lon2 in dfm.loc[:,COORD_COLUMNS].to_numpy()] )
+    assert np.allclose( dfm['Distance (km)'].to_numpy(), esperado, rtol = 0, atol = TOLERANCE_KM )
@@ -0,0 +1,29 @@
+# Libraries
+import pandas as pd
+import pytest
+
+from utils.dataset import clean_code, concat_frames, iter_orders, read_orders
+
+# Linhas por bloco nos testes de iter_orders (vários blocos mesmo no CSV curto)
+CHUNK_ROWS = 7
+
+# -------------------------------------
+# Testes
+# -------------------------------------
+@pytest.mark.parametrize( 'engine', ['arrow','pandas'] )
+def test_read_orders_matches_clean_code( orders_csv, engine ):
+    pd.testing.assert_frame_equal( read_orders( orders_csv, engine ), clean_code( pd.read_csv( orders_csv ) ), check_exact = True )
+
+@pytest.mark.parametrize( 'engine', ['arrow','pandas'] )
+def test_read_orders_edge_cases( edge_case_csv, engine ):
+    # Categorias só das linhas que sobram, como em clean_code
+    pd.testing.assert_frame_equal( read_orders( edge_case_csv, engine ), clean_code( pd.read_csv( edge_case_csv ) ), check_exact = True )
+
+@pytest.mark.parametrize( 'engine', ['arrow','pandas'] )
+@pytest.mark.parametrize( 'csv', ['edge_case_csv','synthetic_csv'] )
+def test_iter_orders_concatenated( request, csv, engine ):
+    path = request.getfixturevalue( csv )
+    chunksize = CHUNK_ROWS if csv == 'edge_case_csv' else 3_000
+    juntos = concat_frames( iter_orders( path, chunksize, engine ) )
+    juntos = juntos.sort_values( 'Order_Date', kind = 'mergesort', ignore_index = True )
+    pd.testing.assert_frame_equal( juntos, clean_code( pd.read_csv( path ) ), check_exact = True )
@@ -0,0 +1,59 @@
+# Libraries
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.sketches import DIGEST_K, HLL_P, accuracy, digest_build, digest_merge, digest_quantiles, hll_estimate, hll_registers
+
+# Semente fixa dos dados sorteados
+SEED = 42
+
+# Limites documentados (README, Modo aproximado): 3 erros padrão do HyperLogLog e erro de posto de 2 / DIGEST_K
+# por digest (cada combinação de digests da mesma célula pode somar mais 2 / DIGEST_K)
+HLL_BOUND = 3 * 1.04 / np.sqrt( 1 << HLL_P )
+RANK_BOUND = 2 / DIGEST_K
+
+def rank_error( valores, estimado, q ):
+    """Distância entre q e o intervalo de postos que o valor estimado ocupa nos dados exatos."""
+    valores = np.sort( valores )
+    abaixo = np.searchsorted( valores, estimado, side = 'left' ) / len( valores )
+    ate = np.searchsorted( valores, estimado, side = 'right' ) / len( valores )
+    return max( abaixo - q, q - ate, 0.0 )
+
+# -------------------------------------
+# Testes
+# -------------------------------------
+@pytest.mark.parametrize( 'n', [10, 1_000, 50_000, 300_000] )
+def test_hll_estimate_within_bound( n ):
+    ids = np.array( [f'DEL{i:07d}' for i in range( n )], dtype = object )
+    hashes = pd.util.hash_array( ids )
+    registros = hll_registers( np.zeros( n, dtype = np.int64 ), np.arange( n ), hashes, 1 )
+    assert abs( hll_estimate( registros )[0] - n ) / n <= HLL_BOUND
+
+def test_hll_ignores_repeated_pairs():
+    hashes = pd.util.hash_array( np.array( [f'DEL{i}' for i in range( 500 )], dtype = object ) )
+    codes = np.random.default_rng( SEED ).integers( 0, 500, 20_000 )
+    uma_vez = hll_registers( np.zeros( 500, dtype = np.int64 ), np.arange( 500 ), hashes, 1 )
+    repetidos = hll_registers( np.zeros( len( codes ), dtype = np.int64 ), codes, hashes, 1 )
+    np.testing.assert_array_equal( np.maximum( uma_vez, repetidos ), uma_vez )
+
+def test_digest_quantiles_within_bound():
+    rng = np.random.default_rng( SEED )
+    valores = rng.lognormal( 3, 0.5, 100_000 )
+    metades = np.array_split( valores, 2 )
+    um = digest_build( np.zeros( len( valores ), dtype = np.int64 ), valores, 1 )
+    combinado = digest_merge( *( digest_build( np.zeros( len( v ), dtype = np.int64 ), v, 1 ) for v in metades ) )
+    qs = [0.01, 0.5, 0.9, 0.99]
+    for q, estimado in zip( qs, digest_quantiles( *um, qs ) ):
+        assert rank_error( valores, estimado, q ) <= RANK_BOUND
+    for q, estimado in zip( qs, digest_quantiles( *combinado, qs ) ):
+        assert rank_error( valores, estimado, q ) <= 2 * RANK_BOUND
+
+def test_digest_small_cells_are_exact():
+    valores = np.random.default_rng( SEED ).normal( size = DIGEST_K )
+    digest = digest_build( np.zeros( DIGEST_K, dtype = np.int64 ), valores, 1 )
+    np.testing.assert_allclose( digest_quantiles( *digest, [0.5] ), [np.median( valores )] )
+
+def test_accuracy_within_documented_bounds( orders_csv ):
+    # Entregadores distintos (total e por semana), percentis do tempo de entrega e medianas do mapa
+    assert accuracy( orders_csv ) == []
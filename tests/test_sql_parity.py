@@ -0,0 +1,18 @@
+# Libraries
+import pandas as pd
+import pytest
+
+pytest.importorskip( 'duckdb' )
+
+from utils.sql import parity
+
+# -------------------------------------
+# Testes
+# -------------------------------------
+def test_backends_match( orders_csv ):
+    # Todas as tabelas das páginas (cubo, buckets, perfis, rankings, grade espacial) iguais nos dois backends
+    assert parity( orders_csv ) == []
+
+@pytest.mark.parametrize( 'traffic_options', [( 'Low', ), ( 'High','Jam' )] )
+def test_backends_match_with_filters( synthetic_csv, traffic_options ):
+    assert parity( synthetic_csv, pd.Timestamp( 2022, 3, 20 ), traffic_options ) == []
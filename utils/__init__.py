@@ -0,0 +1 @@
+# Módulos compartilhados entre as páginas do dashboard (leitura, limpeza e agregações dos dados)
@@ -0,0 +1,124 @@
+# Libraries
+import numpy as np
+import pandas as pd
+
+from utils import sql
+from utils.cube import cell_drivers
+from utils.sketches import hll_estimate, is_sketch
+
+# Períodos disponíveis para os agrupamentos por tempo
+GRANULARITIES = ['day','week','month','quarter']
+
+# -------------------------------------
+# Funções
+# -------------------------------------
+def time_keys( dates ):
+    """Chaves inteiras de dia, semana, mês e trimestre de cada data, calculadas de uma vez com aritmética de datas.
+
+       - 'day': AAAAMMDD
+       - 'week': AAAASS, semana do ano como em strftime( '%U' ) (domingo como primeiro dia;
+         os dias antes do primeiro domingo do ano ficam na semana 00)
+       - 'month': AAAAMM
+       - 'quarter': AAAAT
+       As chaves ordenam como as datas e não misturam períodos de anos diferentes.
+
+       Input: datas (Series ou array datetime64)
+       Output: Dataframe com uma coluna int32 por período, alinhado com as datas
+    """
+    dias = np.asarray( dates, dtype = 'datetime64[D]' )
+    anos = dias.astype( 'datetime64[Y]' )
+    meses = dias.astype( 'datetime64[M]' )
+    ano = anos.astype( np.int64 ) + 1970
+    mes = ( meses - anos.astype( 'datetime64[M]' ) ).astype( np.int64 )        # 0 = janeiro
+    dia = ( dias - meses.astype( 'datetime64[D]' ) ).astype( np.int64 ) + 1
+    dia_do_ano = ( dias - anos.astype( 'datetime64[D]' ) ).astype( np.int64 )  # 0 = 1º de janeiro
+    dia_da_semana = ( dias.astype( np.int64 ) + 4 ) % 7                          # 1970-01-01 foi quinta; 0 = domingo
+    semana = ( dia_do_ano + 7 - dia_da_semana ) // 7
+    return pd.DataFrame( { 'day': ano * 10000 + ( mes + 1 ) * 100 + dia,
+                           'week': ano * 100 + semana,
+                           'month': ano * 100 + mes + 1,
+                           'quarter': ano * 10 + mes // 3 + 1 }, index = getattr( dates, 'index', None ) ).astype( np.int32 )
+
+def bucket_labels( keys, granularity ):
+    """Rótulos dos períodos (um por chave, formatados só para as chaves distintas).
+
+       As semanas aparecem como em '%U' ('06'), com o ano na frente quando há mais de um ano ('2022-06').
+    """
+    keys = np.asarray( keys, dtype = np.int64 )
+    if granularity == 'day':
+        return pd.to_datetime( keys.astype( str ), format = '%Y%m%d' )
+    if granularity == 'quarter':
+        return [f'{k // 10}-T{k % 10}' for k in keys]
+    if granularity == 'month':
+        return [f'{k // 100}-{k % 100:02d}' for k in keys]
+    if len( np.unique( keys // 100 ) ) <= 1:
+        return [f'{k % 100:02d}' for k in keys]
+    return [f'{k // 100}-{k % 100:02d}' for k in keys]
+
+def _driver_counts( buckets, codes, n_buckets ):
+    """Entregadores distintos por período, a partir do período e do código do entregador de cada pedido."""
+    validos = codes >= 0
+    n_drivers = int( codes.max() ) + 1 if validos.any() else 1
+    pares = np.unique( buckets[validos].astype( np.int64 ) * n_drivers + codes[validos] )
+    return np.bincount( pares // n_drivers, minlength = n_buckets )
+
+def _rollup_cube( cube, granularity ):
+    # As células estão ordenadas por data: os períodos são trechos contíguos de células
+    cells = cube['cells']
+    chaves = time_keys( cells['Order_Date'] )[granularity].to_numpy()
+    buckets, inicios = np.unique( chaves, return_index = True )
+    if len( buckets ) == 0:
+        return buckets, np.zeros( 0, dtype = np.int64 ), np.zeros( 0, dtype = np.int64 )
+    orders = np.add.reduceat( cells['orders'].to_numpy(), inicios )
+    # Entregadores distintos: pares (período, entregador) distintos a partir dos pares de cada célula
+    grupo, codes = cell_drivers( cube )
+    periodo = np.searchsorted( inicios, np.arange( len( cells ) ), side = 'right' ) - 1
+    return buckets, orders, _driver_counts( periodo[grupo], codes, len( buckets ) )
+
+def _rollup_sketches( sketches, granularity ):
+    # Como no cubo, mas os entregadores distintos saem do máximo dos registradores HyperLogLog de cada período
+    cells = sketches['cells']
+    chaves = time_keys( cells['Order_Date'] )[granularity].to_numpy()
+    buckets, inicios = np.unique( chaves, return_index = True )
+    if len( buckets ) == 0:
+        return buckets, np.zeros( 0, dtype = np.int64 ), np.zeros( 0, dtype = np.int64 )
+    orders = np.add.reduceat( cells['orders'].to_numpy(), inicios )
+    registros = np.maximum.reduceat( sketches['hll'][cells.index.to_numpy()], inicios, axis = 0 )
+    return buckets, orders, hll_estimate( registros )
+
+def _rollup_frame( dfm, granularity, keys ):
+    chaves = ( time_keys( dfm['Order_Date'] ) if keys is None else keys )[granularity].to_numpy()
+    buckets, posicoes = np.unique( chaves, return_inverse = True )
+    orders = np.bincount( posicoes, minlength = len( buckets ) )
+    codes = pd.factorize( dfm['Delivery_person_ID'] )[0]
+    return buckets, orders, _driver_counts( posicoes, codes, len( buckets ) )
+
+def rollup_buckets( fonte, granularity = 'week', keys = None ):
+    """Pedidos, entregadores distintos e pedidos por entregador em cada período, alinhados pela chave do período.
+
+       fonte pode ser o dataframe de pedidos filtrado, o cubo filtrado (ver utils/cube.py), os sketches
+       filtrados do modo aproximado (ver utils/sketches.py) ou o filtro SQL de filter_orders (ver utils/sql.py).
+       Para o dataframe, keys pode trazer as chaves de time_keys já calculadas para as mesmas linhas.
+
+       Input: pedidos, período de GRANULARITIES, chaves opcionais
+       Output: Dataframe ordenado pela chave com 'bucket' (chave inteira), 'label', 'ID' (pedidos),
+               'Delivery_person_ID' (entregadores distintos) e 'orders_per_driver'
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError( f'período desconhecido: {granularity}' )
+    if sql.is_sql( fonte ):
+        tabela = sql.rollup_buckets( fonte, granularity )
+        buckets, orders, drivers = ( tabela[col].to_numpy() for col in ['bucket','ID','Delivery_person_ID'] )
+    elif is_sketch( fonte ):
+        buckets, orders, drivers = _rollup_sketches( fonte, granularity )
+    elif isinstance( fonte, dict ):
+        buckets, orders, drivers = _rollup_cube( fonte, granularity )
+    else:
+        buckets, orders, drivers = _rollup_frame( fonte, granularity, keys )
+    orders = np.asarray( orders, dtype = np.int64 )
+    drivers = np.asarray( drivers, dtype = np.int64 )
+    return pd.DataFrame( { 'bucket': np.asarray( buckets, dtype = np.int64 ),
+                           'label': bucket_labels( buckets, granularity ),
+                           'ID': orders,
+                           'Delivery_person_ID': drivers,
+                           'orders_per_driver': orders / np.where( drivers > 0, drivers, np.nan ) } )
@@ -0,0 +1,111 @@
+# Libraries
+import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
+
+from utils import sql
+from utils.buckets import rollup_buckets
+from utils.cube import overall_mean, rollup_count, rollup_stats
+from utils.filters import gather
+
+# Funções que montam os gráficos e tabelas das páginas a partir do dataframe filtrado (dfm)
+# ou do cubo de agregados filtrado (cube). Ficam fora dos scripts das páginas para poderem
+# ser importadas e medidas isoladamente (ver benchmarks/).
+# Com o backend DuckDB (ver utils/sql.py), cube e dfm são o filtro SQL de filter_orders
+# e os agrupamentos viram consultas.
+
+# Nome de cada período de utils/buckets.py nos títulos e eixos dos gráficos
+PERIOD_NAMES = { 'day': 'dia', 'week': 'semana', 'month': 'mês', 'quarter': 'trimestre' }
+
+# =================================================
+# Visão Empresa
+# =================================================
+def order_metric( cube ):
+    dfm_sel_1 = rollup_count( cube, ['Order_Date'] )
+    fig = px.bar(dfm_sel_1, x='Order_Date', y='ID')
+    return fig
+
+def traffic_order_share( cube ):
+    dfm_sel_3 = rollup_count( cube, ['Road_traffic_density'] )
+    dfm_sel_3['delivery_percent_by_traffic'] = 100 * dfm_sel_3['ID'] / dfm_sel_3['ID'].sum()
+                                                
+    fig = px.pie(dfm_sel_3, values = 'delivery_percent_by_traffic', names = 'Road_traffic_density')
+    return fig
+
+def traffic_order_city( cube ):
+    dfm_sel_4 = rollup_count( cube, ['City','Road_traffic_density'] )
+    fig = px.scatter(dfm_sel_4, x='City',y='Road_traffic_density',size='ID',color='City',
+                      title='Relação entre o tipo de trânsito e a cidade de entrega', 
+                      labels = {'City': 'Cidade', 'Road_traffic_density': 'Tipo de trânsito'},
+                      width=800, height=500 
+                     )
+    return fig
+
+def order_by_week( fonte, granularity = 'week' ):
+    # Pedidos por período (semana, por padrão); fonte é o cubo, os pedidos filtrados ou o filtro SQL
+    nome = PERIOD_NAMES[granularity]
+    dfm_sel_2 = rollup_buckets( fonte, granularity )
+    fig = px.line(dfm_sel_2, x='label', y='ID', 
+                    title=f'Distribuição das entregas por {nome}', 
+                    labels = {'label': nome.capitalize(), 'ID': 'Quantidade de entregas'}
+                 )
+    return fig
+
+def order_share_by_week( fonte, granularity = 'week' ):
+    # Pedidos e entregadores distintos saem do mesmo agrupamento, alinhados pela chave do período
+    nome = PERIOD_NAMES[granularity]
+    df_aux01 = rollup_buckets( fonte, granularity )
+
+    fig = px.line( df_aux01, x='label', y='orders_per_driver', 
+                    title=f'Evolução das entregas por {nome} por entregador', 
+                    labels = {'label': nome.capitalize(), 'orders_per_driver': f'Número_de_pedidos_por_entregador_por_{nome}'},
+                    width=800, height=500 
+                 )
+    return fig
+
+# =================================================
+# Visão Entregadores
+# =================================================
+def driver_rating_means( dfm ):
+    if sql.is_sql( dfm ):
+        return sql.driver_rating_means( dfm )
+    cols = ['Delivery_person_ID','Delivery_person_Ratings']
+    dfm_sel_3 = ( gather( dfm, cols ).loc[:,cols].groupby(['Delivery_person_ID'], observed = True)
+                               .mean()
+                               .reset_index() )
+    dfm_sel_3.columns = ['Delivery_person_ID','Nota_media_por_entregador']
+    return dfm_sel_3
+
+def avg_by_traffic_or_weather( cube, col):
+    dfm_sel_mean_std = rollup_stats( cube, [col], 'Delivery_person_Ratings' )
+    return dfm_sel_mean_std.loc[:,[col,'mean','std']]
+
+# =================================================
+# Visão Restaurantes
+# =================================================
+def pizza_sunburst( cube ):
+    dfm_sel_5 = rollup_stats( cube, ['City','Road_traffic_density'], 'Time_taken(min)' )
+    dfm_sel_5 = dfm_sel_5.loc[:,['City','Road_traffic_density','mean','std']]
+
+    return px.sunburst( dfm_sel_5, path = ['City','Road_traffic_density'], values = 'mean', color = 'std', 
+                       color_continuous_scale = 'RdBu', color_continuous_midpoint = np.average( dfm_sel_5['std'] ) )
+        
+def avg_std_time_plot( cube ):
+    df_sel_3 = rollup_stats( cube, ['City'], 'Time_taken(min)' )
+    fig = go.Figure()
+    fig.add_trace( go.Bar( name = 'Control',
+                           x = df_sel_3['City'],
+                           y = df_sel_3['mean'],
+                           error_y = dict( type = 'data', array = df_sel_3['std'] )
+                         ) 
+                 )
+    return fig.update_layout( barmode = 'group')
+
+def distance( cube, metrica = 'Yes' ):
+    # A coluna 'Distance (km)' é calculada uma única vez na ingestão (ver utils/dataset.py)
+    # e agregada no cubo; a média é obtida a partir das somas e contagens das células
+    if metrica == 'Yes':
+        return round( overall_mean( cube, 'Distance (km)' ), 2)
+    else:
+        dfm_sel = rollup_stats( cube, ['City'], 'Distance (km)' )
+        return dfm_sel.loc[:,['City','mean']].rename( columns = { 'mean': 'Distance (km)' } )
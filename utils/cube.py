@@ -0,0 +1,286 @@
+# Libraries
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils import sql
+from utils.dataset import CHUNK_SIZE, DATA_PATH, data_version, iter_orders, load_derived, load_streamed, register_merge, source_files, streamed_version
+
+try:
+    import resource   # Indisponível no Windows
+except ImportError:
+    resource = None
+
+# Dimensões do cubo (grão: dia x trânsito x cidade x festival x clima x tipo de pedido)
+DIMENSIONS = ['Order_Date','Road_traffic_density','City','Festival','Weatherconditions','Type_of_order']
+
+# Colunas numéricas agregadas em cada célula
+MEASURES = ['Time_taken(min)','Delivery_person_Ratings','Distance (km)','Delivery_person_Age','Vehicle_condition']
+
+# -------------------------------------
+# Funções
+# -------------------------------------
+def _aggregate_cells( dfm ):
+    """Agrega os pedidos por combinação de DIMENSIONS.
+
+       Output: (Dataframe de células, array com a célula de cada pedido)
+    """
+    # observed = True: com colunas categóricas, só as combinações que existem viram células
+    grupos = dfm.groupby( DIMENSIONS, sort = True, dropna = False, observed = True )
+    cell = grupos.ngroup().to_numpy()
+    cells = grupos.size().rename( 'orders' ).reset_index()
+    # As dimensões das células ficam com o tipo dos valores (e não categóricas), para que cubos
+    # de lotes com categorias diferentes possam ser combinados (merge_cube)
+    for col in DIMENSIONS:
+        if isinstance( cells[col].dtype, pd.CategoricalDtype ):
+            cells[col] = cells[col].astype( cells[col].cat.categories.dtype )
+    n_cells = len( cells )
+
+    for col in MEASURES:
+        valores = dfm[col].to_numpy( dtype = float )
+        validos = ~np.isnan( valores )
+        valores = np.where( validos, valores, 0.0 )
+        cells[col + '_count'] = np.bincount( cell, weights = validos, minlength = n_cells )
+        cells[col + '_sum'] = np.bincount( cell, weights = valores, minlength = n_cells )
+        cells[col + '_sumsq'] = np.bincount( cell, weights = valores * valores, minlength = n_cells )
+        extremos = dfm[col].groupby( cell ).agg( ['min','max'] )
+        cells[col + '_min'] = extremos['min'].to_numpy()
+        cells[col + '_max'] = extremos['max'].to_numpy()
+    return cells, cell
+
+def _driver_pairs( cell, driver_codes, n_cells, n_drivers ):
+    """Pares (célula, entregador) distintos, ordenados por célula e entregador, em formato CSR.
+
+       Output: (offsets, drivers): os entregadores da célula i são drivers[offsets[i]:offsets[i + 1]]
+    """
+    validos = driver_codes >= 0
+    return _csr( np.unique( cell[validos].astype( np.int64 ) * max( n_drivers, 1 ) + driver_codes[validos] ), n_cells, n_drivers )
+
+def _csr( pares, n_cells, n_drivers ):
+    # Pares já ordenados e distintos (chave célula * n_drivers + entregador) -> (offsets, drivers)
+    n_drivers = max( n_drivers, 1 )
+    offsets = np.searchsorted( pares // n_drivers, np.arange( n_cells + 1 ), side = 'left' ).astype( np.int64 )
+    return offsets, ( pares % n_drivers ).astype( np.int32 )
+
+def cell_drivers( cube ):
+    """Entregadores das células (filtradas ou não) do cubo, um por par (célula, entregador).
+
+       Output: (posição da célula em cube['cells'] de cada par, código do entregador de cada par)
+    """
+    offsets = cube['offsets']
+    posicoes = cube['cells'].index.to_numpy()
+    tamanhos = offsets[posicoes + 1] - offsets[posicoes]
+    if tamanhos.sum() == 0:
+        return np.zeros( 0, dtype = np.int64 ), np.zeros( 0, dtype = np.int32 )
+    # Início de cada par no array de entregadores: o início da sua célula + a posição dentro dela
+    grupo = np.repeat( np.arange( len( posicoes ) ), tamanhos )
+    dentro = np.arange( len( grupo ) ) - np.repeat( np.cumsum( tamanhos ) - tamanhos, tamanhos )
+    return grupo, cube['drivers'][offsets[posicoes][grupo] + dentro]
+
+def build_cube( dfm ):
+    """Pré-agrega o dataframe limpo em um cubo de células, uma por combinação de DIMENSIONS.
+
+       Cada célula guarda agregados que podem ser somados entre células:
+       - 'orders': quantidade de pedidos
+       - para cada coluna de MEASURES: contagem de valores válidos, soma, soma dos quadrados, mínimo e máximo
+       Os entregadores distintos de cada célula ficam como pares (célula, entregador) ordenados, em
+       formato CSR ('offsets' e 'drivers'): o tamanho acompanha a quantidade de pares que existem, e
+       não células x entregadores. Os entregadores únicos de qualquer conjunto de células saem da
+       contagem dos códigos distintos dos seus pares (ver cell_drivers e distinct_drivers).
+
+       Input: Dataframe limpo
+       Output: dicionário com 'cells' (Dataframe), 'offsets', 'drivers' (código int32 de cada par) e 'driver_ids'
+    """
+    cells, cell = _aggregate_cells( dfm )
+    driver_codes, driver_ids = pd.factorize( dfm['Delivery_person_ID'].to_numpy() )
+    offsets, drivers = _driver_pairs( cell, driver_codes, len( cells ), len( driver_ids ) )
+    return { 'cells': cells, 'offsets': offsets, 'drivers': drivers, 'driver_ids': pd.Index( driver_ids ) }
+
+def merge_cube( cube, lote ):
+    """Incorpora um lote de pedidos já limpos ao cubo, sem reprocessar o histórico.
+
+       Só as células a partir da menor data do lote (a data é a primeira dimensão e as células
+       estão ordenadas) são comparadas com as do lote: as que coincidem são somadas (ou combinadas
+       por mínimo/máximo) e as novas são intercaladas nesse trecho. Os entregadores novos ganham
+       códigos no fim de driver_ids, e os pares (célula, entregador) do lote são intercalados aos
+       existentes, já ordenados (np.insert nas posições achadas por busca binária).
+       O custo acompanha o tamanho do lote e o trecho de células das suas datas, mais uma cópia
+       linear dos arrays do cubo; nada é reagrupado ou reordenado por inteiro.
+
+       Input: cubo completo (de build_cube), Dataframe limpo com os pedidos novos
+       Output: novo cubo
+    """
+    if len( lote ) == 0:
+        return cube
+    cells_lote, cell_lote = _aggregate_cells( lote )
+    antigas = cube['cells']
+    inicio = int( antigas['Order_Date'].searchsorted( cells_lote['Order_Date'].min(), side = 'left' ) )
+    cauda = antigas.iloc[inicio:].reset_index( drop = True )
+    pos = pd.MultiIndex.from_frame( cauda[DIMENSIONS] ).get_indexer( pd.MultiIndex.from_frame( cells_lote[DIMENSIONS] ) )
+
+    # Células do lote que já existem: agregados combinados no lugar (em uma cópia do trecho)
+    tocadas = pos >= 0
+    alvo = pos[tocadas]
+    for col in cauda.columns.difference( DIMENSIONS, sort = False ):
+        valores = cauda[col].to_numpy( copy = True )
+        novos = cells_lote[col].to_numpy()[tocadas]
+        if col.endswith( '_min' ):
+            valores[alvo] = np.fmin( valores[alvo], novos )
+        elif col.endswith( '_max' ):
+            valores[alvo] = np.fmax( valores[alvo], novos )
+        else:
+            valores[alvo] += novos
+        cauda[col] = valores
+
+    # Células novas intercaladas no trecho, na mesma ordem do groupby de build_cube
+    juntas = pd.concat( [cauda, cells_lote.loc[~tocadas]], ignore_index = True )
+    ordem = juntas.sort_values( DIMENSIONS, kind = 'mergesort' ).index.to_numpy()
+    cells = pd.concat( [antigas.iloc[:inicio], juntas.take( ordem )], ignore_index = True )
+
+    # Posição de cada célula antiga e de cada célula do lote no cubo combinado
+    posicao = np.empty( len( juntas ), dtype = np.int64 )
+    posicao[ordem] = inicio + np.arange( len( juntas ) )
+    pos_antigas = np.concatenate( [np.arange( inicio ), posicao[:len( cauda )]] )
+    pos_lote = np.empty( len( cells_lote ), dtype = np.int64 )
+    pos_lote[tocadas] = posicao[alvo]
+    pos_lote[~tocadas] = posicao[len( cauda ):]
+
+    # Entregadores novos entram no fim, preservando os códigos existentes
+    ids_lote = lote['Delivery_person_ID'].to_numpy()
+    driver_ids = cube['driver_ids'].append( pd.Index( pd.unique( ids_lote ) )
+                                               .difference( cube['driver_ids'], sort = False ) )
+    n_drivers = max( len( driver_ids ), 1 )
+    # As posições das células antigas só crescem, então os pares antigos continuam ordenados
+    antigos = np.repeat( pos_antigas, np.diff( cube['offsets'] ) ) * n_drivers + cube['drivers']
+    codes = driver_ids.get_indexer( ids_lote )
+    validos = codes >= 0
+    novos = np.unique( pos_lote[cell_lote[validos]] * n_drivers + codes[validos] )
+    pares = np.insert( antigos, np.searchsorted( antigos, novos ), novos )
+    pares = pares[np.append( True, pares[1:] != pares[:-1] )] if len( pares ) else pares
+    offsets, drivers = _csr( pares, len( cells ), len( driver_ids ) )
+
+    return { 'cells': cells, 'offsets': offsets, 'drivers': drivers, 'driver_ids': driver_ids }
+
+register_merge( build_cube, merge_cube )
+
+def stream_cube( path = DATA_PATH, chunksize = CHUNK_SIZE ):
+    """Monta o cubo lendo o CSV em blocos de chunksize linhas, sem carregar o dataset inteiro.
+
+       Cada bloco é lido e limpo com iter_orders e incorporado ao cubo com merge_cube, então o pico de
+       memória depende do tamanho do bloco e da quantidade de células, e não do tamanho do arquivo.
+
+       Input: caminho do CSV (ou pasta/glob com vários CSVs), linhas por bloco
+       Output: cubo (mesmo formato de build_cube)
+    """
+    cube = None
+    for arquivo in source_files( path ):
+        for lote in iter_orders( arquivo, chunksize ):
+            cube = build_cube( lote ) if cube is None else merge_cube( cube, lote )
+    return cube
+
+def load_cube( path = DATA_PATH ):
+    """Cubo da versão atual do arquivo, compartilhado entre as sessões.
+
+       Com CHUNK_SIZE definido (variável de ambiente CURRY_CHUNK_SIZE), o cubo é montado em modo
+       streaming (ver stream_cube e load_streamed); caso contrário, é derivado do dataframe em cache
+       (load_derived). Com a atualização em segundo plano, os reruns recebem o último cubo publicado
+       e só a thread de atualização lê o arquivo de novo.
+    """
+    if not CHUNK_SIZE:
+        return load_derived( build_cube, path )
+    return load_streamed( stream_cube, path )
+
+def cube_version( path = DATA_PATH ):
+    """Identificador da versão do cubo de load_cube (usado como chave por outros caches).
+
+       Em modo streaming o dataframe não é carregado, então a versão é a do cubo publicado.
+    """
+    return data_version( path ) if not CHUNK_SIZE else streamed_version( stream_cube, path )
+
+def filter_cube( cube, date_slider, traffic_options ):
+    """Aplica os filtros da barra lateral (data limite e condições de trânsito) às células do cubo.
+
+       Os pares (célula, entregador) não são copiados: as células filtradas mantêm o índice
+       original, que aponta para a posição da célula em cube['offsets'].
+    """
+    # As células estão ordenadas por data (primeira dimensão): a data limite é uma busca binária
+    cells = cube['cells']
+    n = int( cells['Order_Date'].searchsorted( pd.Timestamp( date_slider ), side = 'left' ) )
+    cells = cells.iloc[:n]
+    return { **cube, 'cells': cells.loc[cells['Road_traffic_density'].isin( traffic_options ), :] }
+
+def rollup_count( cube, by ):
+    """Quantidade de pedidos por combinação das colunas em by (coluna 'ID', como em groupby().count())."""
+    if sql.is_sql( cube ):
+        return sql.rollup_count( cube, by )
+    return ( cube['cells'].groupby( by )['orders'].sum()
+                          .rename( 'ID' )
+                          .reset_index() )
+
+def rollup_stats( cube, by, col ):
+    """Média, desvio padrão (amostral), mínimo e máximo de col por combinação das colunas em by.
+
+       Os valores são reconstruídos a partir da contagem, soma e soma dos quadrados de cada célula,
+       e coincidem com groupby( by )[col].agg( ['mean','std','min','max'] ) sobre os pedidos.
+
+       Input: cubo, lista de dimensões, coluna de MEASURES
+       Output: Dataframe com by + ['count','mean','std','min','max']
+    """
+    if sql.is_sql( cube ):
+        return sql.rollup_stats( cube, by, col )
+    agregados = ( cube['cells'].groupby( by )
+                               .agg( count = ( col + '_count', 'sum' ),
+                                     sum = ( col + '_sum', 'sum' ),
+                                     sumsq = ( col + '_sumsq', 'sum' ),
+                                     min = ( col + '_min', 'min' ),
+                                     max = ( col + '_max', 'max' ) ) )
+    n = agregados['count']
+    mean = agregados['sum'] / n.where( n > 0 )
+    var = ( agregados['sumsq'] - n * mean * mean ) / ( n - 1 ).where( n > 1 )
+    agregados['mean'] = mean
+    agregados['std'] = np.sqrt( var.clip( lower = 0 ) )
+    return agregados[['count','mean','std','min','max']].reset_index()
+
+def distinct_drivers( cube ):
+    """Quantidade de entregadores distintos nas células do cubo (códigos distintos dos pares das células)."""
+    if sql.is_sql( cube ):
+        return sql.distinct_drivers( cube )
+    _, codes = cell_drivers( cube )
+    vistos = np.zeros( len( cube['driver_ids'] ), dtype = bool )
+    vistos[codes] = True
+    return int( vistos.sum() )
+
+def overall_mean( cube, col ):
+    """Média de col em todas as células (soma das somas / soma das contagens)."""
+    if sql.is_sql( cube ):
+        return sql.overall_mean( cube, col )
+    cells = cube['cells']
+    return cells[col + '_sum'].sum() / cells[col + '_count'].sum()
+
+def extremes( cube, col ):
+    """(mínimo, máximo) de col em todas as células."""
+    if sql.is_sql( cube ):
+        return sql.extremes( cube, col )
+    return cube['cells'][col + '_min'].min(), cube['cells'][col + '_max'].max()
+
+def peak_rss_mb():
+    """Pico de memória residente do processo em MB (None onde o módulo resource não existe)."""
+    if resource is None:
+        return None
+    return resource.getrusage( resource.RUSAGE_SELF ).ru_maxrss / 1024
+
+if __name__ == '__main__':
+    # Dimensionamento dos workers: python -m utils.cube train.csv --chunksize 100000
+    parser = argparse.ArgumentParser( description = 'Monta o cubo de agregados em modo streaming.' )
+    parser.add_argument( 'path', nargs = '?', default = DATA_PATH )
+    parser.add_argument( '--chunksize', type = int, default = CHUNK_SIZE or 100_000 )
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    cube = stream_cube( args.path, args.chunksize )
+    print( f"pedidos: {int( cube['cells']['orders'].sum() )}" )
+    print( f"células: {len( cube['cells'] )}" )
+    print( f"tempo: {time.perf_counter() - inicio:.2f} s" )
+    print( f"pico de RSS: {peak_rss_mb():.1f} MB" if resource is not None else 'pico de RSS: indisponível' )
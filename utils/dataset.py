@@ -0,0 +1,822 @@
+# Libraries
+import concurrent.futures
+import glob
+import io
+import itertools
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.feather as feather
+
+from utils.geo import haversine_km
+from utils.timing import stage
+
+# Caminho padrão do dataset bruto
+DATA_PATH = 'train.csv'
+
+# Linhas por bloco no modo streaming (0 = dataset inteiro em memória); ver utils/cube.py
+CHUNK_SIZE = int( os.environ.get( 'CURRY_CHUNK_SIZE', '0' ) )
+
+# Processos usados para limpar fontes com vários arquivos (ver ingest); 0 = um por núcleo
+WORKERS = int( os.environ.get( 'CURRY_WORKERS', '0' ) )
+
+# Leitor dos CSVs (ver read_orders): 'arrow' (tipado, multithread) ou 'pandas' (read_csv + clean_code)
+CSV_ENGINE = os.environ.get( 'CURRY_CSV_ENGINE', 'arrow' )
+
+# Versão do formato do snapshot; snapshots de versões anteriores são considerados desatualizados
+SNAPSHOT_VERSION = '5'
+
+# Cache por processo: chave (caminho, mtime, tamanho) -> dataframe limpo e estruturas derivadas
+_cache = {}
+_lock = threading.RLock()
+
+# Serializa a leitura de novas versões (sempre adquirido antes de _lock, nunca dentro dele)
+_build_lock = threading.Lock()
+
+# Um lock por builder de load_derived: a estrutura é calculada uma vez, sem segurar _lock
+_builder_locks = {}
+
+# Fontes atualizadas em segundo plano (ver utils/refresher.py): load_data devolve a versão em cache
+# sem conferir o arquivo, e a thread de atualização troca a entrada quando a fonte muda
+_background = set()
+
+# Estruturas montadas em modo streaming (ver load_streamed): (builder, caminho absoluto) -> entrada
+_streamed = {}
+
+# Serializa as leituras em streaming (adquirido antes de _lock)
+_stream_lock = threading.Lock()
+
+# Número de versão de cada carga ou atualização dos dados (usado como chave por outros caches)
+_versions = itertools.count( 1 )
+
+# Funções que incorporam um lote novo a uma estrutura derivada (ver register_merge)
+_mergers = {}
+
+# Quantidade de bytes do fim do CSV usados para reconhecer que o arquivo só recebeu linhas novas
+TAIL_BYTES = 256
+
+# Colunas em que o texto 'NaN ' indica dado faltante (a linha é descartada)
+NAN_COLUMNS = ['Delivery_person_Age','Road_traffic_density','City','Festival','multiple_deliveries']
+
+# Colunas de texto com espaços em branco nas pontas
+STRIP_COLUMNS = ['ID','Road_traffic_density','Type_of_order','Type_of_vehicle','City','Festival']
+
+# Colunas de texto com poucos valores distintos, guardadas como categóricas no esquema compacto
+CATEGORY_COLUMNS = ['Delivery_person_ID','Weatherconditions','Road_traffic_density','Type_of_order',
+                    'Type_of_vehicle','Festival','City']
+
+# Colunas que nenhuma página lê; ficam fora do esquema compacto
+UNUSED_COLUMNS = ['ID','Time_Orderd','Time_Order_picked','multiple_deliveries']
+
+# Colunas usadas no cálculo da distância (restaurante -> local de entrega)
+COORD_COLUMNS = ['Restaurant_latitude','Restaurant_longitude','Delivery_location_latitude','Delivery_location_longitude']
+
+# Texto que o leitor tipado trata como dado faltante (na_values)
+NA_VALUES = ['NaN ']
+
+# Tipos declarados ao leitor tipado; as colunas de CATEGORY_COLUMNS e 'Time_taken(min)' são lidas
+# como dicionário (cada texto distinto é limpo uma única vez) e 'multiple_deliveries' só entra na
+# máscara de dados faltantes
+CSV_TYPES = { 'Delivery_person_Age': pa.int64(), 'Delivery_person_Ratings': pa.float64(),
+              'Order_Date': pa.timestamp( 's' ), 'Vehicle_condition': pa.int64(), 'multiple_deliveries': pa.int64(),
+              **{ col: pa.float64() for col in COORD_COLUMNS },
+              **{ col: pa.dictionary( pa.int32(), pa.string() ) for col in CATEGORY_COLUMNS + ['Time_taken(min)'] } }
+
+# -------------------------------------
+# Funções
+# -------------------------------------
+def map_unique( serie, func ):
+    """Aplica func somente aos valores distintos da coluna e reconstrói a coluna pelos códigos.
+
+       Em colunas de baixa cardinalidade isso troca milhões de operações por algumas dezenas.
+       Valores nulos são preservados como NaN.
+    """
+    codes, uniques = pd.factorize( serie )
+    valores = func( pd.Series( uniques, dtype = object ) ).to_numpy()
+    if ( codes < 0 ).any():
+        valores = np.append( valores.astype( object ), np.nan )
+    return pd.Series( valores[codes], index = serie.index )
+
+def map_categories( serie, func = None ):
+    """Como map_unique, mas devolve a coluna como categórica (categorias em ordem alfabética).
+
+       As categorias são marcadas como ordenadas: no pandas 1.x, groupby( observed = True ) só
+       respeita sort = True em categóricas ordenadas, e assim os grupos saem na mesma ordem do texto.
+       A coluna é fatorada uma única vez: func é aplicada aos valores distintos e os códigos
+       são remapeados para as categorias resultantes (valores que ficam iguais depois de func
+       viram uma única categoria). Valores nulos são preservados como NaN.
+    """
+    codes, uniques = pd.factorize( serie )
+    valores = pd.Series( uniques, dtype = object )
+    if func is not None:
+        valores = func( valores )
+    categorias = pd.Categorical( valores, ordered = True )
+    codes = np.where( codes >= 0, categorias.codes[codes], -1 )
+    return pd.Series( pd.Categorical.from_codes( codes, dtype = categorias.dtype ), index = serie.index )
+
+def concat_frames( frames ):
+    """pd.concat que preserva as colunas categóricas (une as categorias antes de concatenar)."""
+    frames = list( frames )
+    for col in frames[0].columns:
+        if isinstance( frames[0][col].dtype, pd.CategoricalDtype ):
+            categorias = frames[0][col].cat.categories
+            for frame in frames[1:]:
+                categorias = categorias.union( frame[col].cat.categories )
+            frames = [frame.assign( **{ col: frame[col].cat.set_categories( categorias ) } ) for frame in frames]
+    return pd.concat( frames, ignore_index = True )
+
+# Limpeza dos dados
+def clean_code( dfm, compact = True ):
+    """Esta função possui a responsabilidade de limpar o dataframe.
+       Tipos de limpeza:
+       
+       1 - Remoção de dados faltantes do tipo NaN
+       2 - Conversão de tipos de dados nas colunas
+       3 - Remoção dos espaços nas colunas (vaiáveis de texto)
+       4 - Formatação da coluna de datas
+       5 - Limpeza da coluna de tempo (remoção do texto ans do número)
+       6 - Cálculo da distância entre restaurante e local de entrega ('Distance (km)')
+       7 - Ordenação das linhas por data ('Order_Date'), mantendo a ordem original dentro de cada dia
+       
+       Todas as linhas com 'NaN ' são descartadas com uma única máscara, sem cópias intermediárias.
+
+       Com compact = True (padrão) o resultado usa o esquema compacto: colunas de CATEGORY_COLUMNS
+       categóricas, inteiros reduzidos ao menor tipo que comporta os valores, coordenadas (restaurante
+       e entrega) e distância em float32 (~1 m de precisão) e sem as colunas de UNUSED_COLUMNS.
+       As notas ('Delivery_person_Ratings') continuam em float64, para que as médias exibidas não mudem.
+       Com compact = False o resultado mantém todas as colunas como texto/64 bits (ver memory_report).
+       
+       Input: Dataframe, usar o esquema compacto
+       Output: Dataframe
+    """
+    # Exclui, de uma só vez, as linhas com dados faltantes em qualquer uma das colunas de NAN_COLUMNS
+    linhas_selecionadas = np.ones( len( dfm ), dtype = bool )
+    for col in NAN_COLUMNS:
+        # Colunas lidas como número (ex.: um lote sem nenhum 'NaN ') não têm o que excluir
+        if dfm[col].dtype == object:
+            linhas_selecionadas &= dfm[col].to_numpy() != 'NaN '
+
+    # Seleciona as linhas coluna a coluna; o dataframe final é montado uma única vez no fim,
+    # evitando que cada conversão reescreva o bloco de colunas de texto
+    # (o índice já sai reordenado, de 0 a n-1)
+    descartadas = UNUSED_COLUMNS if compact else []
+    cols = { col: pd.Series( dfm[col].to_numpy()[linhas_selecionadas] ) for col in dfm.columns if col not in descartadas }
+
+    # Converte os dados dessas colunas de texto para int
+    cols['Delivery_person_Age'] = cols['Delivery_person_Age'].astype(int)
+    if not compact:
+        cols['multiple_deliveries'] = cols['multiple_deliveries'].astype(int)
+
+    # Converte os dados dessa coluna de texto para float
+    cols['Delivery_person_Ratings'] = cols['Delivery_person_Ratings'].astype(float)
+
+    # Converte as datas anteriormente em formato de objeto para datetime
+    cols['Order_Date'] = pd.to_datetime(cols['Order_Date'], format = '%d-%m-%Y' )
+
+    # Extrai os espaços em branco dos dados nas colunas de STRIP_COLUMNS.
+    # O 'ID' é único por linha; as demais têm poucos valores distintos e são limpas via map_unique
+    # (ou map_categories, que já devolve a coluna categórica)
+    texto = map_categories if compact else map_unique
+    if not compact:
+        cols['ID'] = cols['ID'].str.strip()
+    for col in STRIP_COLUMNS[1:]:
+        cols[col] = texto( cols[col], lambda s: s.str.strip() )
+    if compact:
+        for col in CATEGORY_COLUMNS:
+            if col not in STRIP_COLUMNS:
+                cols[col] = map_categories( cols[col] )
+
+    # Retira o '(min) ', deixando apenas o tempo, e transforma em inteiro
+    cols['Time_taken(min)'] = map_unique( cols['Time_taken(min)'],
+                                          lambda s: s.str.split( '(min) ', regex = False ).str[1].astype(int) )
+
+    # Distância restaurante -> entrega, calculada uma única vez para todas as linhas
+    cols['Distance (km)'] = pd.Series( haversine_km( *( dfm[col].to_numpy()[linhas_selecionadas] for col in COORD_COLUMNS ) ) )
+
+    if compact:
+        # Inteiros no menor tipo que comporta os valores (idade e condição do veículo cabem em int8)
+        for col in ['Delivery_person_Age','Vehicle_condition','Time_taken(min)']:
+            cols[col] = pd.to_numeric( cols[col], downcast = 'integer' )
+        for col in COORD_COLUMNS + ['Distance (km)']:
+            cols[col] = cols[col].astype( np.float32 )
+
+    dfm = pd.DataFrame( cols )
+
+    # Ordena por data (ordenação estável): o filtro de data limite vira uma busca binária (ver utils/filters.py)
+    if not dfm['Order_Date'].is_monotonic_increasing:
+        dfm = dfm.sort_values( 'Order_Date', kind = 'mergesort', ignore_index = True )
+    
+    return dfm
+
+def _dictionary_codes( coluna ):
+    """Valores distintos (texto) e código de cada linha de uma coluna dicionário do Arrow (-1 = nulo)."""
+    coluna = coluna.unify_dictionaries() if isinstance( coluna, pa.ChunkedArray ) else coluna
+    if coluna.num_chunks == 0:
+        return pd.Series( [], dtype = object ), np.zeros( 0, dtype = np.int64 )
+    valores = pd.Series( coluna.chunk( 0 ).dictionary.to_pylist(), dtype = object )
+    codes = np.concatenate( [pc.fill_null( chunk.indices, -1 ).to_numpy().astype( np.int64 ) for chunk in coluna.chunks] )
+    return valores, codes
+
+def _categorical( valores, codes, func = None ):
+    # Mesmo resultado de map_categories, a partir do dicionário já lido pelo parser. O dicionário
+    # inclui os valores das linhas descartadas; só ficam as categorias das linhas que sobraram
+    usados = np.zeros( len( valores ), dtype = bool )
+    usados[codes[codes >= 0]] = True
+    valores = valores[usados]
+    if func is not None:
+        valores = func( valores )
+    categorias = pd.Categorical( valores, ordered = True )
+    posicoes = np.cumsum( usados ) - 1
+    codes = np.where( codes >= 0, categorias.codes[posicoes[np.maximum( codes, 0 )]], -1 )
+    return pd.Series( pd.Categorical.from_codes( codes, dtype = categorias.dtype ) )
+
+def _head( source, size ):
+    # Primeiros size bytes do CSV (caminho ou arquivo binário, que volta ao início)
+    if isinstance( source, ( str, os.PathLike ) ):
+        with open( source, 'rb' ) as arquivo:
+            return arquivo.read( size )
+    inicio = source.read( size )
+    source.seek( 0 )
+    return inicio
+
+def _convert_options( header ):
+    # Só as colunas usadas (na ordem do arquivo), com tipos, 'NaN ' como faltante e o formato das datas
+    colunas = [col for col in header.decode().rstrip( '\r\n' ).split( ',' ) if col not in UNUSED_COLUMNS or col in NAN_COLUMNS]
+    return pacsv.ConvertOptions( include_columns = colunas, column_types = CSV_TYPES, null_values = NA_VALUES,
+                                 strings_can_be_null = True, timestamp_parsers = ['%d-%m-%Y'] )
+
+def _clean_arrow( table ):
+    """Dataframe no esquema compacto (igual ao de clean_code) a partir da tabela lida pelo Arrow."""
+    colunas = table.column_names
+
+    # Exclui, de uma só vez, as linhas com dados faltantes em qualquer uma das colunas de NAN_COLUMNS
+    linhas_selecionadas = np.ones( table.num_rows, dtype = bool )
+    for col in NAN_COLUMNS:
+        linhas_selecionadas &= table.column( col ).is_valid().to_numpy( zero_copy_only = False )
+
+    cols = {}
+    for col in colunas:
+        if col in UNUSED_COLUMNS:
+            continue
+        coluna = table.column( col )
+        if col in CATEGORY_COLUMNS:
+            # Espaços das pontas retirados só dos valores distintos, como em clean_code
+            valores, codes = _dictionary_codes( coluna )
+            cols[col] = _categorical( valores, codes[linhas_selecionadas],
+                                      ( lambda s: s.str.strip() ) if col in STRIP_COLUMNS else None )
+        elif col == 'Time_taken(min)':
+            valores, codes = _dictionary_codes( coluna )
+            tempos = valores.str.split( '(min) ', regex = False ).str[1].astype( int ).to_numpy()
+            cols[col] = pd.Series( tempos[codes[linhas_selecionadas]] )
+        elif col == 'Order_Date':
+            cols[col] = pd.Series( coluna.to_numpy().astype( 'datetime64[ns]' )[linhas_selecionadas] )
+        else:
+            cols[col] = pd.Series( coluna.to_numpy()[linhas_selecionadas] )
+
+    # Distância restaurante -> entrega em float64, antes de reduzir as coordenadas a float32
+    cols['Distance (km)'] = pd.Series( haversine_km( *( cols[col].to_numpy() for col in COORD_COLUMNS ) ) )
+    for col in ['Delivery_person_Age','Vehicle_condition','Time_taken(min)']:
+        cols[col] = pd.to_numeric( cols[col], downcast = 'integer' )
+    for col in COORD_COLUMNS + ['Distance (km)']:
+        cols[col] = cols[col].astype( np.float32 )
+
+    dfm = pd.DataFrame( cols )
+    if not dfm['Order_Date'].is_monotonic_increasing:
+        dfm = dfm.sort_values( 'Order_Date', kind = 'mergesort', ignore_index = True )
+    return dfm
+
+def read_orders( source, engine = CSV_ENGINE ):
+    """Lê e limpa um CSV de pedidos, com o mesmo resultado de clean_code( pd.read_csv( source ) ).
+
+       Com engine = 'arrow', o esquema é declarado ao leitor do Arrow (multithread): só as colunas
+       usadas (usecols), tipos de cada coluna, 'NaN ' como dado faltante (na_values) e datas já
+       convertidas pelo parser. Textos de poucos valores chegam como dicionário, então espaços e o
+       prefixo '(min) ' são tratados uma vez por valor distinto. Com engine = 'pandas', usa o caminho
+       anterior (pd.read_csv sem tipos + clean_code), mantido para comparação (ver read_speed).
+
+       Input: caminho (ou arquivo aberto em modo binário) do CSV, leitor
+       Output: Dataframe limpo, no esquema compacto
+    """
+    if engine == 'pandas':
+        return clean_code( pd.read_csv( source ) )
+    if engine != 'arrow':
+        raise ValueError( f'leitor desconhecido: {engine}' )
+    inicio = _head( source, 2**16 )
+    table = pacsv.read_csv( source, read_options = pacsv.ReadOptions( use_threads = True ),
+                            convert_options = _convert_options( inicio[:inicio.find( b'\n' ) + 1] ) )
+    return _clean_arrow( table )
+
+def iter_orders( path, chunksize, engine = CSV_ENGINE ):
+    """Lê e limpa um CSV de pedidos em blocos de cerca de chunksize linhas (modo streaming).
+
+       Com o Arrow, os blocos são definidos em bytes, estimados pelo tamanho médio das primeiras linhas.
+
+       Input: caminho do CSV, linhas por bloco, leitor (ver read_orders)
+       Output: gerador de Dataframes limpos
+    """
+    if engine == 'pandas':
+        for chunk in pd.read_csv( path, chunksize = chunksize ):
+            yield clean_code( chunk )
+        return
+    inicio = _head( path, 2**16 )
+    header = inicio[:inicio.find( b'\n' ) + 1]
+    bytes_por_linha = max( len( inicio ) - len( header ), 1 ) / max( inicio.count( b'\n' ) - 1, 1 )
+    leitor = pacsv.open_csv( path, read_options = pacsv.ReadOptions( block_size = max( int( chunksize * bytes_por_linha ), 2**16 ) ),
+                             convert_options = _convert_options( header ) )
+    for batch in leitor:
+        yield _clean_arrow( pa.Table.from_batches( [batch] ) )
+
+def read_speed( path = DATA_PATH, repeat = 3 ):
+    """Compara os dois leitores de read_orders: confere que o resultado é igual e mede a vazão.
+
+       Output: Dataframe com o melhor tempo (s) e a vazão (MB/s do CSV) de cada leitor
+    """
+    mb = os.path.getsize( path ) / 2**20
+    linhas = []
+    resultados = {}
+    for engine in ['pandas','arrow']:
+        tempos = []
+        for _ in range( repeat ):
+            inicio = time.perf_counter()
+            resultados[engine] = read_orders( path, engine )
+            tempos.append( time.perf_counter() - inicio )
+        linhas.append( { 'leitor': engine, 'melhor_s': round( min( tempos ), 4 ), 'MB/s': round( mb / min( tempos ), 1 ) } )
+    pd.testing.assert_frame_equal( resultados['pandas'], resultados['arrow'] )
+    return pd.DataFrame( linhas ).set_index( 'leitor' )
+
+def file_key( path ):
+    """Retorna a chave de versão do arquivo: (caminho absoluto, mtime, tamanho)."""
+    stat = os.stat( path )
+    return ( os.path.abspath( path ), stat.st_mtime_ns, stat.st_size )
+
+def is_partitioned( path ):
+    """Indica se path é uma fonte com vários arquivos: uma pasta ou um padrão glob (ex.: 'pedidos/*.csv')."""
+    return os.path.isdir( path ) or glob.has_magic( path )
+
+def source_files( path ):
+    """Arquivos CSV de uma fonte (pasta, padrão glob ou arquivo único), em ordem alfabética."""
+    if os.path.isdir( path ):
+        return sorted( glob.glob( os.path.join( path, '*.csv' ) ) )
+    if glob.has_magic( path ):
+        return sorted( glob.glob( path ) )
+    return [path]
+
+def source_key( path ):
+    """Chave de versão de uma fonte: file_key de cada um dos seus arquivos."""
+    return tuple( file_key( arquivo ) for arquivo in source_files( path ) )
+
+def _clean_file( path ):
+    return read_orders( path )
+
+def ingest( path, workers = WORKERS ):
+    """Lê e limpa uma fonte com vários arquivos CSV (ex.: um arquivo por dia ou por mês) em paralelo.
+
+       Cada arquivo é lido e limpo com read_orders (leitor do Arrow por padrão, ver CSV_ENGINE) em um
+       processo separado; os resultados são concatenados na ordem alfabética dos arquivos (com as
+       categorias unificadas) e ordenados por data de forma estável. O resultado é idêntico ao de
+       clean_code aplicado aos arquivos concatenados, qualquer que seja a quantidade de processos.
+
+       Input: pasta, padrão glob ou arquivo; quantidade de processos (0 = um por núcleo, 1 = sem processos)
+       Output: Dataframe limpo
+    """
+    arquivos = source_files( path )
+    if not arquivos:
+        raise FileNotFoundError( f'nenhum arquivo CSV em {path}' )
+    workers = min( workers or os.cpu_count() or 1, len( arquivos ) )
+    if workers == 1:
+        frames = [_clean_file( arquivo ) for arquivo in arquivos]
+    else:
+        # spawn: os processos não herdam as threads do servidor do streamlit
+        contexto = multiprocessing.get_context( 'spawn' )
+        with concurrent.futures.ProcessPoolExecutor( max_workers = workers, mp_context = contexto ) as pool:
+            frames = list( pool.map( _clean_file, arquivos ) )
+    dfm = concat_frames( frames ) if len( frames ) > 1 else frames[0]
+    if not dfm['Order_Date'].is_monotonic_increasing:
+        dfm = dfm.sort_values( 'Order_Date', kind = 'mergesort', ignore_index = True )
+    return dfm
+
+def snapshot_path( path ):
+    """Caminho do snapshot Feather correspondente ao CSV (ex.: train.csv -> train.feather)."""
+    return os.path.splitext( path )[0] + '.feather'
+
+def build_snapshot( path = DATA_PATH ):
+    """Gera o snapshot colunar (Arrow IPC / Feather) do dataset já limpo.
+
+       A chave do CSV de origem (mtime e tamanho) é gravada nos metadados do arquivo,
+       para que um snapshot desatualizado seja detectado na leitura.
+       O arquivo é escrito sem compressão, o que permite a leitura via memory-map.
+
+       Input: caminho do CSV
+       Output: caminho do snapshot gerado
+    """
+    _, mtime, size = file_key( path )
+    table = pa.Table.from_pandas( read_orders( path ), preserve_index = False )
+    table = table.replace_schema_metadata( { **( table.schema.metadata or {} ),
+                                             b'snapshot_version': SNAPSHOT_VERSION.encode(),
+                                             b'source_mtime': str( mtime ).encode(),
+                                             b'source_size': str( size ).encode() } )
+    # Escreve em um arquivo temporário e troca de forma atômica, sem afetar leitores abertos
+    out = snapshot_path( path )
+    tmp = out + '.tmp'
+    feather.write_feather( table, tmp, compression = 'uncompressed' )
+    os.replace( tmp, out )
+    return out
+
+def read_snapshot( path = DATA_PATH ):
+    """Lê o snapshot via memory-map, se ele existir e estiver em dia com o CSV.
+
+       Vários processos que mapeiam o mesmo arquivo compartilham as páginas do cache do sistema.
+
+       Input: caminho do CSV
+       Output: Dataframe limpo, ou None quando o snapshot está ausente ou desatualizado
+    """
+    snap = snapshot_path( path )
+    if not os.path.exists( snap ):
+        return None
+    table = feather.read_table( snap, memory_map = True )
+    metadata = table.schema.metadata or {}
+    if metadata.get( b'snapshot_version' ) != SNAPSHOT_VERSION.encode():
+        return None
+    if os.path.exists( path ):
+        _, mtime, size = file_key( path )
+        if ( metadata.get( b'source_mtime' ) != str( mtime ).encode()
+             or metadata.get( b'source_size' ) != str( size ).encode() ):
+            return None
+    # split_blocks evita consolidar as colunas numéricas em um único bloco (cópia extra)
+    return table.to_pandas( split_blocks = True )
+
+def register_merge( builder, merger ):
+    """Registra como incorporar um lote novo a uma estrutura derivada de load_derived.
+
+       merger( estrutura, lote ) recebe a estrutura atual e o lote já limpo e retorna a estrutura
+       atualizada, ou None quando não é possível atualizá-la (ela é recalculada quando for pedida).
+       Estruturas sem merger registrado são sempre recalculadas.
+    """
+    _mergers[builder] = merger
+
+def _csv_state( path ):
+    """Tamanho, cabeçalho e últimos bytes do CSV, usados para detectar anexações ao arquivo."""
+    with open( path, 'rb' ) as arquivo:
+        header = arquivo.readline()
+        size = os.fstat( arquivo.fileno() ).st_size
+        arquivo.seek( max( size - TAIL_BYTES, 0 ) )
+        return { 'size': size, 'header': header, 'tail': arquivo.read() }
+
+def _read_appended( path, state ):
+    """Lê apenas as linhas completas anexadas ao CSV depois do estado state.
+
+       Output: (Dataframe limpo das linhas novas ou None, novo estado), ou None se o arquivo
+               não for uma continuação do estado anterior (foi reescrito ou truncado)
+    """
+    with open( path, 'rb' ) as arquivo:
+        if arquivo.readline() != state['header']:
+            return None
+        arquivo.seek( max( state['size'] - TAIL_BYTES, 0 ) )
+        if arquivo.read( min( TAIL_BYTES, state['size'] ) ) != state['tail']:
+            return None
+        novos = arquivo.read()
+    # Ignora uma última linha ainda incompleta (arquivo sendo escrito)
+    novos = novos[:novos.rfind( b'\n' ) + 1]
+    if not novos:
+        return None, state
+    size = state['size'] + len( novos )
+    tail = ( state['tail'] + novos )[-TAIL_BYTES:]
+    lote = read_orders( io.BytesIO( state['header'] + novos ) )
+    return lote, { 'size': size, 'header': state['header'], 'tail': tail }
+
+def _fold( entry, lote ):
+    """Incorpora um lote já limpo (ver read_orders) à entrada do cache, sem reprocessar o histórico.
+
+       O lote é concatenado ao dataframe existente e cada estrutura derivada com merger
+       registrado é atualizada a partir dele: o cubo só combina as células a partir da primeira
+       data do lote, e os índices de filtros e espacial intercalam as posições do lote por busca
+       binária. O custo que ainda cresce com o histórico é o de cópia (o dataframe e os arrays dos
+       índices são recriados, não alterados no lugar): com lotes de 1000 pedidos, ~100 ms por lote
+       com 200 mil pedidos e ~200 ms com 1 milhão. Lotes com datas anteriores às já carregadas
+       reordenam o dataframe e recalculam os índices de filtros e espacial.
+    """
+    dfm = entry['data']
+    if len( dfm ) and len( lote ) and lote['Order_Date'].min() < dfm['Order_Date'].iloc[-1]:
+        # Lote fora de ordem: mantém o dataframe ordenado por data (ordenação estável)
+        dfm = concat_frames( [dfm, lote] ).sort_values( 'Order_Date', kind = 'mergesort', ignore_index = True )
+    else:
+        dfm = concat_frames( [dfm, lote] )
+    derived = {}
+    # Cópia feita com _lock: load_derived pode incluir estruturas na entrada publicada durante o laço
+    with _lock:
+        derivadas = list( entry['derived'].items() )
+    for builder, estrutura in derivadas:
+        merger = _mergers.get( builder )
+        atualizada = merger( estrutura, lote ) if merger is not None else None
+        if atualizada is not None:
+            derived[builder] = atualizada
+    return { **entry, 'data': dfm, 'derived': derived }
+
+def _key( path ):
+    """Chave de versão da fonte no cache: (file_key do CSV, file_key do snapshot)."""
+    if is_partitioned( path ):
+        # Fonte com vários arquivos: a versão é o conjunto de (arquivo, mtime, tamanho)
+        return ( ( os.path.abspath( path ), source_key( path ), None ), None )
+    snap = snapshot_path( path )
+    return ( file_key( path ) if os.path.exists( path ) else ( os.path.abspath( path ), None, None ),
+             file_key( snap ) if os.path.exists( snap ) else None )
+
+def _latest( path ):
+    """(chave, entrada) mais recente da fonte no cache, ou (None, None)."""
+    absoluto = os.path.abspath( path )
+    with _lock:
+        for key in reversed( list( _cache ) ):
+            if key[0][0] == absoluto:
+                return key, _cache[key]
+    return None, None
+
+def _build_entry( path, key ):
+    """Lê a versão key da fonte e monta a entrada do cache, sem publicá-la (ver _store).
+
+       Cada entrada guarda o dataframe limpo ('data') e as estruturas derivadas dele ('derived').
+       Se o CSV apenas recebeu linhas novas no fim, só essas linhas são lidas e incorporadas.
+       Fontes com vários arquivos (pasta ou glob) são lidas com ingest e relidas quando qualquer
+       arquivo muda, entra ou sai.
+    """
+    # Caminho incremental: mesmo snapshot e CSV que só cresceu desde a leitura anterior
+    anterior_key, anterior = _latest( path )
+    novos = None
+    if anterior is not None and anterior['csv'] is not None and key[1] == anterior_key[1] and key[0][2] is not None:
+        novos = _read_appended( path, anterior['csv'] )
+    if novos is not None:
+        lote, csv = novos
+        with stage( 'incorporar pedidos novos' ):
+            entry = _fold( anterior, lote ) if lote is not None else anterior
+        entry = { **entry, 'csv': csv }
+        if lote is not None:
+            entry['version'] = next( _versions )
+        return entry
+    if is_partitioned( path ):
+        with stage( 'ingest' ):
+            dfm = ingest( path )
+        return { 'data': dfm, 'derived': {}, 'csv': None, 'version': next( _versions ) }
+    with stage( 'read_snapshot' ):
+        dfm = read_snapshot( path )
+    if dfm is None:
+        with stage( 'read_orders' ):
+            dfm = read_orders( path )
+    csv = _csv_state( path ) if os.path.exists( path ) else None
+    return { 'data': dfm, 'derived': {}, 'csv': csv, 'version': next( _versions ) }
+
+def _store( key, entry ):
+    """Publica a entrada de uma só vez, descartando as versões antigas da mesma fonte."""
+    with _lock:
+        for old_key in [k for k in _cache if k[0][0] == key[0][0]]:
+            del _cache[old_key]
+        _cache[key] = entry
+
+def _entry( path ):
+    """Retorna a entrada do cache da versão atual da fonte, lendo os dados se necessário.
+
+       Com a fonte em atualização em segundo plano (ver refresh), devolve a entrada publicada
+       sem conferir o arquivo; só a primeira leitura acontece na chamada.
+    """
+    if os.path.abspath( path ) in _background:
+        _, entry = _latest( path )
+        if entry is not None:
+            return entry
+    key = _key( path )
+    with _lock:
+        entry = _cache.get( key )
+    if entry is not None:
+        return entry
+    with _build_lock:
+        # Outra thread pode ter lido esta versão enquanto esta esperava
+        with _lock:
+            entry = _cache.get( key )
+        if entry is None:
+            entry = _build_entry( path, key )
+            _store( key, entry )
+    return entry
+
+def watch( path = DATA_PATH ):
+    """Passa a fonte para atualização em segundo plano: load_data e load_streamed deixam de conferir o arquivo a cada chamada."""
+    _background.add( os.path.abspath( path ) )
+
+def is_loaded( path = DATA_PATH ):
+    """Indica se o dataframe da fonte já está em cache neste processo."""
+    return _latest( path )[1] is not None
+
+def refresh( path = DATA_PATH ):
+    """Lê a versão nova da fonte, se ela mudou, e a publica de forma atômica (usada por utils/refresher.py).
+
+       A leitura, a limpeza e o recálculo das estruturas derivadas que não têm merger acontecem
+       fora do lock do cache: enquanto isso, load_data e load_derived continuam devolvendo a versão
+       anterior. Se a fonte mudar durante a leitura (ex.: arquivo ainda sendo gravado), a versão lida
+       é descartada e a troca fica para a próxima chamada.
+
+       Output: número da versão publicada, None se a fonte não mudou ou False se ela mudou durante a leitura
+    """
+    key = _key( path )
+    with _lock:
+        if key in _cache:
+            return None
+    with _build_lock:
+        _, anterior = _latest( path )
+        entry = _build_entry( path, key )
+        if anterior is not None:
+            with _lock:
+                builders = list( anterior['derived'] )
+            for builder in builders:
+                if builder not in entry['derived']:
+                    with stage( builder.__name__ ):
+                        entry['derived'][builder] = builder( entry['data'] )
+        if _key( path ) != key:
+            return False
+        _store( key, entry )
+    return entry['version']
+
+def append_batch( lote, path = DATA_PATH ):
+    """Anexa um lote de pedidos brutos (mesmo esquema do train.csv) ao fim do CSV.
+
+       Os processos que já têm o dataset em cache (inclusive este) leem apenas as linhas novas
+       na próxima chamada de load_data, limpam só o lote e o incorporam aos dados e às
+       estruturas derivadas, sem reprocessar o histórico.
+
+       Input: Dataframe bruto ou caminho de um CSV com os pedidos novos, caminho do CSV principal
+       Output: quantidade de linhas anexadas
+    """
+    if not isinstance( lote, pd.DataFrame ):
+        # Lê tudo como texto para gravar os valores exatamente como vieram (ex.: 'NaN ')
+        lote = pd.read_csv( lote, dtype = str, keep_default_na = False )
+    with _lock:
+        with open( path, 'rb+' ) as arquivo:
+            header = arquivo.readline().decode().rstrip( '\r\n' ).split( ',' )
+            arquivo.seek( 0, os.SEEK_END )
+            if arquivo.tell() > 0:
+                arquivo.seek( -1, os.SEEK_END )
+                if arquivo.read( 1 ) != b'\n':
+                    arquivo.write( b'\n' )
+        lote.loc[:, header].to_csv( path, mode = 'a', header = False, index = False )
+    # Atualiza o cache deste processo, se o dataset já estiver carregado (fora de _lock, ver _build_lock)
+    if _latest( path )[1] is not None:
+        if os.path.abspath( path ) in _background:
+            refresh( path )
+        else:
+            _entry( path )
+    return len( lote )
+
+def memory_report( path = DATA_PATH ):
+    """Memória de cada coluna do dataframe limpo, sem e com o esquema compacto (ver clean_code).
+
+       Input: caminho do CSV
+       Output: Dataframe com tipo e MB de cada coluna antes e depois, e uma linha 'total'
+    """
+    raw = pd.read_csv( path )
+    antes = clean_code( raw, compact = False )
+    depois = clean_code( raw, compact = True )
+    report = pd.DataFrame( { 'dtype_antes': antes.dtypes.astype( str ),
+                             'mb_antes': antes.memory_usage( deep = True, index = False ) / 2**20,
+                             'dtype_depois': depois.dtypes.astype( str ),
+                             'mb_depois': depois.memory_usage( deep = True, index = False ) / 2**20 } ).reindex( antes.columns )
+    report.loc['total'] = ['', report['mb_antes'].sum(), '', report['mb_depois'].sum()]
+    return report.fillna( { 'dtype_depois': 'descartada', 'mb_depois': 0.0 } ).round( 2 )
+
+def load_data( path = DATA_PATH ):
+    """Lê e limpa o dataset uma única vez por processo.
+
+       Quando existe um snapshot Feather em dia (ver build_snapshot), ele é mapeado em memória;
+       caso contrário, o CSV é lido e limpo com read_orders (leitor do Arrow por padrão, ver CSV_ENGINE).
+       O resultado fica em cache, indexado pelo caminho, mtime e tamanho do arquivo.
+       Quando o arquivo muda, a entrada antiga é descartada e os dados são relidos; com a
+       atualização em segundo plano (ver watch e utils/refresher.py), quem relê é a thread de
+       atualização, e load_data devolve sempre a última versão publicada.
+       O dataframe retornado é compartilhado entre as sessões e não deve ser alterado.
+       path também pode ser uma pasta ou um padrão glob com vários CSVs, limpos em paralelo (ver ingest).
+
+       Input: caminho do CSV (ou pasta/glob)
+       Output: Dataframe limpo
+    """
+    return _entry( path )['data']
+
+def data_version( path = DATA_PATH ):
+    """Número da versão dos dados em cache; muda sempre que os dados são relidos ou atualizados."""
+    return _entry( path )['version']
+
+def load_derived( builder, path = DATA_PATH ):
+    """Retorna builder( dataframe limpo ), calculado uma vez por versão dos dados.
+
+       Usado para estruturas pré-calculadas (cubo de agregados, índices etc.), que são
+       descartadas junto com o dataframe quando o arquivo muda.
+
+       O cálculo acontece fora do lock do cache (com um lock só deste builder): enquanto uma sessão
+       monta uma estrutura, as demais continuam lendo os dados e as outras estruturas.
+
+       Input: função que recebe o dataframe limpo, caminho do CSV
+       Output: resultado de builder, compartilhado entre as sessões
+    """
+    entry = _entry( path )
+    with _lock:
+        if builder in entry['derived']:
+            return entry['derived'][builder]
+        trava = _builder_locks.setdefault( builder, threading.Lock() )
+    with trava:
+        # Outra sessão pode ter montado a estrutura enquanto esta esperava
+        with _lock:
+            pronta = builder in entry['derived']
+        if not pronta:
+            with stage( builder.__name__ ):
+                estrutura = builder( entry['data'] )
+            with _lock:
+                entry['derived'][builder] = estrutura
+    with _lock:
+        return entry['derived'][builder]
+
+def _build_streamed( builder, path, key ):
+    # Monta builder( path ) para a versão key da fonte, sem publicar; chamada com _stream_lock
+    with stage( builder.__name__ ):
+        estrutura = builder( path )
+    return { 'key': key, 'data': estrutura, 'version': next( _versions ) }
+
+def _publish_streamed( builder, path, entrada ):
+    # Uma estrutura por builder, como no cache do dataframe: a versão anterior é descartada
+    with _lock:
+        for chave in [k for k in _streamed if k[0] is builder]:
+            del _streamed[chave]
+        _streamed[( builder, os.path.abspath( path ) )] = entrada
+
+def _streamed_entry( builder, path ):
+    absoluto = os.path.abspath( path )
+    with _lock:
+        entrada = _streamed.get( ( builder, absoluto ) )
+    if entrada is not None and absoluto in _background:
+        return entrada
+    key = source_key( path )
+    if entrada is not None and entrada['key'] == key:
+        return entrada
+    with _stream_lock:
+        # Outra thread pode ter lido esta versão enquanto esta esperava
+        with _lock:
+            entrada = _streamed.get( ( builder, absoluto ) )
+        if entrada is None or entrada['key'] != key:
+            entrada = _build_streamed( builder, path, key )
+            _publish_streamed( builder, path, entrada )
+    return entrada
+
+def load_streamed( builder, path = DATA_PATH ):
+    """Retorna builder( path ) para a versão atual da fonte, sem carregar o dataframe (modo streaming).
+
+       builder lê a fonte em blocos (ex.: cube.stream_cube) e o resultado fica em cache, compartilhado
+       entre as sessões. Sem atualização em segundo plano, a fonte é conferida a cada chamada e lida de
+       novo quando muda; com ela (ver watch e refresh_streamed), a chamada devolve a versão publicada
+       e só a primeira leitura acontece aqui.
+
+       Input: função que recebe o caminho da fonte, caminho do CSV (ou pasta/glob)
+       Output: resultado de builder
+    """
+    return _streamed_entry( builder, path )['data']
+
+def streamed_version( builder, path = DATA_PATH ):
+    """Número da versão publicada de load_streamed( builder, path )."""
+    return _streamed_entry( builder, path )['version']
+
+def refresh_streamed( builder, path = DATA_PATH ):
+    """Como refresh, para uma estrutura de load_streamed: lê a fonte de novo, se ela mudou, e troca a versão publicada.
+
+       Output: número da versão publicada, None se a fonte não mudou ou False se ela mudou durante a leitura
+    """
+    key = source_key( path )
+    with _lock:
+        entrada = _streamed.get( ( builder, os.path.abspath( path ) ) )
+    if entrada is not None and entrada['key'] == key:
+        return None
+    with _stream_lock:
+        entrada = _build_streamed( builder, path, key )
+        if source_key( path ) != key:
+            return False
+        _publish_streamed( builder, path, entrada )
+    return entrada['version']
+
+if __name__ == '__main__':
+    # Etapa de build: python -m utils.dataset [train.csv]
+    # Anexar pedidos novos: python -m utils.dataset --append novos.csv [train.csv]
+    # Memória por coluna antes/depois do esquema compacto: python -m utils.dataset --memory [train.csv]
+    # Limpeza paralela de vários arquivos: python -m utils.dataset --ingest 'pedidos/*.csv' [processos]
+    # Vazão dos leitores de CSV (pandas x Arrow): python -m utils.dataset --read-speed [train.csv]
+    if len( sys.argv ) > 1 and sys.argv[1] == '--read-speed':
+        print( read_speed( sys.argv[2] if len( sys.argv ) > 2 else DATA_PATH ).to_string() )
+    elif len( sys.argv ) > 2 and sys.argv[1] == '--ingest':
+        inicio = time.perf_counter()
+        dfm = ingest( sys.argv[2], int( sys.argv[3] ) if len( sys.argv ) > 3 else WORKERS )
+        print( f'arquivos: {len( source_files( sys.argv[2] ) )}' )
+        print( f'pedidos: {len( dfm )}' )
+        print( f'tempo: {time.perf_counter() - inicio:.2f} s' )
+    elif len( sys.argv ) > 2 and sys.argv[1] == '--append':
+        print( append_batch( sys.argv[2], sys.argv[3] if len( sys.argv ) > 3 else DATA_PATH ) )
+    elif len( sys.argv ) > 1 and sys.argv[1] == '--memory':
+        print( memory_report( sys.argv[2] if len( sys.argv ) > 2 else DATA_PATH ).to_string() )
+    else:
+        print( build_snapshot( sys.argv[1] if len( sys.argv ) > 1 else DATA_PATH ) )
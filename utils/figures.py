@@ -0,0 +1,41 @@
+# Libraries
+import os
+
+import pandas as pd
+import plotly.io as pio
+
+from utils.lru import LRUCache
+from utils.timing import register_counters
+
+# Limites do cache de figuras: quantidade de figuras e memória (MB) ocupada pelo JSON serializado
+FIGURE_CACHE_SIZE = int( os.environ.get( 'CURRY_FIGURE_CACHE_SIZE', '256' ) )
+FIGURE_CACHE_MB = float( os.environ.get( 'CURRY_FIGURE_CACHE_MB', '64' ) )
+
+# Figuras Plotly serializadas (JSON), compartilhadas entre as sessões do processo
+figure_cache = LRUCache( maxsize = FIGURE_CACHE_SIZE, maxbytes = int( FIGURE_CACHE_MB * 2**20 ), sizeof = len )
+register_counters( 'figure_cache', figure_cache.stats )
+
+# -------------------------------------
+# Funções
+# -------------------------------------
+def figure_key( figure_id, date_slider, traffic_options, version ):
+    """Chave de uma figura: (gráfico, data limite, condições de trânsito, versão dos dados).
+
+       As condições de trânsito são ordenadas, já que a ordem escolhida na barra lateral não muda o resultado.
+    """
+    return ( figure_id, pd.Timestamp( date_slider ), tuple( sorted( traffic_options ) ), version )
+
+def cached_figure( figure_id, date_slider, traffic_options, version, build ):
+    """Figura do gráfico figure_id para o estado dos filtros, montada por build() só na primeira vez.
+
+       A figura fica no cache serializada em JSON (ocupa bem menos memória que o objeto e tem tamanho
+       conhecido); a cada uso é reconstruída a partir do JSON, o que é bem mais barato que agregar os
+       dados e montar a figura com plotly.express.
+
+       Input: identificador do gráfico, data limite, condições de trânsito, versão dos dados,
+              função sem argumentos que monta a figura
+       Output: figura Plotly
+    """
+    spec = figure_cache.get_or_set( figure_key( figure_id, date_slider, traffic_options, version ),
+                                    lambda: build().to_json() )
+    return pio.from_json( spec )
@@ -0,0 +1,107 @@
+# Libraries
+import numpy as np
+import pandas as pd
+
+from utils.dataset import register_merge
+
+# Colunas de baixa cardinalidade com bitmap pré-calculado por categoria
+INDEX_COLUMNS = ['Road_traffic_density','City','Festival','Weatherconditions','Type_of_order','Type_of_vehicle']
+
+# -------------------------------------
+# Funções
+# -------------------------------------
+def build_filter_index( dfm ):
+    """Pré-calcula os índices usados pelos filtros da barra lateral.
+
+       - 'dates': coluna 'Order_Date' (o dataframe limpo já vem ordenado por data),
+         de modo que o filtro de data limite é uma busca binária
+       - 'bitmaps': para cada coluna de INDEX_COLUMNS, um bitmap compactado (1 bit por linha)
+         de cada categoria; combinações de filtros viram operações OR/AND entre bitmaps
+
+       Input: Dataframe limpo, ordenado por 'Order_Date'
+       Output: dicionário com 'dates' e 'bitmaps'
+    """
+    bitmaps = {}
+    for col in INDEX_COLUMNS:
+        codes, categorias = pd.factorize( dfm[col] )
+        bitmaps[col] = { categoria: np.packbits( codes == i ) for i, categoria in enumerate( categorias ) }
+    return { 'dates': dfm['Order_Date'].to_numpy(), 'bitmaps': bitmaps }
+
+def merge_filter_index( index, lote ):
+    """Estende o índice com um lote de pedidos já limpos, anexado no fim do dataframe.
+
+       Só é possível quando o lote não tem datas anteriores às já indexadas (caso contrário
+       o dataframe é reordenado e o índice é recalculado).
+    """
+    if len( lote ) == 0:
+        return index
+    dates = index['dates']
+    if len( dates ) and lote['Order_Date'].min() < dates[-1]:
+        return None
+    # Os bytes completos dos bitmaps são reaproveitados; só o último byte parcial é refeito
+    n = len( dates )
+    completos, resto = divmod( n, 8 )
+    bitmaps = {}
+    for col in INDEX_COLUMNS:
+        valores = lote[col].to_numpy()
+        bitmaps[col] = {}
+        for categoria in set( index['bitmaps'][col] ) | set( pd.unique( valores ) ):
+            antigo = index['bitmaps'][col].get( categoria, np.zeros( completos + ( resto > 0 ), dtype = np.uint8 ) )
+            bits = np.concatenate( [np.unpackbits( antigo[completos:], count = resto ), valores == categoria] )
+            bitmaps[col][categoria] = np.concatenate( [antigo[:completos], np.packbits( bits )] )
+    return { 'dates': np.concatenate( [dates, lote['Order_Date'].to_numpy()] ), 'bitmaps': bitmaps }
+
+register_merge( build_filter_index, merge_filter_index )
+
+def filter_rows( index, date_slider, traffic_options, **filtros ):
+    """Posições das linhas com data anterior a date_slider e trânsito em traffic_options.
+
+       Outros filtros podem ser passados como coluna = lista de valores (ex.: City = ['Urban']).
+       Apenas os bits das linhas anteriores à data limite são lidos, então o custo
+       acompanha o período selecionado e não o histórico inteiro.
+
+       Input: índice de build_filter_index, data limite, lista de condições de trânsito
+       Output: array com as posições das linhas selecionadas (para usar com dfm.take)
+    """
+    # Busca binária: as linhas com data < date_slider são as n primeiras
+    n = int( index['dates'].searchsorted( pd.Timestamp( date_slider ).to_datetime64(), side = 'left' ) )
+    n_bytes = ( n + 7 ) // 8
+
+    selecao = None
+    for col, valores in { 'Road_traffic_density': traffic_options, **filtros }.items():
+        # OR entre as categorias escolhidas da coluna
+        bits = np.zeros( n_bytes, dtype = np.uint8 )
+        for valor in valores:
+            if valor in index['bitmaps'][col]:
+                bits |= index['bitmaps'][col][valor][:n_bytes]
+        # AND entre colunas
+        selecao = bits if selecao is None else selecao & bits
+
+    return np.flatnonzero( np.unpackbits( selecao, count = n ) )
+
+def selection( dfm, rows ):
+    """Pedidos filtrados sem cópia: o dataframe compartilhado (somente leitura) e as posições das linhas.
+
+       As funções que recebem os pedidos filtrados (mapa, perfis, rankings etc.) aceitam a seleção
+       no lugar de um dataframe e copiam, com gather, só as colunas que usam e só nas linhas
+       selecionadas; o dataframe compartilhado nunca é copiado inteiro nem alterado.
+
+       Input: Dataframe limpo compartilhado, posições das linhas (ex.: de filter_rows ou spatial.query_radius)
+       Output: dicionário com 'data' e 'rows'
+    """
+    return { 'data': dfm, 'rows': rows }
+
+def is_selection( fonte ):
+    """Indica se fonte é uma seleção de linhas (ver selection)."""
+    return isinstance( fonte, dict ) and 'rows' in fonte
+
+def gather( fonte, cols ):
+    """Dataframe só com as colunas cols dos pedidos de fonte (seleção ou dataframe).
+
+       Em uma seleção, cada coluna é lida nas linhas selecionadas (categóricas pelos códigos);
+       um dataframe é devolvido como está, sem cópia. O resultado é de uso exclusivo de quem chamou.
+    """
+    if not is_selection( fonte ):
+        return fonte
+    dfm, rows = fonte['data'], fonte['rows']
+    return pd.DataFrame( { col: dfm[col].array.take( rows ) for col in cols } )
@@ -0,0 +1,22 @@
+# Libraries
+import numpy as np
+
+# Raio médio da Terra em km (mesmo valor usado pela biblioteca haversine)
+EARTH_RADIUS_KM = 6371.0088
+
+# -------------------------------------
+# Funções
+# -------------------------------------
+def haversine_km( lat1, lon1, lat2, lon2 ):
+    """Distância de grande círculo (fórmula de haversine) entre pares de coordenadas.
+
+       Versão vetorizada de haversine((lat1, lon1), (lat2, lon2)): recebe arrays (ou colunas)
+       em graus e calcula todas as distâncias de uma só vez com NumPy.
+
+       Input: latitudes e longitudes de origem e destino, em graus
+       Output: array de distâncias em km
+    """
+    lat1, lon1, lat2, lon2 = ( np.radians( np.asarray( x, dtype = float ) ) for x in ( lat1, lon1, lat2, lon2 ) )
+    d = ( np.sin( ( lat2 - lat1 ) * 0.5 ) ** 2
+          + np.cos( lat1 ) * np.cos( lat2 ) * np.sin( ( lon2 - lon1 ) * 0.5 ) ** 2 )
+    return 2 * EARTH_RADIUS_KM * np.arcsin( np.sqrt( d ) )
@@ -0,0 +1,64 @@
+# Libraries
+import threading
+from collections import OrderedDict
+
+# -------------------------------------
+# Classes
+# -------------------------------------
+class LRUCache:
+    """Cache limitado a maxsize itens (e, opcionalmente, a maxbytes), que descarta o item usado há mais tempo.
+
+       O tamanho de cada valor é medido por sizeof (ex.: len de um texto serializado); um valor maior
+       que maxbytes sozinho é retornado mas não é guardado.
+       Acertos, falhas e descartes são contados (ver stats).
+       É seguro para uso entre as sessões do Streamlit (threads do mesmo processo).
+    """
+    def __init__( self, maxsize = 32, maxbytes = None, sizeof = len ):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof
+        self._itens = OrderedDict()
+        self._tamanhos = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_set( self, key, factory ):
+        """Retorna o valor de key; se não estiver no cache, calcula factory() e guarda."""
+        with self._lock:
+            if key in self._itens:
+                self._itens.move_to_end( key )
+                self.hits += 1
+                return self._itens[key]
+            self.misses += 1
+        # O cálculo fica fora do lock para não bloquear as outras sessões
+        valor = factory()
+        tamanho = self.sizeof( valor ) if self.maxbytes is not None else 0
+        if self.maxbytes is not None and tamanho > self.maxbytes:
+            return valor
+        with self._lock:
+            if key in self._itens:
+                self._bytes -= self._tamanhos[key]
+            self._itens[key] = valor
+            self._tamanhos[key] = tamanho
+            self._bytes += tamanho
+            self._itens.move_to_end( key )
+            while len( self._itens ) > self.maxsize or ( self.maxbytes is not None and self._bytes > self.maxbytes ):
+                antigo, _ = self._itens.popitem( last = False )
+                self._bytes -= self._tamanhos.pop( antigo )
+                self.evictions += 1
+        return valor
+
+    def stats( self ):
+        """Contadores do cache: acertos, falhas, descartes, itens e bytes guardados."""
+        with self._lock:
+            return { 'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                     'entries': len( self._itens ), 'bytes': self._bytes }
+
+    def clear( self ):
+        with self._lock:
+            self._itens.clear()
+            self._tamanhos.clear()
+            self._bytes = 0
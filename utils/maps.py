@@ -0,0 +1,108 @@
+# Libraries
+import os
+
+import folium
+import numpy as np
+from folium.plugins import FastMarkerCluster, HeatMap
+
+from utils import sql
+from utils.filters import gather
+from utils.lru import LRUCache
+from utils.sketches import is_sketch, quantiles
+from utils.timing import register_counters
+
+# Memória máxima (MB) ocupada pelo HTML dos mapas em cache
+MAP_CACHE_MB = float( os.environ.get( 'CURRY_MAP_CACHE_MB', '128' ) )
+
+# HTML dos mapas já renderizados, compartilhado entre as sessões (chave: estado dos filtros)
+map_cache = LRUCache( maxsize = 32, maxbytes = int( MAP_CACHE_MB * 2**20 ), sizeof = len )
+register_counters( 'map_cache', map_cache.stats )
+
+# Cria cada marcador no navegador a partir de [latitude, longitude] ou [latitude, longitude, popup]
+MARKER_CALLBACK = """
+function (row) {
+    var marker = L.marker( new L.LatLng( row[0], row[1] ) );
+    if ( row[2] ) { marker.bindPopup( row[2] ); }
+    return marker;
+}
+"""
+
+# -------------------------------------
+# Funções
+# -------------------------------------
+def _fit( map, bounds ):
+    # Enquadra o mapa no retângulo (lat_min, lat_max, lon_min, lon_max), quando informado
+    if bounds is not None:
+        lat_min, lat_max, lon_min, lon_max = ( float( v ) for v in bounds )
+        map.fit_bounds( [[lat_min, lon_min], [lat_max, lon_max]] )
+
+def india_map_html( dfm, por_pedido = False, bounds = None ):
+    """Renderiza o mapa das entregas e retorna o HTML.
+
+       Por padrão marca a mediana da localização de entrega por cidade e tipo de trânsito;
+       com por_pedido = True marca o local de cada entrega.
+       Os marcadores formam uma única camada (FastMarkerCluster), montada de uma só vez a partir
+       das colunas, e são desenhados pelo navegador, o que suporta muitos pontos.
+       No modo aproximado (ver utils/sketches.py), as medianas saem dos digests dos sketches.
+
+       Input: Dataframe ou seleção (ver filters.selection), ou sketches filtrados (só para as medianas),
+              marcar cada pedido ou só as medianas,
+              retângulo opcional (lat_min, lat_max, lon_min, lon_max) para enquadrar o mapa
+       Output: HTML do mapa
+    """
+    cols = ['City','Road_traffic_density','Delivery_location_latitude','Delivery_location_longitude']
+    if sql.is_sql( dfm ):
+        pontos = sql.map_points( dfm, por_pedido )
+    elif is_sketch( dfm ):
+        por = ['City','Road_traffic_density']
+        pontos = quantiles( dfm, cols[2], [0.5], by = por ).rename( columns = { 'p50': cols[2] } )
+        pontos[cols[3]] = quantiles( dfm, cols[3], [0.5], by = por )['p50']
+    elif por_pedido:
+        pontos = gather( dfm, cols ).loc[:,cols]
+    else:
+        pontos = gather( dfm, cols ).loc[:,cols].groupby(['City','Road_traffic_density'], observed = True).median().reset_index()
+
+    # Coordenadas com 5 casas decimais (~1 m), o que reduz bastante o HTML com muitos pontos
+    coordenadas = pontos[['Delivery_location_latitude','Delivery_location_longitude']].to_numpy( dtype = float ).round( 5 )
+    if por_pedido:
+        # Sem popup por entrega, para manter o HTML enxuto
+        data = coordenadas.tolist()
+    else:
+        popup = ( pontos['City'].astype( str ) + ' - ' + pontos['Road_traffic_density'].astype( str ) ).to_numpy( dtype = object )
+        data = np.column_stack( [coordenadas.astype( object ), popup] ).tolist()
+
+    map = folium.Map()
+    FastMarkerCluster( data, callback = MARKER_CALLBACK ).add_to( map )
+    _fit( map, bounds )
+    return folium.Figure().add_child( map ).render()
+
+def cached_india_map_html( dfm, chave, por_pedido = False, bounds = None ):
+    """HTML do mapa, reaproveitado enquanto chave (versão dos dados + filtros) não mudar.
+
+       dfm pode ser uma função que retorna o dataframe filtrado; ela só é chamada quando
+       o HTML não está em cache.
+    """
+    return map_cache.get_or_set( ( chave, por_pedido ),
+                                 lambda: india_map_html( dfm() if callable( dfm ) else dfm, por_pedido, bounds ) )
+
+def heatmap_html( celulas, bounds = None ):
+    """Renderiza o mapa de calor dos pedidos e retorna o HTML.
+
+       Cada célula da grade espacial (ver utils/spatial.py) vira um ponto no centro da célula com peso
+       proporcional aos seus pedidos, então o tamanho do HTML depende das células e não dos pedidos.
+
+       Input: Dataframe de spatial.cell_aggregates ('lat', 'lon', 'orders'), retângulo opcional para enquadrar
+       Output: HTML do mapa
+    """
+    pesos = celulas['orders'].to_numpy( dtype = float )
+    pesos = pesos / pesos.max() if len( pesos ) else pesos
+    data = np.column_stack( [celulas[['lat','lon']].to_numpy( dtype = float ).round( 5 ), pesos.round( 4 )] ).tolist()
+    map = folium.Map()
+    HeatMap( data, min_opacity = 0.3, radius = 15, blur = 10 ).add_to( map )
+    _fit( map, bounds )
+    return folium.Figure().add_child( map ).render()
+
+def cached_heatmap_html( celulas, chave, bounds = None ):
+    """HTML do mapa de calor, em cache como em cached_india_map_html (celulas pode ser uma função)."""
+    return map_cache.get_or_set( ( chave, 'heatmap' ),
+                                 lambda: heatmap_html( celulas() if callable( celulas ) else celulas, bounds ) )
@@ -0,0 +1,139 @@
+# Libraries
+import numpy as np
+import pandas as pd
+
+from utils import sql
+from utils.filters import gather
+from utils.lru import LRUCache
+from utils.timing import register_counters
+
+# Estatísticas de cada entregador: coluna do perfil -> (coluna dos pedidos, agregação)
+STATS = {
+    'Nota_media': ( 'Delivery_person_Ratings', 'mean' ),
+    'Nota_std': ( 'Delivery_person_Ratings', 'std' ),
+    'Tempo_medio': ( 'Time_taken(min)', 'mean' ),
+    'Tempo_std': ( 'Time_taken(min)', 'std' ),
+}
+
+# Conjuntos de valores de cada entregador: coluna do perfil -> coluna dos pedidos.
+# Cada conjunto é guardado como uma máscara de bits (bit i = i-ésimo valor em ordem alfabética)
+# e só vira texto nas linhas da página exibida
+SETS = { 'Cidades': 'City', 'Veiculos': 'Type_of_vehicle' }
+
+# Colunas que podem ordenar a tabela
+SORT_COLUMNS = ['Delivery_person_ID','Pedidos'] + list( STATS )
+
+# Perfis já calculados, compartilhados entre as sessões (chave: versão dos dados + filtros)
+profile_cache = LRUCache( maxsize = 16 )
+register_counters( 'profile_cache', profile_cache.stats )
+
+# -------------------------------------
+# Funções
+# -------------------------------------
+def _codes( serie ):
+    """Códigos e valores distintos (em ordem alfabética) de uma coluna, sem fatorar categóricas de novo."""
+    if isinstance( serie.dtype, pd.CategoricalDtype ) and serie.cat.ordered:
+        return serie.cat.codes.to_numpy(), list( serie.cat.categories )
+    codes, valores = pd.factorize( serie, sort = True )
+    return codes, list( valores )
+
+def build_profiles( dfm ):
+    """Perfil de cada entregador: pedidos, média e desvio padrão (amostral) da nota e do tempo de entrega,
+       cidades e tipos de veículo.
+
+       Tudo sai de np.bincount sobre o código do entregador de cada pedido (sem groupby por coluna);
+       com o backend DuckDB, o mesmo perfil sai de uma única consulta (ver utils/sql.py).
+
+       Input: pedidos (Dataframe, seleção de filters.selection ou filtro SQL de filter_orders)
+       Output: dicionário com 'table' (Dataframe indexado e ordenado por 'Delivery_person_ID'),
+               'names' (valores de cada conjunto de SETS) e 'orders' (ordenações já calculadas)
+    """
+    if sql.is_sql( dfm ):
+        table, names = sql.driver_profiles( dfm, STATS, SETS )
+        return { 'table': table, 'names': names, 'orders': {} }
+
+    dfm = gather( dfm, ['Delivery_person_ID'] + list( dict.fromkeys( col for col, _ in STATS.values() ) ) + list( SETS.values() ) )
+    codes, ids = _codes( dfm['Delivery_person_ID'] )
+    validos = codes >= 0
+    codes = codes[validos]
+    n = len( ids )
+    table = pd.DataFrame( { 'Pedidos': np.bincount( codes, minlength = n ) },
+                          index = pd.Index( np.asarray( ids, dtype = object ), name = 'Delivery_person_ID' ) )
+    for nome, ( col, agregacao ) in STATS.items():
+        valores = dfm[col].to_numpy( dtype = float )[validos]
+        presentes = ~np.isnan( valores )
+        valores = np.where( presentes, valores, 0.0 )
+        contagem = np.bincount( codes, weights = presentes, minlength = n )
+        soma = np.bincount( codes, weights = valores, minlength = n )
+        media = soma / np.where( contagem > 0, contagem, np.nan )
+        if agregacao == 'mean':
+            table[nome] = media
+        else:
+            somaq = np.bincount( codes, weights = valores * valores, minlength = n )
+            var = ( somaq - contagem * media * media ) / np.where( contagem > 1, contagem - 1, np.nan )
+            table[nome] = np.sqrt( np.clip( var, 0, None ) )
+
+    names = {}
+    for nome, col in SETS.items():
+        valores, names[nome] = _codes( dfm[col] )
+        if len( names[nome] ) > 63:
+            raise ValueError( f'{col}: valores demais para uma máscara de bits ({len( names[nome] )})' )
+        valores = valores[validos]
+        presentes = valores >= 0
+        mascara = np.zeros( n, dtype = np.int64 )
+        np.bitwise_or.at( mascara, codes[presentes], np.left_shift( 1, valores[presentes].astype( np.int64 ) ) )
+        table[nome] = mascara
+    # Categóricas guardam todos os entregadores do dataset: ficam só os que têm pedidos na seleção
+    return { 'table': table.loc[table['Pedidos'] > 0, :], 'names': names, 'orders': {} }
+
+def cached_profiles( dfm, chave ):
+    """Perfis dos entregadores, reaproveitados enquanto chave (versão dos dados + filtros) não mudar.
+
+       dfm pode ser uma função que retorna os pedidos filtrados; ela só é chamada quando os
+       perfis não estão em cache. Trocar de página, de ordenação ou de busca não recalcula os perfis.
+    """
+    return profile_cache.get_or_set( chave, lambda: build_profiles( dfm() if callable( dfm ) else dfm ) )
+
+def _sort_order( profiles, sort_by, descending ):
+    """Posições das linhas ordenadas por sort_by (calculadas uma vez por perfil e guardadas nele).
+
+       Empates mantêm a ordem dos identificadores; valores ausentes ficam sempre no fim.
+    """
+    chave = ( sort_by, descending )
+    if chave not in profiles['orders']:
+        table = profiles['table']
+        if sort_by == 'Delivery_person_ID':
+            ordem = np.arange( len( table ) )
+            ordem = ordem[::-1] if descending else ordem
+        else:
+            valores = table[sort_by].to_numpy( dtype = float )
+            ordem = np.argsort( -valores if descending else valores, kind = 'stable' )
+        profiles['orders'][chave] = ordem
+    return profiles['orders'][chave]
+
+def select_profiles( profiles, search = '', sort_by = 'Pedidos', descending = True ):
+    """Posições dos entregadores cujo identificador contém search (sem diferenciar maiúsculas), na ordem pedida.
+
+       Input: perfis (de build_profiles), texto da busca, coluna de SORT_COLUMNS, ordem decrescente
+       Output: array com as posições das linhas em profiles['table']
+    """
+    if sort_by not in SORT_COLUMNS:
+        raise ValueError( f'coluna de ordenação desconhecida: {sort_by}' )
+    ordem = _sort_order( profiles, sort_by, descending )
+    search = search.strip()
+    if not search:
+        return ordem
+    encontrados = profiles['table'].index.str.contains( search, case = False, regex = False )
+    return ordem[encontrados[ordem]]
+
+def profile_page( profiles, posicoes, page, page_size = 50 ):
+    """Linhas da página page (começando em 0) da seleção posicoes, com os conjuntos já como texto.
+
+       Só as linhas da página são copiadas e formatadas, então o custo (e o tamanho do que vai
+       para o navegador) não depende da quantidade de entregadores.
+    """
+    linhas = profiles['table'].take( posicoes[page * page_size:( page + 1 ) * page_size] ).reset_index()
+    for nome, valores in profiles['names'].items():
+        linhas[nome] = [', '.join( v for i, v in enumerate( valores ) if mascara >> i & 1 )
+                        for mascara in linhas[nome].to_numpy()]
+    return linhas
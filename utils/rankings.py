@@ -0,0 +1,56 @@
+# Libraries
+import numpy as np
+
+from utils import sql
+from utils.filters import gather
+
+# -------------------------------------
+# Funções
+# -------------------------------------
+def _k_primeiros( valores, k ):
+    """Posições dos k menores valores, em ordem crescente (empates pela posição original).
+
+       Usa seleção parcial (np.partition) para achar o k-ésimo valor; só os candidatos
+       até esse limiar são ordenados, e não o grupo inteiro.
+    """
+    k = min( k, len( valores ) )
+    if k == 0:
+        return np.array( [], dtype = int )
+    limiar = np.partition( valores, k - 1 )[k - 1]
+    candidatos = np.flatnonzero( valores <= limiar )
+    return candidatos[np.lexsort( ( candidatos, valores[candidatos] ) )][:k]
+
+def top_k_by_city( dfm, k = 10, col = 'Time_taken(min)' ):
+    """Os k entregadores mais rápidos e os k mais lentos de cada cidade, em uma única passagem.
+
+       O tempo médio de cada entregador é calculado uma vez (groupby por cidade e entregador);
+       os dois rankings saem desses mesmos valores por seleção parcial, sem ordenar tudo.
+       As cidades aparecem na ordem em que surgem no dataframe.
+
+       Input: Dataframe ou seleção (ver filters.selection), quantidade k por cidade, coluna de tempo
+       Output: (Dataframe dos mais rápidos, Dataframe dos mais lentos),
+               ambos com as colunas ['City','Delivery_person_ID', col]
+    """
+    if sql.is_sql( dfm ):
+        return sql.top_k_by_city( dfm, k, col )
+
+    dfm = gather( dfm, ['City','Delivery_person_ID',col] )
+    medias = dfm.loc[:,['City','Delivery_person_ID',col]].groupby(['City','Delivery_person_ID'], observed = True).mean().reset_index()
+    valores = medias[col].to_numpy()
+
+    rapidos, lentos = [], []
+    # As linhas de cada cidade são contíguas no resultado do groupby
+    inicio = medias.groupby( 'City', sort = False, observed = True ).indices
+    for cidade in dfm['City'].unique():
+        posicoes = inicio.get( cidade )
+        if posicoes is None:
+            continue
+        grupo = valores[posicoes]
+        rapidos.append( posicoes[_k_primeiros( grupo, k )] )
+        lentos.append( posicoes[_k_primeiros( -grupo, k )] )
+
+    def recorte( partes ):
+        linhas = np.concatenate( partes ) if partes else np.array( [], dtype = int )
+        return medias.take( linhas ).reset_index( drop = True )
+
+    return recorte( rapidos ), recorte( lentos )
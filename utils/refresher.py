@@ -0,0 +1,115 @@
+# Libraries
+import datetime
+import os
+import threading
+import time
+
+from utils import dataset, sql
+from utils.cube import stream_cube
+from utils.dataset import CHUNK_SIZE, DATA_PATH
+from utils.sketches import APPROX, stream_sketches
+
+# Intervalo (s) entre as verificações da fonte pela thread de atualização (0 = sem thread: cada
+# rerun confere o arquivo e o primeiro depois de uma mudança faz a releitura)
+REFRESH_SECONDS = float( os.environ.get( 'CURRY_REFRESH_SECONDS', '30' ) )
+
+# Estado de cada fonte atualizada em segundo plano: caminho -> dicionário de status
+_status = {}
+_lock = threading.Lock()
+
+# -------------------------------------
+# Funções
+# -------------------------------------
+def start_refresher( path = DATA_PATH, interval = REFRESH_SECONDS ):
+    """Inicia (uma vez por processo e fonte) a thread que mantém os dados da fonte atualizados.
+
+       A thread faz a primeira leitura logo ao iniciar e depois confere a fonte a cada interval
+       segundos. Quando ela muda, os dados limpos e as estruturas derivadas (ou o banco DuckDB)
+       são montados fora do caminho dos reruns e trocados de uma só vez, com um novo número de
+       versão (ver dataset.refresh e sql.refresh_database); os reruns sempre usam a versão já
+       publicada e nunca esperam pela leitura, exceto a primeira de todas.
+
+       Input: caminho da fonte, intervalo entre verificações em segundos (<= 0 não inicia a thread)
+       Output: True se a thread está ativa
+    """
+    if interval <= 0:
+        return False
+    with _lock:
+        status = _status.get( path )
+        if status is not None and status['thread'] is not None and status['thread'].is_alive():
+            return True
+        if sql.BACKEND == 'duckdb':
+            sql.watch_database( path )
+        else:
+            dataset.watch( path )
+        thread = threading.Thread( target = _loop, args = ( path, interval ), name = f'curry-refresh {path}', daemon = True )
+        _status[path] = _new_status( thread, interval )
+        thread.start()
+    return True
+
+def _new_status( thread = None, interval = None ):
+    return { 'thread': thread, 'interval': interval, 'backend': sql.BACKEND, 'checks': 0, 'last_check': None,
+             'last_refresh': None, 'refresh_seconds': None, 'version': None, 'error': None }
+
+def _loop( path, interval ):
+    while True:
+        refresh_once( path )
+        time.sleep( interval )
+
+def refresh_once( path = DATA_PATH ):
+    """Uma verificação da fonte: troca os dados se ela mudou e registra o resultado no status.
+
+       Erros (ex.: CSV ainda sendo gravado ou inválido) não derrubam a thread: a versão anterior
+       continua publicada e a fonte é conferida de novo na próxima verificação.
+    """
+    status = _status.setdefault( path, _new_status() )
+    inicio = time.perf_counter()
+    try:
+        if status['backend'] == 'duckdb':
+            versao = sql.refresh_database( path )
+        elif CHUNK_SIZE:
+            versao = _refresh_streaming( path )
+        else:
+            versao = dataset.refresh( path )
+        if versao:
+            status.update( last_refresh = datetime.datetime.now(), refresh_seconds = time.perf_counter() - inicio,
+                           version = versao )
+        if status['version'] is None and versao is None:
+            # Dados já carregados antes da thread: registra a versão publicada
+            if status['backend'] == 'duckdb':
+                status['version'] = sql.open_database( path )['version']
+            elif CHUNK_SIZE:
+                status['version'] = dataset.streamed_version( stream_cube, path )
+            else:
+                status['version'] = dataset.data_version( path )
+        status['error'] = 'fonte alterada durante a leitura; nova tentativa na próxima verificação' if versao is False else None
+    except Exception as erro:
+        status['error'] = f'{type( erro ).__name__}: {erro}'
+    status['checks'] += 1
+    status['last_check'] = datetime.datetime.now()
+    return status
+
+def _refresh_streaming( path ):
+    # Modo streaming (CURRY_CHUNK_SIZE): a fonte é conferida pela chave dos arquivos e só o cubo e os
+    # sketches são lidos de novo, em blocos; a versão publicada é a do cubo. O dataframe inteiro só é
+    # relido se alguma página deste processo já o carregou (ex.: Empresa e Entregadores)
+    resultados = [dataset.refresh_streamed( stream_cube, path )]
+    if APPROX:
+        resultados.append( dataset.refresh_streamed( stream_sketches, path ) )
+    if dataset.is_loaded( path ):
+        resultados.append( dataset.refresh( path ) )
+    if any( r is False for r in resultados ):
+        return False
+    return resultados[0]
+
+def refresher_status( path = DATA_PATH ):
+    """Status da atualização em segundo plano da fonte (None se a thread não foi iniciada).
+
+       Output: dicionário com 'interval', 'backend', 'running', 'checks', 'last_check', 'last_refresh',
+               'refresh_seconds' (duração da última troca), 'version' e 'error'
+    """
+    atual = _status.get( path )
+    if atual is None:
+        return None
+    return { **{ k: v for k, v in atual.items() if k != 'thread' },
+             'running': atual['thread'] is not None and atual['thread'].is_alive() }
@@ -0,0 +1,314 @@
+# Libraries
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from utils import sql
+from utils.dataset import CHUNK_SIZE, DATA_PATH, iter_orders, load_derived, load_streamed, register_merge, source_files
+
+# Modo aproximado (CURRY_APPROX=1): entregadores distintos, medianas do mapa e percentis do tempo de
+# entrega saem de sketches combináveis, e não dos pedidos ou dos bitmaps de entregadores
+APPROX = os.environ.get( 'CURRY_APPROX', '' ) not in ( '', '0' )
+
+# Grão dos sketches: dia x trânsito x cidade (as dimensões dos filtros e dos agrupamentos que os usam)
+DIMENSIONS = ['Order_Date','Road_traffic_density','City']
+
+# HyperLogLog com 2**HLL_P registradores por célula: erro padrão de 1.04 / sqrt(2**HLL_P) ≈ 2.3%
+# (até ~2.5 * 2**HLL_P entregadores a estimativa usa contagem linear, com erro bem menor)
+HLL_P = 11
+
+# Digest de quantis com até DIGEST_K centróides por célula: erro de posto de no máximo 2 / DIGEST_K ≈ 1.6%
+# (cada incorporação de um lote à mesma célula pode somar até mais 2 / DIGEST_K, no pior caso)
+DIGEST_K = 128
+
+# Colunas com digest de quantis
+QUANTILE_COLUMNS = ['Time_taken(min)','Delivery_location_latitude','Delivery_location_longitude']
+
+# -------------------------------------
+# Funções
+# -------------------------------------
+def _bit_length( valores ):
+    """Quantidade de bits significativos de cada inteiro sem sinal de 64 bits (0 para o valor 0)."""
+    alto = ( valores >> np.uint64( 32 ) ).astype( np.float64 )
+    baixo = ( valores & np.uint64( 0xFFFFFFFF ) ).astype( np.float64 )
+    # frexp é exato para inteiros de 32 bits: x = m * 2**e com 0.5 <= m < 1, então e é o número de bits
+    return np.where( alto > 0, 32 + np.frexp( alto )[1], np.frexp( baixo )[1] )
+
+def _driver_hashes( serie ):
+    """Hash de 64 bits de cada entregador, calculado uma vez por valor distinto (estável entre processos)."""
+    codes, valores = pd.factorize( serie )
+    hashes = pd.util.hash_array( np.asarray( valores, dtype = object ) )
+    return codes, hashes
+
+def hll_registers( cell, codes, hashes, n_cells ):
+    """Registradores HyperLogLog de cada célula a partir dos pares (célula, entregador) dos pedidos.
+
+       Input: célula de cada pedido, código do entregador de cada pedido (-1 = ausente),
+              hash de cada código, quantidade de células
+       Output: array uint8 (n_cells x 2**HLL_P)
+    """
+    m = 1 << HLL_P
+    registros = np.zeros( ( n_cells, m ), dtype = np.uint8 )
+    validos = codes >= 0
+    if not validos.any():
+        return registros
+    # Cada par (célula, entregador) só precisa entrar uma vez
+    n_drivers = int( codes.max() ) + 1
+    pares = np.unique( cell[validos].astype( np.int64 ) * n_drivers + codes[validos] )
+    celulas, h = pares // n_drivers, hashes[pares % n_drivers]
+    # Primeiros HLL_P bits escolhem o registrador; o posto é a posição do primeiro bit 1 no restante
+    resto_bits = 64 - HLL_P
+    indice = ( h >> np.uint64( resto_bits ) ).astype( np.int64 )
+    posto = ( resto_bits - _bit_length( h & np.uint64( ( 1 << resto_bits ) - 1 ) ) + 1 ).astype( np.uint8 )
+    # Máximo do posto por (célula, registrador): ordena pela chave e pelo posto e fica com o último de cada chave
+    chave = celulas * m + indice
+    ordem = np.lexsort( ( posto, chave ) )
+    chave, posto = chave[ordem], posto[ordem]
+    ultimos = np.append( chave[1:] != chave[:-1], True )
+    registros.ravel()[chave[ultimos]] = posto[ultimos]
+    return registros
+
+def hll_estimate( registros ):
+    """Quantidade estimada de valores distintos de cada linha de registradores (HyperLogLog)."""
+    registros = np.atleast_2d( registros )
+    m = registros.shape[1]
+    alpha = 0.7213 / ( 1 + 1.079 / m )
+    estimativa = alpha * m * m / np.sum( np.exp2( -registros.astype( np.float64 ) ), axis = 1 )
+    zeros = ( registros == 0 ).sum( axis = 1 )
+    # Poucos valores: contagem linear sobre os registradores vazios
+    linear = m * np.log( m / np.maximum( zeros, 1 ) )
+    estimativa = np.where( ( estimativa <= 2.5 * m ) & ( zeros > 0 ), linear, estimativa )
+    return np.rint( estimativa ).astype( np.int64 )
+
+def _compress( means, weights, k ):
+    """Reduz cada linha de centróides (ordenados por valor) a k centróides de pesos aproximadamente iguais."""
+    n = len( means )
+    total = weights.sum( axis = 1, keepdims = True )
+    antes = np.cumsum( weights, axis = 1 ) - weights
+    slot = np.minimum( ( antes * k / np.where( total > 0, total, 1 ) ).astype( np.int64 ), k - 1 )
+    chave = ( np.arange( n )[:, None] * k + slot ).ravel()
+    pesos = np.bincount( chave, weights = weights.ravel(), minlength = n * k ).reshape( n, k )
+    somas = np.bincount( chave, weights = ( means * weights ).ravel(), minlength = n * k ).reshape( n, k )
+    return np.where( pesos > 0, somas / np.where( pesos > 0, pesos, 1 ), 0.0 ), pesos
+
+def digest_build( cell, valores, n_cells, k = None ):
+    """Digest de quantis de cada célula: até k centróides (média, peso) de trechos consecutivos dos valores ordenados.
+
+       Células com até k valores guardam os próprios valores (peso 1), sem erro.
+
+       Input: célula de cada pedido, valores, quantidade de células, centróides por célula (padrão DIGEST_K)
+       Output: (médias, pesos), ambos (n_cells x k), com os centróides de cada linha em ordem crescente
+    """
+    k = k or DIGEST_K
+    validos = ~np.isnan( valores )
+    cell, valores = cell[validos].astype( np.int64 ), valores[validos]
+    ordem = np.lexsort( ( valores, cell ) )
+    cell, valores = cell[ordem], valores[ordem]
+    contagem = np.bincount( cell, minlength = n_cells )
+    inicio = np.cumsum( contagem ) - contagem
+    posto = np.arange( len( cell ) ) - inicio[cell]
+    slot = np.minimum( posto * k // np.maximum( contagem[cell], k ), k - 1 )
+    chave = cell * k + slot
+    pesos = np.bincount( chave, minlength = n_cells * k ).reshape( n_cells, k ).astype( np.float64 )
+    somas = np.bincount( chave, weights = valores, minlength = n_cells * k ).reshape( n_cells, k )
+    return np.where( pesos > 0, somas / np.where( pesos > 0, pesos, 1 ), 0.0 ), pesos
+
+def digest_merge( a, b ):
+    """Combina, linha a linha, dois digests (médias, pesos) das mesmas células, com a mesma quantidade de centróides."""
+    k = a[0].shape[1]
+    means = np.concatenate( [a[0], b[0]], axis = 1 )
+    weights = np.concatenate( [a[1], b[1]], axis = 1 )
+    # Centróides vazios vão para o fim de cada linha
+    ordem = np.argsort( np.where( weights > 0, means, np.inf ), axis = 1, kind = 'stable' )
+    means = np.take_along_axis( means, ordem, axis = 1 )
+    weights = np.take_along_axis( weights, ordem, axis = 1 )
+    return _compress( means, weights, k )
+
+def digest_quantiles( means, weights, qs ):
+    """Quantis qs dos centróides (de qualquer quantidade de células), interpolando entre os centros.
+
+       Cada centróide ocupa o intervalo de postos [acumulado, acumulado + peso]; o valor do quantil
+       é interpolado entre os centros dos centróides vizinhos (com valores exatos, coincide com
+       a interpolação linear de np.quantile/median).
+    """
+    means, weights = np.ravel( means ), np.ravel( weights )
+    presentes = weights > 0
+    means, weights = means[presentes], weights[presentes]
+    if len( means ) == 0:
+        return np.full( len( qs ), np.nan )
+    ordem = np.argsort( means, kind = 'stable' )
+    means, weights = means[ordem], weights[ordem]
+    centros = np.cumsum( weights ) - weights / 2
+    total = weights.sum()
+    # Posto (contínuo) de cada quantil, na mesma escala de np.quantile: q * (n - 1) + 0.5
+    alvo = np.asarray( qs, dtype = float ) * ( total - 1 ) + 0.5
+    return np.interp( alvo, centros, means )
+
+def build_sketches( dfm ):
+    """Sketches combináveis de cada célula de DIMENSIONS (dia x trânsito x cidade).
+
+       - 'cells': Dataframe com DIMENSIONS e 'orders', ordenado por data (filtrável com cube.filter_cube)
+       - 'hll': registradores HyperLogLog dos entregadores de cada célula
+       - 'digests': coluna de QUANTILE_COLUMNS -> (médias, pesos) dos centróides de cada célula
+
+       Input: Dataframe limpo
+       Output: dicionário com 'cells', 'hll' e 'digests'
+    """
+    grupos = dfm.groupby( DIMENSIONS, sort = True, dropna = False, observed = True )
+    cell = grupos.ngroup().to_numpy()
+    cells = grupos.size().rename( 'orders' ).reset_index()
+    for col in DIMENSIONS:
+        if isinstance( cells[col].dtype, pd.CategoricalDtype ):
+            cells[col] = cells[col].astype( cells[col].cat.categories.dtype )
+    codes, hashes = _driver_hashes( dfm['Delivery_person_ID'] )
+    return { 'cells': cells,
+             'hll': hll_registers( cell, codes, hashes, len( cells ) ),
+             'digests': { col: digest_build( cell, dfm[col].to_numpy( dtype = float ), len( cells ) )
+                          for col in QUANTILE_COLUMNS } }
+
+def merge_sketches( sketches, lote ):
+    """Incorpora um lote de pedidos já limpos aos sketches (máximo dos registradores, combinação dos digests)."""
+    novos = build_sketches( lote )
+    cells = ( pd.concat( [sketches['cells'], novos['cells']], ignore_index = True )
+                .groupby( DIMENSIONS, sort = True, dropna = False )['orders'].sum()
+                .reset_index() )
+    chaves = pd.MultiIndex.from_frame( cells[DIMENSIONS] )
+    pos_antigas = chaves.get_indexer( pd.MultiIndex.from_frame( sketches['cells'][DIMENSIONS] ) )
+    pos_lote = chaves.get_indexer( pd.MultiIndex.from_frame( novos['cells'][DIMENSIONS] ) )
+
+    hll = np.zeros( ( len( cells ), sketches['hll'].shape[1] ), dtype = np.uint8 )
+    hll[pos_antigas] = sketches['hll']
+    hll[pos_lote] = np.maximum( hll[pos_lote], novos['hll'] )
+
+    digests = {}
+    for col in QUANTILE_COLUMNS:
+        k = sketches['digests'][col][0].shape[1]
+        antigos = [np.zeros( ( len( cells ), k ) ) for _ in range( 2 )]
+        do_lote = [np.zeros( ( len( cells ), k ) ) for _ in range( 2 )]
+        for destino, origem, pos in ( ( antigos, sketches['digests'][col], pos_antigas ), ( do_lote, novos['digests'][col], pos_lote ) ):
+            destino[0][pos], destino[1][pos] = origem
+        digests[col] = digest_merge( antigos, do_lote )
+    return { 'cells': cells, 'hll': hll, 'digests': digests }
+
+register_merge( build_sketches, merge_sketches )
+
+def stream_sketches( path = DATA_PATH, chunksize = CHUNK_SIZE ):
+    """Monta os sketches lendo o CSV em blocos de chunksize linhas, como cube.stream_cube."""
+    sketches = None
+    for arquivo in source_files( path ):
+        for lote in iter_orders( arquivo, chunksize ):
+            sketches = build_sketches( lote ) if sketches is None else merge_sketches( sketches, lote )
+    return sketches
+
+def load_sketches( path = DATA_PATH ):
+    """Sketches da versão atual do arquivo, compartilhados entre as sessões (streaming com CURRY_CHUNK_SIZE)."""
+    if not CHUNK_SIZE:
+        return load_derived( build_sketches, path )
+    return load_streamed( stream_sketches, path )
+
+def is_sketch( fonte ):
+    """Indica se fonte são sketches (de load_sketches, filtrados ou não)."""
+    return isinstance( fonte, dict ) and 'hll' in fonte
+
+def distinct_drivers( fonte ):
+    """Quantidade aproximada de entregadores distintos (HyperLogLog; approx_count_distinct no DuckDB)."""
+    if sql.is_sql( fonte ):
+        return sql.distinct_drivers( { **fonte, 'approx': True } )
+    registros = fonte['hll'][fonte['cells'].index.to_numpy()]
+    if len( registros ) == 0:
+        return 0
+    return int( hll_estimate( np.maximum.reduce( registros, axis = 0 ) )[0] )
+
+def quantiles( fonte, col, qs, by = () ):
+    """Quantis aproximados de col nas células de fonte, por combinação das colunas em by.
+
+       Input: sketches filtrados (ou filtro SQL, que usa approx_quantile), coluna de QUANTILE_COLUMNS,
+              lista de quantis, colunas de DIMENSIONS para agrupar
+       Output: Dataframe com by + uma coluna por quantil ('p50', 'p90', ...)
+    """
+    nomes = [f'p{q * 100:g}' for q in qs]
+    if sql.is_sql( fonte ):
+        return sql.quantiles( { **fonte, 'approx': True }, col, qs, list( by ), nomes )
+    cells = fonte['cells']
+    means, weights = ( d[cells.index.to_numpy()] for d in fonte['digests'][col] )
+    if not by:
+        return pd.DataFrame( [digest_quantiles( means, weights, qs )], columns = nomes )
+    linhas = []
+    for chave, posicoes in cells.groupby( list( by ), sort = True ).indices.items():
+        chave = chave if isinstance( chave, tuple ) else ( chave, )
+        linhas.append( list( chave ) + list( digest_quantiles( means[posicoes], weights[posicoes], qs ) ) )
+    return pd.DataFrame( linhas, columns = list( by ) + nomes )
+
+def accuracy( path = DATA_PATH, date_slider = None, traffic_options = ( 'Low','Medium','High','Jam' ) ):
+    """Compara o modo aproximado com o cálculo exato sobre os pedidos e confere os limites de erro documentados.
+
+       - entregadores distintos (total e por semana): erro relativo até 3 erros padrão do HyperLogLog
+       - percentis do tempo de entrega e medianas do mapa: erro de posto até 2 / DIGEST_K
+         (distância entre q e o intervalo de postos que o valor estimado ocupa nos dados exatos)
+
+       Output: lista com o nome das medidas fora do limite (vazia quando todas estão dentro)
+    """
+    # Importados aqui: buckets e cube usam este módulo
+    from utils.buckets import rollup_buckets
+    from utils.cube import filter_cube
+    from utils.dataset import load_data
+
+    date_slider = date_slider or pd.Timestamp( 2022, 4, 13 )
+    dfm = load_data( path )
+    dfm = dfm.loc[( dfm['Order_Date'] < date_slider ) & dfm['Road_traffic_density'].isin( traffic_options ), :]
+    sketches = filter_cube( load_sketches( path ), date_slider, list( traffic_options ) )
+
+    limite_hll = 3 * 1.04 / np.sqrt( 1 << HLL_P )
+    limite_posto = 2 / DIGEST_K
+    medidas = []
+
+    exato = dfm['Delivery_person_ID'].nunique()
+    medidas.append( ( 'distinct_drivers', abs( distinct_drivers( sketches ) - exato ) / exato, limite_hll ) )
+    semanas_exatas = rollup_buckets( dfm, 'week' )
+    semanas = rollup_buckets( sketches, 'week' )
+    erro = np.abs( semanas['Delivery_person_ID'] - semanas_exatas['Delivery_person_ID'] ) / semanas_exatas['Delivery_person_ID']
+    medidas.append( ( 'drivers_by_week', float( erro.max() ), limite_hll ) )
+
+    def erro_de_posto( valores, estimado, q ):
+        valores = np.sort( valores[~np.isnan( valores )] )
+        abaixo = np.searchsorted( valores, estimado, side = 'left' ) / len( valores )
+        ate = np.searchsorted( valores, estimado, side = 'right' ) / len( valores )
+        return max( abaixo - q, q - ate, 0.0 )
+
+    qs = [0.5, 0.9, 0.99]
+    estimados = quantiles( sketches, 'Time_taken(min)', qs ).iloc[0].to_numpy()
+    valores = dfm['Time_taken(min)'].to_numpy( dtype = float )
+    for q, estimado in zip( qs, estimados ):
+        medidas.append( ( f'time_taken_p{q * 100:g}', erro_de_posto( valores, estimado, q ), limite_posto ) )
+
+    for col in ['Delivery_location_latitude','Delivery_location_longitude']:
+        medianas = quantiles( sketches, col, [0.5], by = ['City','Road_traffic_density'] )
+        pior = 0.0
+        for linha in medianas.itertuples( index = False ):
+            grupo = dfm.loc[( dfm['City'] == linha[0] ) & ( dfm['Road_traffic_density'] == linha[1] ), col]
+            pior = max( pior, erro_de_posto( grupo.to_numpy( dtype = float ), linha[2], 0.5 ) )
+        medidas.append( ( f'map_median {col}', pior, limite_posto ) )
+
+    fora = []
+    for nome, erro, limite in medidas:
+        print( f'{nome:<45} erro {erro:.4f}  limite {limite:.4f}', file = sys.stderr )
+        if erro > limite:
+            fora.append( nome )
+    return fora
+
+if __name__ == '__main__':
+    # Exatidão do modo aproximado: python -m utils.sketches --accuracy [train.csv]
+    parser = argparse.ArgumentParser( description = 'Sketches do modo aproximado (CURRY_APPROX=1).' )
+    parser.add_argument( 'path', nargs = '?', default = DATA_PATH )
+    parser.add_argument( '--accuracy', action = 'store_true', help = 'compara com o cálculo exato' )
+    args = parser.parse_args()
+    if args.accuracy:
+        fora = accuracy( args.path )
+        print( 'dentro dos limites' if not fora else 'fora dos limites: ' + ', '.join( fora ) )
+        sys.exit( 1 if fora else 0 )
+    sketches = load_sketches( args.path )
+    bytes_ = sketches['hll'].nbytes + sum( m.nbytes + w.nbytes for m, w in sketches['digests'].values() )
+    print( f'células: {len( sketches["cells"] )}  memória: {bytes_ / 2**20:.1f} MB' )
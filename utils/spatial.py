@@ -0,0 +1,221 @@
+# Libraries
+import numpy as np
+import pandas as pd
+
+from utils import sql
+from utils.dataset import register_merge
+from utils.geo import EARTH_RADIUS_KM, haversine_km
+
+# Pontos indexados: nome -> (coluna de latitude, coluna de longitude)
+POINTS = { 'delivery': ( 'Delivery_location_latitude', 'Delivery_location_longitude' ),
+           'restaurant': ( 'Restaurant_latitude', 'Restaurant_longitude' ) }
+
+# Lado de cada célula da grade, em graus (~550 m de latitude)
+GRID_DEG = 0.005
+
+# Colunas da grade (0 a 360 graus de longitude); o id da célula é linha * GRID_COLS + coluna
+GRID_COLS = int( round( 360 / GRID_DEG ) )
+
+# Quilômetros por grau de latitude
+KM_PER_DEG = np.pi * EARTH_RADIUS_KM / 180
+
+# Máximo de células desenhadas em um mapa de calor (define o nível de agregação, ver auto_level)
+HEATMAP_CELLS = 20_000
+
+# -------------------------------------
+# Funções
+# -------------------------------------
+def grid_cells( lat, lon ):
+    """Linha e coluna da grade de cada coordenada (as linhas crescem com a latitude e as colunas com a longitude)."""
+    linha = np.floor( ( np.asarray( lat, dtype = np.float64 ) + 90 ) / GRID_DEG ).astype( np.int64 )
+    coluna = np.floor( ( np.asarray( lon, dtype = np.float64 ) + 180 ) / GRID_DEG ).astype( np.int64 )
+    return linha, np.clip( coluna, 0, GRID_COLS - 1 )
+
+def _grid( cells, ordem, tempos ):
+    # Agregados de cada célula ocupada (pedidos e soma dos tempos), a partir dos pedidos ordenados por célula
+    ordenadas = cells[ordem]
+    ids, inicios = np.unique( ordenadas, return_index = True )
+    if len( ids ) == 0:
+        return { 'cells': cells, 'order': ordem, 'sorted': ordenadas,
+                 'grid': { 'ids': ids, 'orders': np.zeros( 0, dtype = np.int64 ), 'time_sum': np.zeros( 0 ) } }
+    return { 'cells': cells, 'order': ordem, 'sorted': ordenadas,
+             'grid': { 'ids': ids, 'orders': np.diff( np.append( inicios, len( ordenadas ) ) ),
+                       'time_sum': np.add.reduceat( tempos[ordem].astype( np.float64 ), inicios ) } }
+
+def _index_points( dfm, lat_col, lon_col, tempos ):
+    linha, coluna = grid_cells( dfm[lat_col].to_numpy(), dfm[lon_col].to_numpy() )
+    cells = linha * GRID_COLS + coluna
+    return _grid( cells, np.argsort( cells, kind = 'stable' ), tempos )
+
+def build_spatial_index( dfm ):
+    """Índice espacial em grade fixa dos pontos de POINTS (restaurante e local de entrega).
+
+       Para cada tipo de ponto:
+       - 'cells': id da célula da grade de cada pedido (na ordem das linhas do dataframe)
+       - 'order' / 'sorted': posições dos pedidos ordenadas pela célula e as células nessa ordem;
+         os pedidos de um retângulo de células são trechos contíguos, achados por busca binária
+       - 'grid': agregados pré-calculados de cada célula ocupada ('ids', 'orders' e 'time_sum')
+       Também guarda 'time' (tempo de entrega de cada pedido), usado nos agregados de pedidos filtrados.
+
+       Input: Dataframe limpo, ordenado por 'Order_Date'
+       Output: dicionário com um índice por tipo de ponto, 'time', 'n' e 'last_date'
+    """
+    tempos = dfm['Time_taken(min)'].to_numpy( dtype = np.float32 )
+    indice = { kind: _index_points( dfm, *cols, tempos ) for kind, cols in POINTS.items() }
+    indice['time'] = tempos
+    indice['n'] = len( dfm )
+    indice['last_date'] = dfm['Order_Date'].iloc[-1] if len( dfm ) else None
+    return indice
+
+def merge_spatial_index( indice, lote ):
+    """Estende o índice com um lote de pedidos já limpos, anexado no fim do dataframe.
+
+       Como em filters.merge_filter_index, só é possível quando o lote não tem datas anteriores
+       às já indexadas (caso contrário o dataframe é reordenado e o índice é recalculado).
+    """
+    if len( lote ) == 0:
+        return indice
+    if indice['last_date'] is not None and lote['Order_Date'].min() < indice['last_date']:
+        return None
+    novo = build_spatial_index( lote )
+    tempos = np.concatenate( [indice['time'], novo['time']] )
+    combinado = { 'time': tempos, 'n': indice['n'] + novo['n'], 'last_date': novo['last_date'] }
+    for kind in POINTS:
+        antigo, do_lote = indice[kind], novo[kind]
+        # Intercala as duas listas já ordenadas por célula (posições do lote deslocadas para o fim),
+        # sem ordenar o histórico de novo; nos empates, os pedidos antigos vêm antes
+        posicoes = np.searchsorted( antigo['sorted'], do_lote['sorted'], side = 'right' )
+        combinado[kind] = { 'cells': np.concatenate( [antigo['cells'], do_lote['cells']] ),
+                            'order': np.insert( antigo['order'], posicoes, do_lote['order'] + indice['n'] ),
+                            'sorted': np.insert( antigo['sorted'], posicoes, do_lote['sorted'] ),
+                            'grid': _merge_grid( antigo['grid'], do_lote['grid'] ) }
+    return combinado
+
+def _merge_grid( a, b ):
+    # Insere as células do lote que ainda não estão em a (zeradas) e soma os agregados do lote; só as
+    # células do lote são procuradas, o histórico é apenas copiado uma vez pelo np.insert
+    posicoes = np.searchsorted( a['ids'], b['ids'] )
+    existe = posicoes < len( a['ids'] )
+    existe[existe] = a['ids'][posicoes[existe]] == b['ids'][existe]
+    novas = posicoes[~existe]
+    ids = np.insert( a['ids'], novas, b['ids'][~existe] )
+    orders = np.insert( a['orders'], novas, 0 )
+    time_sum = np.insert( a['time_sum'], novas, 0 )
+    posicoes = np.searchsorted( ids, b['ids'] )
+    orders[posicoes] += b['orders']
+    time_sum[posicoes] += b['time_sum']
+    return { 'ids': ids, 'orders': orders, 'time_sum': time_sum }
+
+register_merge( build_spatial_index, merge_spatial_index )
+
+def _restrict( posicoes, rows, n ):
+    """Posições em ordem crescente, só as que estão em rows (quando rows é informado)."""
+    posicoes = np.sort( posicoes )
+    if rows is None:
+        return posicoes
+    selecionadas = np.zeros( n, dtype = bool )
+    selecionadas[rows] = True
+    return posicoes[selecionadas[posicoes]]
+
+def query_bbox( indice, dfm, lat_min, lat_max, lon_min, lon_max, kind = 'delivery', rows = None ):
+    """Posições dos pedidos cujo ponto kind está no retângulo [lat_min, lat_max] x [lon_min, lon_max].
+
+       As células do retângulo formam, em cada linha da grade, um intervalo contíguo de ids: cada
+       intervalo vira um trecho de indice[kind]['order'] (duas buscas binárias), e só os pedidos
+       desses trechos têm as coordenadas conferidas.
+
+       Input: índice (de build_spatial_index), dataframe indexado, limites em graus, tipo de ponto,
+              posições já filtradas (ex.: de filter_rows) para restringir o resultado
+       Output: array com as posições das linhas, em ordem crescente (para usar com dfm.take)
+    """
+    pontos = indice[kind]
+    ( l0, l1 ), ( c0, c1 ) = ( np.sort( v ) for v in grid_cells( [lat_min, lat_max], [lon_min, lon_max] ) )
+    linhas = np.arange( l0, l1 + 1, dtype = np.int64 )
+    inicios = np.searchsorted( pontos['sorted'], linhas * GRID_COLS + c0, side = 'left' )
+    fins = np.searchsorted( pontos['sorted'], linhas * GRID_COLS + c1, side = 'right' )
+    tamanhos = fins - inicios
+    # Concatena os trechos [inicio, fim) sem laço: posição dentro do trecho + início do trecho
+    deslocamento = np.repeat( inicios - ( np.cumsum( tamanhos ) - tamanhos ), tamanhos )
+    candidatos = pontos['order'][np.arange( tamanhos.sum() ) + deslocamento]
+    lat_col, lon_col = POINTS[kind]
+    lat = dfm[lat_col].to_numpy()[candidatos]
+    lon = dfm[lon_col].to_numpy()[candidatos]
+    dentro = ( lat >= lat_min ) & ( lat <= lat_max ) & ( lon >= lon_min ) & ( lon <= lon_max )
+    return _restrict( candidatos[dentro], rows, indice['n'] )
+
+def query_radius( indice, dfm, lat, lon, radius_km, kind = 'delivery', rows = None ):
+    """Posições dos pedidos cujo ponto kind está a até radius_km de (lat, lon) (distância de haversine).
+
+       O círculo é primeiro coberto por um retângulo (query_bbox) e só os candidatos têm a distância calculada.
+    """
+    candidatos = query_bbox( indice, dfm, *region_bounds( lat, lon, radius_km ), kind, rows )
+    lat_col, lon_col = POINTS[kind]
+    distancia = haversine_km( lat, lon, dfm[lat_col].to_numpy()[candidatos], dfm[lon_col].to_numpy()[candidatos] )
+    return candidatos[distancia <= radius_km]
+
+def _cell_table( linha, coluna, orders, soma, lado ):
+    tamanho = GRID_DEG * lado
+    return pd.DataFrame( { 'lat': ( linha + 0.5 ) * tamanho - 90,
+                           'lon': ( coluna + 0.5 ) * tamanho - 180,
+                           'orders': orders,
+                           'time_mean': soma / np.maximum( orders, 1 ) } )
+
+def cell_aggregates( indice, kind = 'delivery', rows = None, level = 0 ):
+    """Pedidos e tempo médio de entrega por célula da grade, agregados em células de 2**level x 2**level.
+
+       Sem rows, parte dos agregados pré-calculados de cada célula (custo proporcional às células ocupadas);
+       com rows (posições filtradas, de filter_rows/query_*), agrega só esses pedidos.
+       O resultado tem uma linha por célula ocupada, o que permite desenhar mapas de calor de milhões de pedidos.
+
+       Input: índice, tipo de ponto, posições opcionais, nível de agregação (0 = grade original)
+       Output: Dataframe com 'lat' e 'lon' (centro da célula), 'orders' e 'time_mean', ordenado pela célula
+    """
+    if rows is None or len( rows ) == indice['n']:
+        # Filtros que mantêm todos os pedidos também usam os agregados pré-calculados
+        grid = indice[kind]['grid']
+        cells, pesos, tempos = grid['ids'], grid['orders'], grid['time_sum']
+    else:
+        cells, tempos = indice[kind]['cells'][rows], indice['time'][rows]
+        pesos = None
+    lado = 1 << level
+    linha, coluna = np.divmod( cells, GRID_COLS )
+    linha, coluna = linha // lado, coluna // lado
+    colunas = -( -GRID_COLS // lado )
+    ids, posicoes = np.unique( linha * colunas + coluna, return_inverse = True )
+    orders = np.bincount( posicoes, weights = pesos, minlength = len( ids ) ).astype( np.int64 )
+    soma = np.bincount( posicoes, weights = tempos, minlength = len( ids ) )
+    linha, coluna = np.divmod( ids, colunas )
+    return _cell_table( linha, coluna, orders, soma, lado )
+
+def sql_cell_aggregates( fonte, kind = 'delivery', level = 0 ):
+    """Mesmo resultado de cell_aggregates para o filtro SQL de filter_orders (backend DuckDB)."""
+    lado = 1 << level
+    tabela = sql.grid_aggregates( fonte, *POINTS[kind], GRID_DEG, GRID_COLS, lado )
+    return _cell_table( tabela['linha'].to_numpy(), tabela['coluna'].to_numpy(), tabela['orders'].to_numpy( dtype = np.int64 ),
+                        tabela['time_sum'].to_numpy( dtype = float ), lado )
+
+def extent( indice, kind = 'delivery' ):
+    """Retângulo (lat_min, lat_max, lon_min, lon_max) que contém as células ocupadas do índice
+       (ou os pontos do filtro SQL de filter_orders, no backend DuckDB)."""
+    if sql.is_sql( indice ):
+        lat_col, lon_col = POINTS[kind]
+        limites = sql.extremes( indice, lat_col ) + sql.extremes( indice, lon_col )
+        return None if any( pd.isna( v ) for v in limites ) else tuple( float( v ) for v in limites )
+    ids = indice[kind]['grid']['ids']
+    if len( ids ) == 0:
+        return None
+    linha, coluna = np.divmod( ids, GRID_COLS )
+    return ( linha.min() * GRID_DEG - 90, ( linha.max() + 1 ) * GRID_DEG - 90,
+             coluna.min() * GRID_DEG - 180, ( coluna.max() + 1 ) * GRID_DEG - 180 )
+
+def region_bounds( lat, lon, radius_km ):
+    """Retângulo (lat_min, lat_max, lon_min, lon_max) que cobre o círculo de raio radius_km em torno de (lat, lon)."""
+    dlat = radius_km / KM_PER_DEG
+    dlon = radius_km / ( KM_PER_DEG * max( np.cos( np.radians( min( abs( lat ) + dlat, 89.9 ) ) ), 1e-6 ) )
+    return lat - dlat, lat + dlat, lon - dlon, lon + dlon
+
+def auto_level( bounds, max_cells = HEATMAP_CELLS ):
+    """Menor nível de agregação em que o retângulo bounds tem no máximo max_cells células."""
+    lat_min, lat_max, lon_min, lon_max = bounds
+    celulas = max( ( lat_max - lat_min ) / GRID_DEG, 1 ) * max( ( lon_max - lon_min ) / GRID_DEG, 1 )
+    return max( 0, int( np.ceil( np.log2( celulas / max_cells ) / 2 ) ) )
@@ -0,0 +1,403 @@
+# Libraries
+import os
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils.dataset import DATA_PATH, ingest, is_partitioned, source_key
+from utils.geo import EARTH_RADIUS_KM
+from utils.timing import stage
+
+try:
+    import duckdb   # Backend opcional (pip install -r requirements-duckdb.txt)
+except ImportError:
+    duckdb = None
+
+# Backend das agregações das páginas: 'pandas' (padrão, cubo e dataframe em memória) ou 'duckdb'
+BACKEND = os.environ.get( 'CURRY_BACKEND', 'pandas' )
+
+# Versão do formato do banco; bancos de versões anteriores são recriados
+DATABASE_VERSION = '2'
+
+# Conexão somente leitura por banco: caminho do banco -> {'con', 'key', 'version'}
+_databases = {}
+_lock = threading.Lock()
+
+# Serializa a (re)criação dos bancos (adquirido antes de _lock)
+_build_lock = threading.Lock()
+
+# Conexão substituída por banco, fechada só na troca seguinte (reruns em andamento ainda podem usá-la)
+_retired = {}
+
+# Bancos atualizados em segundo plano (ver utils/refresher.py): open_database não confere a fonte
+_background = set()
+
+# -------------------------------------
+# Funções
+# -------------------------------------
+def database_path( path = DATA_PATH ):
+    """Caminho do banco DuckDB de uma fonte: train.csv -> train.duckdb (pasta/glob -> pedidos.duckdb)."""
+    if is_partitioned( path ):
+        pasta = path if os.path.isdir( path ) else os.path.dirname( path )
+        return pasta.rstrip( '/' ) + '.duckdb'
+    return os.path.splitext( path )[0] + '.duckdb'
+
+def _source_version( path ):
+    return repr( [( os.path.basename( f ), mtime, size ) for f, mtime, size in source_key( path )] )
+
+def build_database( path = DATA_PATH ):
+    """Grava os pedidos limpos (ingest, ver utils/dataset.py) em um banco DuckDB ao lado da fonte.
+
+       As colunas categóricas viram texto; a tabela 'meta' guarda a versão do formato e a versão
+       dos arquivos de origem, para que o banco seja recriado quando a fonte mudar.
+       O banco é escrito em um arquivo temporário e renomeado, então leitores nunca veem um banco pela metade.
+
+       Input: caminho do CSV (ou pasta/glob com vários CSVs)
+       Output: caminho do banco gravado
+    """
+    if duckdb is None:
+        raise ImportError( 'o backend duckdb precisa do pacote duckdb (pip install -r requirements-duckdb.txt)' )
+    dfm = ingest( path )
+    texto = { col: dfm[col].astype( object ) for col in dfm.columns if isinstance( dfm[col].dtype, pd.CategoricalDtype ) }
+    pedidos = dfm.assign( **texto )
+
+    destino = database_path( path )
+    temporario = destino + '.tmp'
+    if os.path.exists( temporario ):
+        os.remove( temporario )
+    con = duckdb.connect( temporario )
+    try:
+        con.register( 'pedidos', pedidos )
+        # A ordem de inserção (por data) é preservada e usada como posição das linhas (rowid)
+        con.execute( 'CREATE TABLE orders AS SELECT * FROM pedidos' )
+        con.execute( 'CREATE TABLE meta ( key VARCHAR, value VARCHAR )' )
+        con.executemany( 'INSERT INTO meta VALUES ( ?, ? )', [( 'database_version', DATABASE_VERSION ),
+                                                            ( 'source_version', _source_version( path ) )] )
+    finally:
+        con.close()
+    os.replace( temporario, destino )
+    return destino
+
+def _is_current( destino, path ):
+    con = duckdb.connect( destino, read_only = True )
+    try:
+        meta = dict( con.execute( 'SELECT key, value FROM meta' ).fetchall() )
+    except duckdb.Error:
+        return False
+    finally:
+        con.close()
+    return ( meta.get( 'database_version' ) == DATABASE_VERSION
+             and meta.get( 'source_version' ) == _source_version( path ) )
+
+def open_database( path = DATA_PATH ):
+    """Conexão somente leitura com o banco da versão atual da fonte, compartilhada pelas sessões.
+
+       O banco é (re)criado com build_database quando não existe ou está desatualizado.
+       Os dados ficam no arquivo do DuckDB, e não em um dataframe na memória de cada processo.
+
+       Output: dicionário com 'con' (conexão), 'version' (muda quando o banco é recriado) e 'path'
+    """
+    if duckdb is None:
+        raise ImportError( 'o backend duckdb precisa do pacote duckdb (pip install -r requirements-duckdb.txt)' )
+    destino = database_path( path )
+    with _lock:
+        db = _databases.get( destino )
+    if db is not None and destino in _background:
+        return db
+    key = source_key( path )
+    if db is not None and db['key'] == key:
+        return db
+    with _build_lock:
+        with _lock:
+            db = _databases.get( destino )
+        if db is not None and db['key'] == key:
+            return db
+        _build( path, destino )
+        return _install( destino, key )
+
+def _build( path, destino ):
+    # (Re)cria o banco quando ele não existe ou está desatualizado; chamada com _build_lock
+    if not os.path.exists( destino ) or not _is_current( destino, path ):
+        with stage( 'build_database' ):
+            build_database( path )
+
+def _install( destino, key ):
+    """Publica uma conexão nova com o banco; a anterior fica aposentada até a próxima troca."""
+    with _lock:
+        anterior = _databases.get( destino )
+        versao = ( anterior['version'] + 1 ) if anterior is not None else 1
+        db = { 'con': duckdb.connect( destino, read_only = True ), 'key': key, 'version': versao, 'path': destino }
+        _databases[destino] = db
+        if anterior is not None:
+            aposentada = _retired.pop( destino, None )
+            if aposentada is not None:
+                aposentada.close()
+            _retired[destino] = anterior['con']
+    return db
+
+def watch_database( path = DATA_PATH ):
+    """Passa o banco da fonte para atualização em segundo plano (ver refresh_database)."""
+    _background.add( database_path( path ) )
+
+def refresh_database( path = DATA_PATH ):
+    """Recria o banco quando a fonte muda e troca a conexão compartilhada (usada por utils/refresher.py).
+
+       O banco novo é gravado à parte (ver build_database) enquanto as sessões continuam consultando
+       o anterior; se a fonte mudar durante a gravação, a troca fica para a próxima chamada.
+
+       Output: número da versão publicada, None se a fonte não mudou ou False se ela mudou durante a gravação
+    """
+    destino = database_path( path )
+    key = source_key( path )
+    with _lock:
+        db = _databases.get( destino )
+    if db is not None and db['key'] == key:
+        return None
+    with _build_lock:
+        _build( path, destino )
+        if source_key( path ) != key:
+            return False
+        return _install( destino, key )['version']
+
+def filter_orders( db, date_slider, traffic_options, approx = False ):
+    """Filtros da barra lateral como cláusula WHERE, aplicada dentro de cada consulta (no lugar de filter_cube).
+
+       Cada rerun usa seu próprio cursor, já que uma conexão do DuckDB não deve ser usada por
+       várias threads ao mesmo tempo. Com approx, entregadores distintos e medianas usam as
+       agregações aproximadas do DuckDB (approx_count_distinct e approx_quantile).
+    """
+    return { 'con': db['con'].cursor(),
+             'version': db['version'],
+             'approx': approx,
+             'where': '"Order_Date" < ? AND list_contains( ?, "Road_traffic_density" )',
+             'params': [pd.Timestamp( date_slider ).to_pydatetime(), list( traffic_options )] }
+
+def is_sql( fonte ):
+    """Indica se fonte é um filtro do backend SQL (de filter_orders), e não um cubo ou dataframe."""
+    return isinstance( fonte, dict ) and 'where' in fonte
+
+def _query( fonte, select, group_by = None, order_by = None ):
+    sql = f'SELECT {select} FROM orders WHERE {fonte["where"]}'
+    if group_by:
+        sql += f' GROUP BY {group_by}'
+    if order_by:
+        sql += f' ORDER BY {order_by}'
+    return fonte['con'].execute( sql, fonte['params'] ).df()
+
+def _distinct( fonte, col ):
+    return f'approx_count_distinct("{col}")' if fonte.get( 'approx' ) else f'COUNT( DISTINCT "{col}" )'
+
+def _median( fonte, col ):
+    return f'approx_quantile("{col}", 0.5)' if fonte.get( 'approx' ) else f'MEDIAN("{col}")'
+
+def _cols( by ):
+    return ', '.join( f'"{col}"' for col in by )
+
+def rollup_count( fonte, by ):
+    """Quantidade de pedidos por combinação das colunas em by (mesmo formato de cube.rollup_count)."""
+    return _query( fonte, f'{_cols( by )}, COUNT(*) AS "ID"', _cols( by ), _cols( by ) )
+
+def rollup_stats( fonte, by, col ):
+    """Contagem, média, desvio padrão (amostral), mínimo e máximo de col por combinação de by
+       (mesmo formato de cube.rollup_stats)."""
+    return _query( fonte, f'{_cols( by )}, COUNT("{col}")::DOUBLE AS count, AVG("{col}") AS mean, '
+                          f'STDDEV_SAMP("{col}") AS std, MIN("{col}") AS min, MAX("{col}") AS max',
+                   _cols( by ), _cols( by ) )
+
+def distinct_drivers( fonte ):
+    """Quantidade de entregadores distintos nos pedidos filtrados."""
+    return int( _query( fonte, f'{_distinct( fonte, "Delivery_person_ID" )} AS n' )['n'].iloc[0] )
+
+def overall_mean( fonte, col ):
+    """Média de col nos pedidos filtrados."""
+    return _query( fonte, f'AVG("{col}") AS mean' )['mean'].iloc[0]
+
+def extremes( fonte, col ):
+    """(mínimo, máximo) de col nos pedidos filtrados."""
+    linha = _query( fonte, f'MIN("{col}") AS min, MAX("{col}") AS max' ).iloc[0]
+    return linha['min'], linha['max']
+
+# Chave inteira de cada período, igual à de buckets.time_keys (dayofweek: 0 = domingo, como em '%U')
+BUCKET_KEYS = {
+    'day': 'year("Order_Date") * 10000 + month("Order_Date") * 100 + day("Order_Date")',
+    'week': 'year("Order_Date") * 100 + ( dayofyear("Order_Date") + 6 - dayofweek("Order_Date") ) // 7',
+    'month': 'year("Order_Date") * 100 + month("Order_Date")',
+    'quarter': 'year("Order_Date") * 10 + quarter("Order_Date")',
+}
+
+def rollup_buckets( fonte, granularity ):
+    """Pedidos e entregadores distintos por período (chave de BUCKET_KEYS), em uma única consulta.
+
+       Output: Dataframe com 'bucket', 'ID' (pedidos) e 'Delivery_person_ID' (entregadores distintos)
+    """
+    return _query( fonte, f'{BUCKET_KEYS[granularity]} AS bucket, COUNT(*) AS "ID", '
+                          f'{_distinct( fonte, "Delivery_person_ID" )} AS "Delivery_person_ID"',
+                   'bucket', 'bucket' )
+
+def driver_rating_means( fonte ):
+    """Nota média de cada entregador (mesmo formato de charts.driver_rating_means)."""
+    return _query( fonte, '"Delivery_person_ID", AVG("Delivery_person_Ratings") AS "Nota_media_por_entregador"',
+                   '"Delivery_person_ID"', '"Delivery_person_ID"' )
+
+def driver_profiles( fonte, stats, sets ):
+    """Perfil de cada entregador em uma única consulta (mesmo formato de profiles.build_profiles).
+
+       Input: filtro de filter_orders, estatísticas (coluna do perfil -> (coluna, 'mean' ou 'std')),
+              conjuntos (coluna do perfil -> coluna dos pedidos)
+       Output: (Dataframe indexado por 'Delivery_person_ID', valores de cada conjunto em ordem alfabética)
+    """
+    names = { nome: [valor for ( valor, ) in fonte['con'].execute(
+                         f'SELECT DISTINCT "{col}" FROM orders WHERE "{col}" IS NOT NULL ORDER BY 1' ).fetchall()]
+              for nome, col in sets.items() }
+    funcoes = { 'mean': 'AVG', 'std': 'STDDEV_SAMP' }
+    colunas = [f'{funcoes[agregacao]}("{col}") AS "{nome}"' for nome, ( col, agregacao ) in stats.items()]
+    # Máscara de bits: bit i = i-ésimo valor do conjunto
+    colunas += [f'BIT_OR( 1::BIGINT << ( list_position( ?, "{col}" ) - 1 ) ) AS "{nome}"' for nome, col in sets.items()]
+    sql = f'''
+        SELECT "Delivery_person_ID", COUNT(*) AS "Pedidos", {', '.join( colunas )}
+        FROM orders WHERE {fonte["where"]} AND "Delivery_person_ID" IS NOT NULL
+        GROUP BY "Delivery_person_ID" ORDER BY "Delivery_person_ID"
+    '''
+    table = fonte['con'].execute( sql, list( names.values() ) + fonte['params'] ).df()
+    for nome in sets:
+        table[nome] = table[nome].fillna( 0 ).astype( np.int64 )
+    return table.set_index( 'Delivery_person_ID' ), names
+
+def top_k_by_city( fonte, k = 10, col = 'Time_taken(min)' ):
+    """Os k entregadores mais rápidos e os k mais lentos de cada cidade (mesmo resultado de rankings.top_k_by_city).
+
+       As cidades saem na ordem em que aparecem nos pedidos (menor rowid) e os empates
+       são resolvidos pelo identificador do entregador, como no caminho pandas.
+    """
+    sql = f'''
+        WITH medias AS (
+            SELECT "City", "Delivery_person_ID", AVG("{col}") AS media, MIN( rowid ) AS primeira
+            FROM orders WHERE {fonte["where"]}
+            GROUP BY "City", "Delivery_person_ID"
+        ), ranking AS (
+            SELECT *, MIN( primeira ) OVER ( PARTITION BY "City" ) AS ordem,
+                   ROW_NUMBER() OVER ( PARTITION BY "City" ORDER BY media, "Delivery_person_ID" ) AS rapido,
+                   ROW_NUMBER() OVER ( PARTITION BY "City" ORDER BY media DESC, "Delivery_person_ID" ) AS lento
+            FROM medias
+        )
+        SELECT "City", "Delivery_person_ID", media AS "{col}", rapido, lento, ordem
+        FROM ranking WHERE rapido <= ? OR lento <= ?'''
+    ranking = fonte['con'].execute( sql, fonte['params'] + [k, k] ).df()
+
+    def recorte( coluna ):
+        linhas = ranking.loc[ranking[coluna] <= k].sort_values( ['ordem', coluna] )
+        return linhas[['City','Delivery_person_ID',col]].reset_index( drop = True )
+
+    return recorte( 'rapido' ), recorte( 'lento' )
+
+def map_points( fonte, por_pedido = False ):
+    """Pontos do mapa: mediana da localização de entrega por cidade e trânsito, ou cada entrega."""
+    cols = '"City", "Road_traffic_density", "Delivery_location_latitude", "Delivery_location_longitude"'
+    if por_pedido:
+        return _query( fonte, cols, order_by = 'rowid' )
+    return _query( fonte, '"City", "Road_traffic_density", '
+                          f'{_median( fonte, "Delivery_location_latitude" )} AS "Delivery_location_latitude", '
+                          f'{_median( fonte, "Delivery_location_longitude" )} AS "Delivery_location_longitude"',
+                   '"City", "Road_traffic_density"', '"City", "Road_traffic_density"' )
+
+def within_radius( fonte, lat_col, lon_col, lat, lon, radius_km ):
+    """Filtro com a condição extra de distância (haversine, como geo.haversine_km) até (lat, lon) de no máximo radius_km."""
+    distancia = ( f'2 * {EARTH_RADIUS_KM} * asin( sqrt( pow( sin( radians( "{lat_col}" - ? ) / 2 ), 2 ) + '
+                  f'cos( radians( ? ) ) * cos( radians( "{lat_col}" ) ) * pow( sin( radians( "{lon_col}" - ? ) / 2 ), 2 ) ) )' )
+    return { **fonte, 'where': f'{fonte["where"]} AND {distancia} <= ?',
+             'params': fonte['params'] + [lat, lat, lon, radius_km] }
+
+def grid_aggregates( fonte, lat_col, lon_col, grid_deg, grid_cols, lado ):
+    """Pedidos e soma dos tempos por célula da grade (mesma grade de spatial.grid_cells), em blocos de lado x lado células."""
+    # Em DOUBLE, como no numpy: as coordenadas são FLOAT e somar um inteiro manteria a conta em precisão simples
+    linha = f'floor( ( "{lat_col}"::DOUBLE + 90 ) / {grid_deg}::DOUBLE )::BIGINT // {lado}'
+    coluna = f'least( greatest( floor( ( "{lon_col}"::DOUBLE + 180 ) / {grid_deg}::DOUBLE )::BIGINT, 0 ), {grid_cols - 1} ) // {lado}'
+    return _query( fonte, f'{linha} AS linha, {coluna} AS coluna, COUNT(*) AS orders, SUM("Time_taken(min)") AS time_sum',
+                   'linha, coluna', 'linha, coluna' )
+
+def quantiles( fonte, col, qs, by, nomes ):
+    """Quantis de col por combinação de by (mesmo formato de sketches.quantiles); aproximados com approx."""
+    funcao = 'approx_quantile' if fonte.get( 'approx' ) else 'quantile_cont'
+    lista = ', '.join( str( float( q ) ) for q in qs )
+    tabela = _query( fonte, ( f'{_cols( by )}, ' if by else '' ) + f'{funcao}("{col}", [{lista}]) AS q',
+                     _cols( by ) or None, _cols( by ) or None )
+    valores = pd.DataFrame( tabela['q'].tolist(), columns = nomes, index = tabela.index ).astype( float )
+    return pd.concat( [tabela[by], valores], axis = 1 )
+
+def parity( path = DATA_PATH, date_slider = None, traffic_options = ( 'Low','Medium','High','Jam' ) ):
+    """Compara as tabelas das páginas calculadas pelos dois backends (pandas e DuckDB).
+
+       Output: lista com o nome das tabelas que diferem (vazia quando os backends concordam)
+    """
+    # Importados aqui: os módulos abaixo usam este para despachar as consultas SQL
+    from utils import buckets, charts, cube as cubes, profiles, rankings, spatial
+    from utils.dataset import load_data
+
+    def celulas( d, kind, regiao = None ):
+        # Agregados da grade espacial (nível 3), opcionalmente só num raio em torno de um ponto
+        if is_sql( d ):
+            return spatial.sql_cell_aggregates( within_radius( d, *spatial.POINTS[kind], *regiao ) if regiao else d, kind, 3 )
+        indice = spatial.build_spatial_index( d )
+        linhas = spatial.query_radius( indice, d, *regiao, kind ) if regiao else None
+        return spatial.cell_aggregates( indice, kind, linhas, 3 )
+
+    date_slider = date_slider or pd.Timestamp( 2022, 4, 13 )
+    dfm = load_data( path )
+    dfm = dfm.loc[( dfm['Order_Date'] < date_slider ) & dfm['Road_traffic_density'].isin( traffic_options ), :]
+    cube = cubes.filter_cube( cubes.load_cube( path ), date_slider, list( traffic_options ) )
+    fonte = filter_orders( open_database( path ), date_slider, traffic_options )
+
+    tabelas = {
+        'order_metric': lambda f: cubes.rollup_count( f, ['Order_Date'] ),
+        'traffic_order_city': lambda f: cubes.rollup_count( f, ['City','Road_traffic_density'] ),
+        'festival': lambda f: cubes.rollup_stats( f, ['Festival'], 'Time_taken(min)' ),
+        'city_type_of_order': lambda f: cubes.rollup_stats( f, ['City','Type_of_order'], 'Time_taken(min)' ),
+        'ratings_by_traffic': lambda f: charts.avg_by_traffic_or_weather( f, 'Road_traffic_density' ),
+        'ratings_by_weather': lambda f: charts.avg_by_traffic_or_weather( f, 'Weatherconditions' ),
+        'distance_by_city': lambda f: charts.distance( f, metrica = 'No' ),
+        'distinct_drivers': lambda f: pd.DataFrame( { 'n': [cubes.distinct_drivers( f )] } ),
+        'age_extremes': lambda f: pd.DataFrame( { 'v': list( cubes.extremes( f, 'Delivery_person_Age' ) ) } ),
+        'orders_by_day': lambda f: buckets.rollup_buckets( f, 'day' ),
+        'orders_by_week': lambda f: buckets.rollup_buckets( f, 'week' ),
+        'orders_by_month': lambda f: buckets.rollup_buckets( f, 'month' ),
+        'orders_by_quarter': lambda f: buckets.rollup_buckets( f, 'quarter' ),
+    }
+    por_pedido = {
+        'driver_rating_means': charts.driver_rating_means,
+        'driver_profiles': lambda d: profiles.build_profiles( d )['table'].reset_index(),
+        'top_k_fastest': lambda d: rankings.top_k_by_city( d )[0],
+        'top_k_slowest': lambda d: rankings.top_k_by_city( d )[1],
+        'delivery_cells': lambda d: celulas( d, 'delivery' ),
+        'restaurant_cells_radius': lambda d: celulas( d, 'restaurant', ( 12.97, 77.59, 15 ) ),
+    }
+    diferentes = []
+    for nome, func in list( tabelas.items() ) + list( por_pedido.items() ):
+        esperado = func( cube if nome in tabelas else dfm )
+        obtido = func( fonte )
+        try:
+            pd.testing.assert_frame_equal( _plain( esperado ), _plain( obtido ), check_dtype = False, rtol = 1e-6 )
+        except AssertionError as erro:
+            print( f'{nome}: {erro}', file = sys.stderr )
+            diferentes.append( nome )
+    return diferentes
+
+def _plain( tabela ):
+    """Tabela com categóricas como texto e números como float, para comparar os dois backends."""
+    tabela = tabela.reset_index( drop = True )
+    for col in tabela.columns:
+        if isinstance( tabela[col].dtype, pd.CategoricalDtype ):
+            tabela[col] = tabela[col].astype( object )
+        elif tabela[col].dtype != object and not np.issubdtype( tabela[col].dtype, np.datetime64 ):
+            tabela[col] = tabela[col].astype( float )
+    return tabela
+
+if __name__ == '__main__':
+    # Criar/atualizar o banco: python -m utils.sql [train.csv]
+    # Comparar os dois backends: python -m utils.sql --parity [train.csv]
+    if len( sys.argv ) > 1 and sys.argv[1] == '--parity':
+        diferentes = parity( sys.argv[2] if len( sys.argv ) > 2 else DATA_PATH )
+        print( 'backends iguais' if not diferentes else 'tabelas diferentes: ' + ', '.join( diferentes ) )
+        sys.exit( 1 if diferentes else 0 )
+    print( build_database( sys.argv[1] if len( sys.argv ) > 1 else DATA_PATH ) )
@@ -0,0 +1,172 @@
+# Libraries
+import contextlib
+import cProfile
+import datetime
+import json
+import os
+import re
+import threading
+import time
+
+import pandas as pd
+
+# Arquivo onde os tempos de cada rerun são gravados (vazio = não grava);
+# extensão .prom grava no formato texto do Prometheus, qualquer outra em JSON lines
+TIMINGS_PATH = os.environ.get( 'CURRY_TIMINGS_FILE', '' )
+
+# Pasta onde é gravado um perfil do cProfile por rerun (vazio = sem perfil)
+PROFILE_DIR = os.environ.get( 'CURRY_PROFILE_DIR', '' )
+
+# Medição do rerun em andamento; o streamlit executa o script de cada sessão em sua própria thread
+_local = threading.local()
+
+# Totais acumulados no processo para o formato Prometheus: (página, etapa) -> [soma em s, contagem]
+_totals = {}
+_lock = threading.Lock()
+
+# Contadores exportados junto com os tempos: nome -> função que retorna {contador: valor}
+_counters = {}
+
+# -------------------------------------
+# Funções
+# -------------------------------------
+class Timer:
+    """Tempos das etapas de um rerun de uma página.
+
+       Cada etapa é registrada como [nome, nível de aninhamento, segundos], na ordem em que começa.
+    """
+
+    def __init__( self, page ):
+        self.page = page
+        self.stages = []
+        self.depth = 0
+        self.started = time.perf_counter()
+        self.total = None
+        self.profile = None
+
+    @contextlib.contextmanager
+    def stage( self, name ):
+        registro = [name, self.depth, None]
+        self.stages.append( registro )
+        self.depth += 1
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            registro[2] = time.perf_counter() - inicio
+            self.depth -= 1
+
+    def table( self ):
+        """Dataframe com as etapas (etapas internas recuadas) e o total do rerun, em ms."""
+        linhas = [{ 'Etapa': '  ' * nivel + nome, 'ms': round( segundos * 1000, 1 ) }
+                  for nome, nivel, segundos in self.stages if segundos is not None]
+        if self.total is not None:
+            linhas.append( { 'Etapa': 'total do rerun', 'ms': round( self.total * 1000, 1 ) } )
+        return pd.DataFrame( linhas, columns = ['Etapa','ms'] )
+
+def register_counters( name, func ):
+    """Inclui os contadores de func() (ex.: acertos e falhas de um cache) no painel e na exportação dos tempos."""
+    _counters[name] = func
+
+def counters():
+    """Valor atual de todos os contadores registrados: nome -> {contador: valor}."""
+    return { name: func() for name, func in _counters.items() }
+
+def begin( page ):
+    """Inicia a medição de um rerun da página na thread atual (e o perfil, se PROFILE_DIR estiver definido)."""
+    anterior = getattr( _local, 'timer', None )
+    if anterior is not None and anterior.profile is not None:
+        # Rerun anterior interrompido antes de finish (ex.: nova interação do usuário)
+        anterior.profile.disable()
+    timer = Timer( page )
+    if PROFILE_DIR:
+        timer.profile = cProfile.Profile()
+        timer.profile.enable()
+    _local.timer = timer
+    return timer
+
+def stage( name ):
+    """Mede o bloco with como uma etapa do rerun em andamento; sem rerun em medição, não faz nada.
+
+       Pode ser usado fora das páginas (ex.: leitura e limpeza em utils/dataset.py): a etapa entra
+       na medição do rerun que a disparou.
+    """
+    timer = getattr( _local, 'timer', None )
+    if timer is None:
+        return contextlib.nullcontext()
+    return timer.stage( name )
+
+def finish():
+    """Encerra a medição do rerun da thread atual e grava os tempos em TIMINGS_PATH e o perfil em PROFILE_DIR.
+
+       Output: Timer do rerun (None se nenhum rerun estava em medição)
+    """
+    timer = getattr( _local, 'timer', None )
+    if timer is None:
+        return None
+    _local.timer = None
+    timer.total = time.perf_counter() - timer.started
+    if timer.profile is not None:
+        timer.profile.disable()
+        os.makedirs( PROFILE_DIR, exist_ok = True )
+        carimbo = datetime.datetime.now().strftime( '%Y%m%d-%H%M%S-%f' )
+        timer.profile.dump_stats( os.path.join( PROFILE_DIR, f'{timer.page}-{carimbo}.prof' ) )
+    if TIMINGS_PATH:
+        export( timer, TIMINGS_PATH )
+    return timer
+
+def export( timer, path ):
+    """Grava os tempos de um rerun em path.
+
+       - JSON lines: uma linha por rerun, anexada ao arquivo
+       - .prom: soma e contagem acumuladas por página e etapa (formato texto do Prometheus);
+         o arquivo é reescrito a cada rerun, como esperado pelo coletor de arquivos texto
+    """
+    with _lock:
+        if not path.endswith( '.prom' ):
+            registro = { 'ts': datetime.datetime.now().isoformat( timespec = 'milliseconds' ),
+                         'page': timer.page,
+                         'total_s': round( timer.total, 6 ),
+                         'stages': [{ 'name': nome, 'depth': nivel, 'seconds': round( segundos, 6 ) }
+                                    for nome, nivel, segundos in timer.stages if segundos is not None],
+                         'counters': counters() }
+            with open( path, 'a' ) as arquivo:
+                arquivo.write( json.dumps( registro, ensure_ascii = False ) + '\n' )
+            return
+
+        for nome, _, segundos in timer.stages + [( 'total', 0, timer.total )]:
+            if segundos is None:
+                continue
+            soma = _totals.setdefault( ( timer.page, nome ), [0.0, 0] )
+            soma[0] += segundos
+            soma[1] += 1
+        linhas = ['# HELP curry_stage_seconds Tempo gasto em cada etapa dos reruns das páginas.',
+                  '# TYPE curry_stage_seconds summary']
+        for ( page, nome ), ( segundos, contagem ) in sorted( _totals.items() ):
+            rotulos = f'page="{_escape( page )}",stage="{_escape( nome )}"'
+            linhas.append( f'curry_stage_seconds_sum{{{rotulos}}} {segundos:.6f}' )
+            linhas.append( f'curry_stage_seconds_count{{{rotulos}}} {contagem}' )
+        linhas += ['# HELP curry_cache Contadores dos caches compartilhados entre as sessões.',
+                   '# TYPE curry_cache gauge']
+        for name, valores in sorted( counters().items() ):
+            for stat, valor in valores.items():
+                linhas.append( f'curry_cache{{cache="{_escape( name )}",stat="{_escape( stat )}"}} {valor}' )
+        temporario = path + '.tmp'
+        with open( temporario, 'w' ) as arquivo:
+            arquivo.write( '\n'.join( linhas ) + '\n' )
+        os.replace( temporario, path )
+
+def _escape( valor ):
+    return re.sub( r'(["\\])', r'\\\1', valor ).replace( '\n', '\\n' )
+
+def debug_panel( sidebar ):
+    """Encerra a medição do rerun e, se o usuário ligar a opção na barra lateral, mostra os tempos.
+
+       Deve ser a última chamada da página, para que todas as etapas entrem na medição.
+    """
+    mostrar = sidebar.checkbox( 'Mostrar tempos por etapa (debug)' )
+    timer = finish()
+    if mostrar and timer is not None:
+        sidebar.dataframe( timer.table(), use_container_width = True )
+        if _counters:
+            sidebar.dataframe( pd.DataFrame( counters() ).T, use_container_width = True )